@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 from pathlib import Path
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'staking.staticfiles.StaticFilesMiddleware',
+    'staking.instrumentation.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
 #    'django.middleware.csrf.CsrfViewMiddleware',
@@ -118,7 +121,90 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# In production run `./manage.py collectstatic` to copy the files here, with
+# hashed names and compressed copies, to be served by
+# staking.staticfiles.StaticFilesMiddleware with far-future cache headers.
+STATIC_ROOT = BASE_DIR / 'static'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'staking.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Staking asset cache
+# Asset details are cached in memory, these control how many are held and how
+# long for (in seconds, None to keep them until evicted). Set the backend to
+# the name of one of the CACHES to also persist them there.
+
+STAKING_ASSET_CACHE_SIZE = 1024
+
+STAKING_ASSET_CACHE_TTL = None
+
+STAKING_ASSET_CACHE_BACKEND = None
+
+
+# Staking transaction group cache
+# Unsigned transaction groups are cached in memory, so repeated requests for
+# the same group aren't built again. This controls how many are held.
+
+STAKING_GROUP_CACHE_SIZE = 1024
+
+
+# Staking pool pages
+# Rendered pool pages, and the fragments they're made from, are cached in
+# memory. This controls how many of each are held.
+
+STAKING_PAGE_CACHE_SIZE = 1024
+
+
+# Staking contract programs
+# Compile the programs from the .teal files ('teal') or from contracts.py with
+# PyTeal ('pyteal'). The bytecode is cached in the directory given, or
+# staking/contracts/build if None.
+
+STAKING_PROGRAM_SOURCE = 'teal'
+
+STAKING_PROGRAM_CACHE_DIR = None
+
+
+# Staking algod requests
+# Identical requests to the algod node made at the same time are only sent
+# once, and applications, assets and blocks are remembered until the next
+# round. Accounts are always fetched fresh. This controls how many responses
+# are remembered at most.
+
+STAKING_ALGOD_MEMO_SIZE = 10000
+
+
+# Staking request timing
+# Every request is timed, broken down into algod requests, ABI loading,
+# msgpack encoding and template rendering, and exported for Prometheus from
+# /metrics. Set this to False to stop sending the breakdown back to browsers
+# in a Server-Timing header.
+
+STAKING_SERVER_TIMING = True
+
+
+# Staking reward stream
+# Under WSGI each pool page's stream of reward updates holds a worker thread
+# while it's open, so it's closed after this many seconds (None to leave it
+# open until the pool ends) and the page reconnects. The async views aren't
+# limited.
+
+STAKING_STREAM_LIFETIME = 300
+
+
+# Serve the async versions of the staking views, set by asgi.py so running
+# under an ASGI server picks them up automatically.
+
+STAKING_ASYNC_VIEWS = os.environ.get('STAKING_ASYNC_VIEWS') == '1'
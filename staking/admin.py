@@ -1,3 +1,8 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Account, Deployer, Pool, Position
+
+admin.site.register(Pool)
+admin.site.register(Account)
+admin.site.register(Position)
+admin.site.register(Deployer)
@@ -0,0 +1,208 @@
+from algosdk import constants, error
+from algosdk.v2client.algod import AlgodClient, api_version_path_prefix
+
+from .timing import count_algod_call, timed
+
+from urllib import parse
+
+import http.client
+import json
+import queue
+import re
+import threading
+import time
+
+# The algosdk client makes every request through urllib, which opens a new TCP
+# connection each time. PooledAlgodClient is a drop-in replacement which hands
+# its requests to a transport instead, the default being a pool of persistent
+# keep-alive connections.
+
+# Collapse the parts of a request path which identify a particular round,
+# asset, application, account or transaction, so requests to the same endpoint
+# are recorded together (e.g. '/v2/assets/{}').
+ENDPOINT_PART = re.compile(r'/(\d+|[A-Z2-7]{52}|[A-Z2-7]{58})(?=/|$)')
+
+def endpoint_name(method, path):
+    return '{} {}'.format(method, ENDPOINT_PART.sub('/{}', path.split('?')[0]))
+
+# Latency of the requests made to the algod node, per endpoint.
+class LatencyMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint, seconds, failed=False):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0}
+            stats['count'] += 1
+            stats['errors'] += failed
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                endpoint: {**stats, 'mean': stats['total'] / stats['count']}
+                for endpoint, stats in self.endpoints.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+# Shared by every client in the process.
+algod_metrics = LatencyMetrics()
+
+# Raised for a response from the node we think is worth trying again.
+class RetryableResponse(Exception):
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+# A pool of keep-alive connections to a single host. At most pool_size
+# connections are open at once, any more requests wait for one to be free.
+class ConnectionPool:
+    def __init__(self, scheme, host, port, pool_size, timeout):
+        self.connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(pool_size)
+
+    def acquire(self):
+        self.slots.acquire()
+        try:
+            return self.idle.get_nowait(), True
+        except queue.Empty:
+            return self.connection_class(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, conn, reusable):
+        if reusable:
+            self.idle.put(conn)
+        else:
+            conn.close()
+        self.slots.release()
+
+# Requests to these endpoints wait on the node until something happens, so
+# they're given the long poll timeout instead.
+LONG_POLL_PREFIXES = ('/v2/status/wait-for-block-after/',)
+
+class PooledTransport:
+    def __init__(self, pool_size=10, timeout=10, long_poll_timeout=90, retries=2, backoff=0.1, metrics=algod_metrics):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.long_poll_timeout = long_poll_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = metrics
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def pool(self, url):
+        key = (url.scheme, url.netloc)
+        with self.lock:
+            if key not in self.pools:
+                self.pools[key] = ConnectionPool(url.scheme, url.hostname, url.port, self.pool_size, self.timeout)
+            return self.pools[key]
+
+    # Make a single request on a pooled connection. A connection we've reused
+    # may have been closed by the node while it sat idle, in which case the
+    # request is tried once more on a new connection.
+    def send(self, pool, method, target, headers, data, timeout):
+        while True:
+            conn, reused = pool.acquire()
+            try:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request(method, target, body=data, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                pool.release(conn, False)
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                pool.release(conn, False)
+                raise
+            pool.release(conn, not resp.will_close)
+            return resp.status, body
+
+    # Returns the status and body of the response. Failed connections, and
+    # responses the node may not give next time (e.g. 503), are retried with
+    # an exponential backoff. Only requests which are safe to repeat are
+    # retried.
+    def request(self, address, method, requrl, headers, data=None):
+        url = parse.urlsplit(address)
+        pool = self.pool(url)
+        target = url.path.rstrip('/') + requrl
+        endpoint = endpoint_name(method, requrl)
+        timeout = self.long_poll_timeout if requrl.startswith(LONG_POLL_PREFIXES) else self.timeout
+
+        # Only requests which actually go to the node are counted, not those
+        # answered by sharing another (see singleflight.py).
+        count_algod_call(endpoint)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                status, body = self.send(pool, method, target, headers, data, timeout)
+                if status in (502, 503, 504):
+                    raise RetryableResponse(status, body)
+                self.metrics.record(endpoint, time.perf_counter() - start, status >= 400)
+                return status, body
+            except (OSError, http.client.HTTPException, RetryableResponse) as e:
+                self.metrics.record(endpoint, time.perf_counter() - start, True)
+                if method != 'GET' or attempt >= self.retries:
+                    if isinstance(e, RetryableResponse):
+                        return e.status, e.body
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+class PooledAlgodClient(AlgodClient):
+    def __init__(self, algod_token, algod_address, headers=None, transport=None):
+        super().__init__(algod_token, algod_address, headers)
+        self.transport = transport or PooledTransport()
+
+    # The same as AlgodClient.algod_request, but through the transport.
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format="json"):
+        header = {"User-Agent": "py-algorand-sdk"}
+
+        if self.headers:
+            header.update(self.headers)
+
+        if headers:
+            header.update(headers)
+
+        if requrl not in constants.no_auth:
+            header.update({constants.algod_auth_header: self.algod_token})
+
+        if requrl not in constants.unversioned_paths:
+            requrl = api_version_path_prefix + requrl
+        if params:
+            requrl = requrl + "?" + parse.urlencode(params)
+
+        with timed('algod'):
+            status, body = self.transport.request(self.algod_address, method, requrl, header, data)
+
+        if status >= 400:
+            e = body.decode("utf-8")
+            try:
+                e = json.loads(e)["message"]
+            finally:
+                raise error.AlgodHTTPError(e, status)
+
+        if response_format == "json":
+            try:
+                return json.loads(body)
+            except Exception as e:
+                raise error.AlgodResponseError(
+                    "Failed to parse JSON response from algod"
+                ) from e
+        else:
+            return body
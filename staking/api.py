@@ -0,0 +1,102 @@
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from algosdk import encoding
+
+from .models import Position
+from .algod import algod_metrics
+from .programs import program_store
+from .singleflight import algod_single_flight
+from .state import GLOBAL_KEYS
+from .views import chain_clock, state_mirror
+
+import hashlib
+
+# A JSON API for the pools and the accounts positions in them, served from the
+# state mirror rather than rendered pages.
+#
+# Each response carries an ETag made from the last round that changed what's
+# in it, so clients polling with If-None-Match get a 304 until something has
+# actually happened on chain. Working out the ETag only reads the database
+# (unless the mirror has fallen behind), and on a match the view isn't run.
+#
+# The payloads are the raw contract state, so they only change when the state
+# does. Anything depending on the time, like rewards accrued since the last
+# update, is left to the client or the rewards view.
+
+def pool_json(row):
+    state = row.state()
+    pool = {field: getattr(state, field) for field in GLOBAL_KEYS.values()}
+    pool['app_id'] = row.app_id
+    pool['admin'] = encoding.encode_address(state.admin) if state.admin is not None else None
+    pool['creator'] = row.creator
+    pool['changed'] = row.changed
+    return pool
+
+def pools_etag(request):
+    changes = state_mirror.pools(chain_clock.round()).order_by('app_id').values_list('app_id', 'changed')
+    digest = hashlib.sha1(repr(list(changes)).encode()).hexdigest()
+    return '"pools-{}"'.format(digest[:16])
+
+# No ETag for pools or accounts the node doesn't know, so the views are run
+# to answer with a 404.
+def pool_etag(request, pool_id):
+    row = state_mirror.pool_row(pool_id, chain_clock.round())
+    if row is None:
+        return None
+    return '"pool-{}-{}"'.format(pool_id, row.changed)
+
+def position_etag(request, pool_id, account):
+    pool, row = state_mirror.rows(pool_id, account, chain_clock.round())
+    if pool is None or row is None:
+        return None
+    return '"position-{}-{}-{}"'.format(pool_id, pool.changed, row.changed)
+
+def unknown_pool():
+    return JsonResponse({'success': False, 'message': "Unknown pool."}, status=404)
+
+# Every pool created by the registered deployers.
+@require_GET
+@condition(etag_func=pools_etag)
+def pools(request):
+    rows = state_mirror.pools(chain_clock.round()).order_by('app_id')
+    return JsonResponse({'pools': [pool_json(row) for row in rows]})
+
+@require_GET
+@condition(etag_func=pool_etag)
+def pool(request, pool_id):
+    row = state_mirror.pool_row(pool_id, chain_clock.round())
+    if row is None:
+        return unknown_pool()
+    return JsonResponse(pool_json(row))
+
+# The accounts position in the pool, as last updated by the contract.
+@require_GET
+@condition(etag_func=position_etag)
+def position(request, pool_id, account):
+    if state_mirror.pool_row(pool_id, chain_clock.round()) is None:
+        return unknown_pool()
+    row = Position.objects.filter(pool_id=pool_id, account_id=account).first()
+    if row is None:
+        return JsonResponse({'success': False, 'message': "Account has not opted in."}, status=404)
+    return JsonResponse({
+        'pool_id': pool_id,
+        'account': account,
+        'amount_staked': row.amount_staked or 0,
+        'amount_rewarded': row.amount_rewarded or 0,
+        'last_updated': row.last_updated or 0,
+    })
+
+# The hash and size of the compiled programs new pools are created with.
+@require_GET
+def programs(request):
+    return JsonResponse(program_store.info())
+
+# How many requests have been made to the algod node, per endpoint, and how
+# many were saved by sharing them.
+@require_GET
+def algod(request):
+    return JsonResponse({
+        'single_flight': algod_single_flight.stats(),
+        'endpoints': algod_metrics.snapshot(),
+    })
@@ -1,6 +1,24 @@
 from django.apps import AppConfig
 
+import logging
+
+logger = logging.getLogger(__name__)
+
 
 class StakingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'staking'
+
+    def ready(self):
+        # Load the staking contract's ABI up front, so the first request
+        # doesn't have to.
+        from .contract import contract_registry
+        contract_registry.load()
+
+        # Likewise the compiled programs, if they've been assembled before.
+        # Otherwise they will be when a pool is first created.
+        from .programs import program_store
+        try:
+            program_store.load()
+        except Exception:
+            logger.exception('Failed to load the compiled programs')
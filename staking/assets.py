@@ -0,0 +1,168 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+import asyncio
+import threading
+import time
+
+# The maximum number of asset lookups we'll have in flight against the algod
+# node at any one time.
+MAX_WORKERS = 8
+
+# A single shared pool of worker threads, so we don't pay to spin up new
+# threads on every page view.
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='asset-lookup')
+
+# Fetch the details for many assets at once. Each distinct asset ID is only
+# requested from the algod node once, and the requests are spread across the
+# bounded pool of worker threads rather than being made one after another.
+def fetch_assets(client, asset_ids):
+    asset_ids = list(dict.fromkeys(asset_ids))
+    return dict(zip(asset_ids, executor.map(client.asset_info, asset_ids)))
+
+# Hand out a copy of the asset so callers are free to add their own keys
+# (e.g. 'unit_name') without touching what's held in the cache.
+def copy_asset(asset):
+    return {**asset, 'params': dict(asset['params'])}
+
+# A process wide cache of asset details. The parts of an asset we care about
+# (decimals, unit name and total) can't change once it's been created, so
+# there's no need to ask the algod node for them more than once.
+#
+# Assets are held in memory with least recently used eviction, and can also be
+# persisted to one of Django's cache backends so they survive restarts and can
+# be shared between processes.
+class AssetCache:
+    def __init__(self, max_size=1024, ttl=None, backend=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def backend_key(self, asset_id):
+        return 'staking:asset:{}'.format(asset_id)
+
+    def cache_backend(self):
+        if self.backend is None:
+            return None
+        return caches[self.backend]
+
+    # Look up an asset in memory, falling back to the cache backend.
+    def lookup(self, asset_id):
+        with self.lock:
+            entry = self.entries.get(asset_id)
+            if entry is not None:
+                asset, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self.entries.move_to_end(asset_id)
+                    self.hits += 1
+                    return asset
+                del self.entries[asset_id]
+
+        backend = self.cache_backend()
+        if backend is not None:
+            asset = backend.get(self.backend_key(asset_id))
+            if asset is not None:
+                self.store(asset_id, asset, persist=False)
+                with self.lock:
+                    self.hits += 1
+                return asset
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def store(self, asset_id, asset, persist=True):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.lock:
+            self.entries[asset_id] = (asset, expires)
+            self.entries.move_to_end(asset_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        backend = self.cache_backend()
+        if persist and backend is not None:
+            backend.set(self.backend_key(asset_id), asset, self.ttl)
+
+    # Retrieve a single asset, only asking the algod node if we don't already
+    # have it.
+    def get(self, client, asset_id):
+        return self.get_many(client, [asset_id])[asset_id]
+
+    def lookup_many(self, asset_ids):
+        assets = {}
+        missing = []
+        for asset_id in dict.fromkeys(asset_ids):
+            asset = self.lookup(asset_id)
+            if asset is None:
+                missing.append(asset_id)
+            else:
+                assets[asset_id] = asset
+        return assets, missing
+
+    # Retrieve many assets, any which aren't cached are fetched concurrently.
+    def get_many(self, client, asset_ids):
+        assets, missing = self.lookup_many(asset_ids)
+
+        for asset_id, asset in fetch_assets(client, missing).items():
+            self.store(asset_id, asset)
+            assets[asset_id] = asset
+
+        return {asset_id: copy_asset(asset) for asset_id, asset in assets.items()}
+
+    # The same as get_many, but for use with the async algod client. The cache
+    # backend may do I/O of its own, so it's only touched from a thread.
+    async def aget_many(self, client, asset_ids):
+        if self.backend is None:
+            assets, missing = self.lookup_many(asset_ids)
+        else:
+            assets, missing = await sync_to_async(self.lookup_many, thread_sensitive=False)(asset_ids)
+
+        fetched = await asyncio.gather(*[client.asset_info(asset_id) for asset_id in missing])
+        for asset_id, asset in zip(missing, fetched):
+            if self.backend is None:
+                self.store(asset_id, asset)
+            else:
+                await sync_to_async(self.store, thread_sensitive=False)(asset_id, asset)
+            assets[asset_id] = asset
+
+        return {asset_id: copy_asset(asset) for asset_id, asset in assets.items()}
+
+    async def aget(self, client, asset_id):
+        return (await self.aget_many(client, [asset_id]))[asset_id]
+
+    # Drop a single asset, or everything this process knows about if no asset
+    # ID is given, so that it will be fetched from the algod node again next
+    # time.
+    def invalidate(self, asset_id=None):
+        backend = self.cache_backend()
+        with self.lock:
+            if asset_id is None:
+                asset_ids = list(self.entries)
+                self.entries.clear()
+            else:
+                asset_ids = [asset_id]
+                self.entries.pop(asset_id, None)
+        if backend is not None:
+            backend.delete_many([self.backend_key(i) for i in asset_ids])
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+asset_cache = AssetCache(
+    max_size=getattr(settings, 'STAKING_ASSET_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'STAKING_ASSET_CACHE_TTL', None),
+    backend=getattr(settings, 'STAKING_ASSET_CACHE_BACKEND', None),
+)
@@ -0,0 +1,247 @@
+from algosdk import constants, encoding, error
+from algosdk.future import transaction
+from algosdk.v2client.algod import api_version_path_prefix
+
+from .algod import algod_metrics, endpoint_name
+from .timing import count_algod_call, timed
+
+from collections import deque
+from urllib import parse
+
+import asyncio
+import base64
+import contextlib
+import json
+import time
+import weakref
+
+# An asyncio version of the handful of algod calls the staking views make.
+#
+# Requests are made over persistent HTTP/1.1 keep-alive connections, which
+# are returned to a pool once the response has been read and reused by the
+# next request, so we only pay the cost of connecting once per connection.
+# At most 'max_connections' requests are in flight at any one time, anything
+# beyond that waits for a connection to be free.
+
+# Raised when the connection was closed before we got a complete response.
+class ConnectionClosed(Exception):
+    pass
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+
+    async def request(self, method, target, headers, body):
+        lines = ["{} {} HTTP/1.1".format(method, target)]
+        for name, value in headers.items():
+            lines.append("{}: {}".format(name, value))
+        lines.append("Content-Length: {}".format(len(body)))
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionClosed()
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # Skip any trailers, up to the blank line.
+                    while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            data = b"".join(chunks)
+        elif 'content-length' in response_headers:
+            data = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await self.reader.read()
+            self.reusable = False
+
+        if response_headers.get('connection', '').lower() == 'close':
+            self.reusable = False
+        return status, data
+
+    def close(self):
+        self.reusable = False
+        self.writer.close()
+
+class ConnectionPool:
+    def __init__(self, host, port, ssl, max_connections):
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.idle = deque()
+        self.slots = asyncio.Semaphore(max_connections)
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        async with self.slots:
+            if self.idle:
+                conn, reused = self.idle.pop(), True
+            else:
+                reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+                conn, reused = Connection(reader, writer), False
+            try:
+                yield conn, reused
+            except BaseException:
+                conn.close()
+                raise
+            if conn.reusable:
+                self.idle.append(conn)
+            else:
+                conn.close()
+
+class AsyncAlgodClient:
+    def __init__(self, algod_token, algod_address, headers=None, max_connections=10, timeout=30, metrics=algod_metrics, single_flight=None):
+        self.algod_token = algod_token
+        self.algod_address = algod_address
+        self.headers = headers
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.metrics = metrics
+        # Shares identical GETs with other requests, see singleflight.py.
+        self.single_flight = single_flight
+
+        # Connections belong to the event loop they were opened in, so each
+        # loop gets a pool of its own.
+        self.pools = weakref.WeakKeyDictionary()
+
+    def pool(self):
+        loop = asyncio.get_running_loop()
+        url = parse.urlsplit(self.algod_address)
+        key = (url.scheme, url.hostname, url.port)
+        pools = self.pools.setdefault(loop, {})
+        if key not in pools:
+            default_port = 443 if url.scheme == 'https' else 80
+            pools[key] = ConnectionPool(url.hostname, url.port or default_port, url.scheme == 'https', self.max_connections)
+        return pools[key], url
+
+    # Make the request to the node, returning the status and body of the
+    # response.
+    async def fetch(self, method, requrl, header, data):
+        pool, url = self.pool()
+        header = dict(header, Host=url.netloc)
+        target = url.path.rstrip('/') + requrl
+        count_algod_call(endpoint_name(method, requrl))
+
+        # An idle connection may have been closed by the node since we last
+        # used it, in which case try again on a fresh one.
+        start = time.perf_counter()
+        try:
+            while True:
+                async with pool.connection() as (conn, reused):
+                    try:
+                        status, body = await asyncio.wait_for(conn.request(method, target, header, data or b""), self.timeout)
+                    except (ConnectionClosed, ConnectionError, asyncio.IncompleteReadError):
+                        conn.close()
+                        if reused:
+                            continue
+                        raise
+                break
+        except BaseException:
+            self.metrics.record(endpoint_name(method, requrl), time.perf_counter() - start, True)
+            raise
+        self.metrics.record(endpoint_name(method, requrl), time.perf_counter() - start, status >= 400)
+        return status, body
+
+    async def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format="json"):
+        header = {"User-Agent": "py-algorand-sdk"}
+
+        if self.headers:
+            header.update(self.headers)
+
+        if headers:
+            header.update(headers)
+
+        if requrl not in constants.no_auth:
+            header.update({constants.algod_auth_header: self.algod_token})
+
+        if requrl not in constants.unversioned_paths:
+            requrl = api_version_path_prefix + requrl
+        if params:
+            requrl = requrl + "?" + parse.urlencode(params)
+
+        with timed('algod'):
+            if self.single_flight is not None and self.single_flight.shared(method, requrl):
+                key = (self.algod_address, requrl, tuple(sorted(header.items())))
+                status, body = await self.single_flight.arequest(key, requrl, lambda: self.fetch(method, requrl, header, data))
+            else:
+                status, body = await self.fetch(method, requrl, header, data)
+
+        if status >= 400:
+            message = body.decode('utf-8')
+            try:
+                message = json.loads(message)["message"]
+            finally:
+                raise error.AlgodHTTPError(message, status)
+
+        if response_format == "json":
+            try:
+                return json.loads(body)
+            except Exception as e:
+                raise error.AlgodResponseError("Failed to parse JSON response from algod") from e
+        return body
+
+    async def account_info(self, address, exclude=None, **kwargs):
+        query = {}
+        if exclude:
+            query["exclude"] = exclude
+        return await self.algod_request("GET", "/accounts/" + address, query, **kwargs)
+
+    async def asset_info(self, asset_id, **kwargs):
+        return await self.algod_request("GET", "/assets/" + str(asset_id), **kwargs)
+
+    async def application_info(self, application_id, **kwargs):
+        return await self.algod_request("GET", "/applications/" + str(application_id), **kwargs)
+
+    async def status(self, **kwargs):
+        return await self.algod_request("GET", "/status", **kwargs)
+
+    async def status_after_block(self, block_num, **kwargs):
+        return await self.algod_request("GET", "/status/wait-for-block-after/" + str(block_num), **kwargs)
+
+    async def block_info(self, block, **kwargs):
+        return await self.algod_request("GET", "/blocks/" + str(block), {"format": "json"}, **kwargs)
+
+    async def pending_transaction_info(self, transaction_id, **kwargs):
+        return await self.algod_request("GET", "/transactions/pending/" + transaction_id, {"format": "json"}, **kwargs)
+
+    async def suggested_params(self, **kwargs):
+        res = await self.algod_request("GET", "/transactions/params", **kwargs)
+        return transaction.SuggestedParams(
+            res["fee"],
+            res["last-round"],
+            res["last-round"] + 1000,
+            res["genesis-hash"],
+            res["genesis-id"],
+            False,
+            res["consensus-version"],
+            res["min-fee"],
+        )
+
+    async def send_raw_transaction(self, txn, **kwargs):
+        txn = base64.b64decode(txn)
+        headers = {"Content-Type": "application/x-binary"}
+        return (await self.algod_request("POST", "/transactions", data=txn, headers=headers, **kwargs))["txId"]
+
+    async def send_transactions(self, txns, **kwargs):
+        serialized = []
+        for txn in txns:
+            assert not isinstance(txn, transaction.Transaction), "Attempt to send UNSIGNED transaction {}".format(txn)
+            serialized.append(base64.b64decode(encoding.msgpack_encode(txn)))
+        return await self.send_raw_transaction(base64.b64encode(b"".join(serialized)), **kwargs)
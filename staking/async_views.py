@@ -0,0 +1,262 @@
+from django.shortcuts import redirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+
+from asgiref.sync import sync_to_async
+
+from .assets import asset_cache
+from .async_algod import AsyncAlgodClient
+from .groups import group_cache
+from .instrumentation import render_template
+from .pages import page_cache, page_key
+from .pools import describe_rows, page_pools, row_asset_ids
+from .programs import program_store
+from .singleflight import algod_single_flight
+from .state import decode_position
+from .transactions import asset_create_group, deploy_group, init_group, deposit_group, withdraw_group, claim_group, decode_signed_group
+from .views import algod_client, algod_token, algod_addr, batch_pools, batch_requests, chain_clock, params_cache, deployer, index_context, index_query, pool_details, rewards_response, reward_stream, state_mirror, submission_queue
+
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Async versions of the views in views.py, used when running under ASGI. They
+# talk to the algod node through the async client, which keeps a pool of
+# keep-alive connections open, and make any lookups that don't depend on one
+# another at the same time.
+#
+# The chain clock, suggested parameters, asset details and state mirror are
+# shared with the sync views, as are the transaction group builders. The
+# mirror is read from a thread, since it uses the database and fetches any
+# stale rows with the sync client. Those threads aren't the single shared
+# one (thread_sensitive=False), so requests waiting on the node don't queue
+# up behind one another.
+
+# The maximum number of connections to the algod node per event loop.
+ALGOD_MAX_CONNECTIONS = 20
+
+async_algod_client = AsyncAlgodClient(algod_token, algod_addr, max_connections=ALGOD_MAX_CONNECTIONS, single_flight=algod_single_flight)
+
+# Page to list the staking pools authored by the registered deployers, a page
+# at a time from the state mirror.
+async def index(request):
+    snapshot = await chain_clock.acurrent()
+    current_time = chain_clock.extrapolate(snapshot)
+
+    # The page is found in the database, from a thread.
+    query = index_query(request)
+    def find_page():
+        rows, next_cursor = page_pools(state_mirror.pools(snapshot[0]), current_time, **query)
+        rows = state_mirror.fresh_rows(rows, snapshot[0])
+        return rows, next_cursor, row_asset_ids(rows)
+    try:
+        rows, next_cursor, asset_ids = await sync_to_async(find_page, thread_sensitive=False)()
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    assets = await asset_cache.aget_many(async_algod_client, asset_ids)
+    pools = describe_rows(rows, assets, current_time)
+
+    template_name = "staking/index.html"
+    context = index_context(pools, query, next_cursor)
+    return HttpResponse(render_template(template_name, context, request))
+
+# Display a specific pool and the details associated with it.
+async def pool(request, pool_id):
+    # If a wallet hasn't been selected and set in the cookie, redirect them.
+    if 'account' not in request.COOKIES:
+        return redirect('/')
+
+    # Find out when the pool and the accounts positions last changed, along
+    # with the current time of the blockchain, which is all that's needed if
+    # the page is cached.
+    account = request.COOKIES['account']
+    (pool_row, account_row), now = await asyncio.gather(
+        sync_to_async(state_mirror.rows, thread_sensitive=False)(pool_id, account),
+        chain_clock.anow(),
+    )
+    if pool_row is None:
+        raise Http404("Unknown pool.")
+    if account_row is None:
+        return redirect('/')
+    key = page_key(pool_row, account_row, now)
+    html = page_cache.get(key)
+    if html is not None:
+        return HttpResponse(html)
+
+    state = pool_row.state()
+    position, assets = await asyncio.gather(
+        sync_to_async(state_mirror.stored_position, thread_sensitive=False)(pool_id, account),
+        asset_cache.aget_many(async_algod_client, [state.staked_asset, state.reward_asset]),
+    )
+
+    context = {
+        'pool_id': pool_id,
+        'pool_details': pool_details(state, position, assets[state.staked_asset], assets[state.reward_asset]),
+    }
+    return HttpResponse(page_cache.render(key, context, request))
+
+# Display a page to create a new ASA.
+async def new_asset(request):
+    # If a wallet hasn't been selected and set in the cookie, redirect them.
+    if 'account' not in request.COOKIES:
+        return redirect('/')
+    template_name = "staking/new_asset.html"
+
+    # Display all existing assets created by the deployer account.
+    acc_assets = (await async_algod_client.account_info(deployer))['created-assets']
+    assets = []
+    for asset in acc_assets:
+        asset['params']['unit_name'] = asset['params']['unit-name']
+        assets.append(asset)
+    context = {
+        'assets': assets,
+    }
+    return HttpResponse(render_template(template_name, context, request))
+
+# API: This endpoint is requested via an in-page call.
+async def create_asset(request):
+    data = json.loads(request.body)
+    sp = await params_cache.aget(async_algod_client)
+    return JsonResponse(asset_create_group(data, sp), safe=False)
+
+async def new_pool(request):
+    # If a wallet hasn't been selected and set in the cookie, redirect them.
+    if 'account' not in request.COOKIES:
+        return redirect('/')
+    template_name = "staking/new_pool.html"
+    context = {}
+    return HttpResponse(render_template(template_name, context, request))
+
+# API: This endpoint is requested via an in-page call.
+async def create_pool(request):
+    data = json.loads(request.body)
+    sp = await params_cache.aget(async_algod_client)
+
+    # Assembling a program (the first time only) uses the sync client, from a
+    # thread.
+    approval = await sync_to_async(program_store.approval, thread_sensitive=False)(algod_client)
+    clear = await sync_to_async(program_store.clear, thread_sensitive=False)(algod_client)
+    return JsonResponse(group_cache.build(deploy_group, data, sp, approval, clear), safe=False)
+
+# The second step of deploying a pool, see init_group for the details.
+async def init_pool(request):
+    data = json.loads(request.body)
+    state, sp = await asyncio.gather(
+        sync_to_async(state_mirror.pool, thread_sensitive=False)(data['pool_id']),
+        params_cache.aget(async_algod_client),
+    )
+    reward_asset = await asset_cache.aget(async_algod_client, state.reward_asset)
+    return JsonResponse(group_cache.build(init_group, data, sp, state, reward_asset), safe=False)
+
+async def create_pools(request):
+    data = json.loads(request.body)
+    try:
+        requests = batch_requests(data, ['staking', 'reward', 'begin', 'end'])
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    sp = await params_cache.aget(async_algod_client)
+    approval = await sync_to_async(program_store.approval, thread_sensitive=False)(algod_client)
+    clear = await sync_to_async(program_store.clear, thread_sensitive=False)(algod_client)
+    return JsonResponse([group_cache.build(deploy_group, r, sp, approval, clear) for r in requests], safe=False)
+
+async def init_pools(request):
+    data = json.loads(request.body)
+    try:
+        requests = batch_requests(data, ['pool_id', 'fixed-rate'])
+        states, sp = await asyncio.gather(
+            sync_to_async(batch_pools, thread_sensitive=False)(requests, await chain_clock.around()),
+            params_cache.aget(async_algod_client),
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    except LookupError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=404)
+
+    assets = await asset_cache.aget_many(async_algod_client, [state.reward_asset for state in states])
+    return JsonResponse([
+        group_cache.build(init_group, r, sp, state, assets[state.reward_asset])
+        for r, state in zip(requests, states)
+    ], safe=False)
+
+# API: This endpoint is requested via an in-page call.
+async def deposit(request, pool_id):
+    data = json.loads(request.body)
+    state, acc, sp = await asyncio.gather(
+        sync_to_async(state_mirror.pool, thread_sensitive=False)(pool_id),
+        async_algod_client.account_info(data['sender']),
+        params_cache.aget(async_algod_client),
+    )
+    position = decode_position(acc, pool_id)
+    return JsonResponse(group_cache.build(deposit_group, data, sp, pool_id, state, position), safe=False)
+
+# API: This endpoint is requested via an in-page call.
+async def withdraw(request, pool_id):
+    data = json.loads(request.body)
+    state, sp = await asyncio.gather(
+        sync_to_async(state_mirror.pool, thread_sensitive=False)(pool_id),
+        params_cache.aget(async_algod_client),
+    )
+    return JsonResponse(group_cache.build(withdraw_group, data, sp, pool_id, state), safe=False)
+
+# API: This endpoint is requested via an in-page call.
+async def claim(request, pool_id):
+    data = json.loads(request.body)
+    state, sp = await asyncio.gather(
+        sync_to_async(state_mirror.pool, thread_sensitive=False)(pool_id),
+        params_cache.aget(async_algod_client),
+    )
+    return JsonResponse(group_cache.build(claim_group, data, sp, pool_id, state), safe=False)
+
+# API: The rewards accrued by an account in a pool.
+async def rewards(request, pool_id, account):
+    (state, position), now = await asyncio.gather(
+        sync_to_async(state_mirror.lookup, thread_sensitive=False)(pool_id, account),
+        chain_clock.anow(),
+    )
+    return rewards_response(state, position, account, now)
+
+# Server-sent events with the accounts rewards and the total staked in the
+# pool, sent each time the chain moves on. Followed by the pool page.
+async def stream(request, pool_id):
+    if 'account' not in request.COOKIES:
+        return JsonResponse({'success': False, 'message': "No account selected."}, status=400)
+    if await sync_to_async(state_mirror.pool_row, thread_sensitive=False)(pool_id) is None:
+        return JsonResponse({'success': False, 'message': "Unknown pool."}, status=404)
+    response = StreamingHttpResponse(reward_stream.aevents(pool_id, request.COOKIES['account']), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+# API: This endpoint is requested via an in-page call.
+async def submit(request):
+    data = json.loads(request.body)
+
+    # Encode all signed transactions sent to us and place them in an array.
+    txgroup = decode_signed_group(data)
+
+    # Attempt to submit the transaction to the algod node. Catching any errors
+    # and returning the status to the caller.
+    try:
+        await async_algod_client.send_transactions(txgroup)
+        txid = submission_queue.track(txgroup)
+        result = {'success': True, 'message': "Transactions received.", 'txid': txid}
+    except Exception:
+        logger.exception('Failed to send transactions')
+        result = {'success': False, 'message': "Transaction failed."}
+
+    return JsonResponse(result)
+
+async def transaction_status(request, txid):
+    status = submission_queue.status(txid)
+    if status is None:
+        return JsonResponse({'success': False, 'message': "Unknown transaction."}, status=404)
+    return JsonResponse(status)
+
+async def transaction_stream(request, txid):
+    if submission_queue.status(txid) is None:
+        return JsonResponse({'success': False, 'message': "Unknown transaction."}, status=404)
+    response = StreamingHttpResponse(submission_queue.aevents(txid), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
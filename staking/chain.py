@@ -0,0 +1,219 @@
+from asgiref.sync import sync_to_async
+
+import copy
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Keeps track of the current time on the blockchain, so we don't need to ask
+# the algod node for the status and the latest block on every page view.
+#
+# A background thread waits for each new round using status_after_block, and
+# records the round, its block timestamp and when we saw it. The current chain
+# time is then worked out from memory by adding how long it has been since the
+# last round to that timestamp, the same way algod's 'time-since-last-round'
+# would.
+#
+# The listeners subscribed to the clock are called in order from a second
+# thread, so a slow one never holds back the clock itself. If they're still
+# busy with one round when the next arrives they're only told about the
+# latest. Each is timed, and any taking longer than 'slow_listener' seconds
+# is logged.
+class ChainClock:
+    def __init__(self, client, max_age=30, slow_listener=1.0):
+        self.client = client
+        self.slow_listener = slow_listener
+
+        # If we haven't heard about a new round for this many seconds, assume
+        # the background thread has fallen behind and check in with the node
+        # ourselves.
+        self.max_age = max_age
+
+        self.snapshot = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.listeners = []
+
+        # The latest snapshot the listeners haven't been told about yet, and
+        # how long each listener has taken, by name.
+        self.pending = None
+        self.dispatching = threading.Condition()
+        self.listener_seconds = {}
+
+    # Ask the node where the chain is, and remember it. The snapshot is a tuple
+    # of (round, block timestamp, seconds since that round, when we asked).
+    def sync(self, status=None):
+        if status is None:
+            status = self.client.status()
+        observed = time.monotonic()
+        last_block = self.client.block_info(status['last-round'])
+        self.snapshot = (
+            status['last-round'],
+            last_block['block']['ts'],
+            status['time-since-last-round'] / 1000000000,
+            observed,
+        )
+        return self.snapshot
+
+    # Each run of the threads has its own 'stopped' event, so the clock can
+    # be started again while the last run's long poll is still waiting.
+    def follow(self, stopped):
+        while not stopped.is_set():
+            try:
+                status = self.client.status_after_block(self.snapshot[0])
+                if stopped.is_set():
+                    return
+                snapshot = self.sync(status)
+            except Exception:
+                # Stopping leaves the long poll to fail once the node goes.
+                if stopped.is_set():
+                    return
+                logger.exception('Chain clock failed to follow the chain')
+                stopped.wait(1)
+                continue
+
+            with self.dispatching:
+                self.pending = snapshot
+                self.dispatching.notify()
+
+    # Hand each new snapshot to the listeners, from the dispatch thread.
+    def dispatch(self, stopped):
+        while True:
+            with self.dispatching:
+                self.dispatching.wait_for(lambda: self.pending is not None or stopped.is_set())
+                if stopped.is_set():
+                    return
+                snapshot, self.pending = self.pending, None
+
+            for listener in self.listeners:
+                start = time.perf_counter()
+                try:
+                    listener(snapshot)
+                except Exception:
+                    logger.exception('Chain clock listener failed')
+                self.timed(listener, time.perf_counter() - start)
+
+    def timed(self, listener, seconds):
+        name = getattr(listener, '__qualname__', repr(listener))
+        if seconds > self.slow_listener:
+            logger.warning('Chain clock listener %s took %.2fs', name, seconds)
+        with self.lock:
+            total, calls, slowest = self.listener_seconds.get(name, (0.0, 0, 0.0))
+            self.listener_seconds[name] = (total + seconds, calls + 1, max(slowest, seconds))
+
+    # Register a function to be called from the dispatch thread with the new
+    # snapshot each time the chain moves on to a new round.
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    # Start following the chain in the background, the first caller also
+    # makes sure we have a snapshot to work from.
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.sync()
+            self.stopped = stopped = threading.Event()
+            self.thread = threading.Thread(target=self.follow, args=(stopped,), name='chain-clock', daemon=True)
+            self.thread.start()
+            threading.Thread(target=self.dispatch, args=(stopped,), name='chain-clock-listeners', daemon=True).start()
+
+    # Stop following the chain. The next caller starts it again.
+    def stop(self):
+        with self.lock:
+            self.stopped.set()
+            self.thread = None
+            self.pending = None
+        with self.dispatching:
+            self.dispatching.notify_all()
+
+    # The total and longest time taken by each listener, and how many rounds
+    # it's been called for.
+    def stats(self):
+        with self.lock:
+            return {
+                name: {'seconds': total, 'calls': calls, 'slowest': slowest}
+                for name, (total, calls, slowest) in self.listener_seconds.items()
+            }
+
+    def current(self):
+        if self.thread is None:
+            self.start()
+        snapshot = self.snapshot
+        if time.monotonic() - snapshot[3] > self.max_age:
+            snapshot = self.sync()
+        return snapshot
+
+    # The same as current, but the node is only ever contacted from a thread
+    # so async views don't block the event loop.
+    async def acurrent(self):
+        snapshot = self.snapshot
+        if self.thread is None or time.monotonic() - snapshot[3] > self.max_age:
+            return await sync_to_async(self.current, thread_sensitive=False)()
+        return snapshot
+
+    # The last round we know about.
+    def round(self):
+        return self.current()[0]
+
+    async def around(self):
+        return (await self.acurrent())[0]
+
+    # The current time of the blockchain, as a unix timestamp.
+    def now(self):
+        return self.extrapolate(self.current())
+
+    async def anow(self):
+        return self.extrapolate(await self.acurrent())
+
+    def extrapolate(self, snapshot):
+        last_round, ts, since_last_round, observed = snapshot
+        return int(ts + since_last_round + time.monotonic() - observed)
+
+# Serves suggested transaction parameters from memory. They're refreshed in
+# the background each time the chain clock sees a new round, so building a
+# transaction doesn't need to wait on the algod node.
+#
+# Every transaction is only valid between its first and last rounds. The
+# first round is always one the node has already seen, so before handing the
+# cached parameters out we make sure the window has at least 'margin' rounds
+# left before the last. If not, they're fetched again there and then.
+class SuggestedParamsCache:
+    def __init__(self, client, clock, margin=10):
+        self.client = client
+        self.clock = clock
+        self.margin = margin
+        self.params = None
+        self.hits = 0
+        self.misses = 0
+        clock.subscribe(self.refresh)
+
+    def refresh(self, snapshot=None):
+        self.params = self.client.suggested_params()
+        return self.params
+
+    def valid(self, params, current_round):
+        return current_round + self.margin <= params.last
+
+    # Returns a copy, since the callers set their own fees on it.
+    def get(self):
+        params = self.params
+        if params is None or not self.valid(params, self.clock.round()):
+            self.misses += 1
+            params = self.refresh()
+        else:
+            self.hits += 1
+        return copy.copy(params)
+
+    # The same as get, but any refresh is made through the async client given.
+    async def aget(self, client):
+        params = self.params
+        if params is None or not self.valid(params, await self.clock.around()):
+            self.misses += 1
+            params = self.params = await client.suggested_params()
+        else:
+            self.hits += 1
+        return copy.copy(params)
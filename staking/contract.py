@@ -0,0 +1,66 @@
+from algosdk.abi import Method, Contract
+
+from .timing import timed
+
+from pathlib import Path
+
+import os
+import threading
+import time
+
+# The ABI description of the staking contract.
+CONTRACT_PATH = Path(__file__).resolve().parent / 'contracts' / 'staking.json'
+
+# Holds the staking contract's ABI, read and parsed once rather than on every
+# request. Methods are kept in a dictionary by name along with their
+# selectors, so looking one up doesn't mean searching through the list.
+#
+# The file is checked for changes (at most once every check_interval seconds)
+# and reloaded if it's been modified, so updating the contract doesn't require
+# restarting the server.
+class ContractRegistry:
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.loaded = None
+        self.last_checked = 0
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock, timed('abi'):
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as f:
+                c = Contract.from_json(f.read())
+            methods = {m.name: m for m in c.methods}
+            selectors = {m.name: m.get_selector() for m in c.methods}
+            self.loaded = (mtime, c, methods, selectors)
+            self.last_checked = time.monotonic()
+        return self.loaded
+
+    # Return what we've loaded, reloading first if the file has changed.
+    def current(self):
+        loaded = self.loaded
+        if loaded is None:
+            return self.load()
+        if time.monotonic() - self.last_checked > self.check_interval:
+            self.last_checked = time.monotonic()
+            if os.stat(self.path).st_mtime_ns != loaded[0]:
+                return self.load()
+        return loaded
+
+    def contract(self) -> Contract:
+        return self.current()[1]
+
+    def method(self, name: str) -> Method:
+        try:
+            return self.current()[2][name]
+        except KeyError:
+            raise Exception("No method with the name {}".format(name))
+
+    def selector(self, name: str) -> bytes:
+        try:
+            return self.current()[3][name]
+        except KeyError:
+            raise Exception("No method with the name {}".format(name))
+
+contract_registry = ContractRegistry(CONTRACT_PATH)
@@ -0,0 +1,316 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+
+from algosdk import encoding, logic
+
+from .transactions import transaction_id
+
+import base64
+import hashlib
+import json
+import msgpack
+import re
+import threading
+import time
+
+# An in-process stand-in for an algod node. It serves canned responses for the
+# handful of endpoints used by the staking views, with a configurable delay on
+# every request to simulate the round trip to a real node. This lets us
+# measure how the views scale without needing a sandbox running.
+
+# A well formed address that we use for the deployer account.
+DEPLOYER = 'ALICE7Y2JOFGG2VGUC64VINB75PI56O6M2XW233KG2I3AIYJFUD4QMYTJM'
+
+# The first IDs handed out to the fake assets and applications.
+FIRST_ASSET_ID = 1000
+FIRST_APP_ID = 5000
+
+# A well formed address for the i'th of the fake staking accounts.
+def staker(i):
+    return encoding.encode_address(hashlib.sha256('staker {}'.format(i).encode()).digest())
+
+# Encode a global or local state entry the same way algod does.
+def state_entry(key, value):
+    if isinstance(value, bytes):
+        return {'key': base64.b64encode(key.encode()).decode(), 'value': {'type': 1, 'bytes': base64.b64encode(value).decode(), 'uint': 0}}
+    return {'key': base64.b64encode(key.encode()).decode(), 'value': {'type': 2, 'bytes': '', 'uint': value}}
+
+class FakeAlgod:
+    def __init__(self, pools=10, assets=2, latency=0.0, timestamp=None, round_time=4.5, accounts=0):
+        self.latency = latency
+        self.round_time = round_time
+        self.first_round = 1000
+        self.started = time.monotonic()
+        self.timestamp = int(timestamp if timestamp is not None else time.time())
+        self.requests = {}
+        self.connections = 0
+        # The next this many requests are answered with a 503, as a node
+        # that's temporarily unavailable would.
+        self.unavailable = 0
+        self.lock = threading.Lock()
+
+        # Transactions sent to us, by ID, along with the round they were sent
+        # in. Each is confirmed in the next round, unless it's been set to be
+        # rejected, when it's dropped from the pool with an error.
+        self.transactions = {}
+        self.rejected = set()
+
+        self.assets = {}
+        for i in range(assets):
+            asset_id = FIRST_ASSET_ID + i
+            self.assets[asset_id] = {
+                'index': asset_id,
+                'params': {
+                    'creator': DEPLOYER,
+                    'decimals': 6,
+                    'name': 'Asset {}'.format(i),
+                    'unit-name': 'A{}'.format(i),
+                    'total': 10_000_000_000_000,
+                },
+            }
+
+        asset_ids = list(self.assets) or [FIRST_ASSET_ID]
+        self.apps = {}
+        for i in range(pools):
+            app_id = FIRST_APP_ID + i
+            self.apps[app_id] = {
+                'id': app_id,
+                'params': {
+                    'creator': DEPLOYER,
+                    'global-state': [
+                        state_entry('SA', asset_ids[i % len(asset_ids)]),
+                        state_entry('RA', asset_ids[(i + 1) % len(asset_ids)]),
+                        state_entry('BT', self.timestamp - 3600),
+                        state_entry('ET', self.timestamp + 3600 * (i % 3 - 1)),
+                        state_entry('FR', 1000),
+                        state_entry('TS', 1_000_000),
+                        state_entry('TR', 1_000_000_000),
+                    ],
+                },
+            }
+
+        self.accounts = {
+            DEPLOYER: {
+                'address': DEPLOYER,
+                'amount': 1_000_000_000,
+                'apps-local-state': [],
+                'created-apps': list(self.apps.values()),
+                'created-assets': list(self.assets.values()),
+            },
+        }
+
+        # Accounts staking in the pools, spread evenly between them.
+        if self.apps:
+            for i in range(accounts):
+                self.opt_in(staker(i), FIRST_APP_ID + i % len(self.apps), staked=1_000 * (i + 1), last_updated=self.timestamp - 3600)
+
+    # Opt an account in to a pool, with the local state given.
+    def opt_in(self, address, app_id, staked=0, rewarded=0, last_updated=0):
+        account = self.accounts.setdefault(address, {
+            'address': address,
+            'amount': 1_000_000,
+            'apps-local-state': [],
+            'created-apps': [],
+            'created-assets': [],
+        })
+        account['apps-local-state'].append({
+            'id': app_id,
+            'key-value': [
+                state_entry('AS', staked),
+                state_entry('AR', rewarded),
+                state_entry('LU', last_updated),
+            ],
+        })
+
+    # Rounds move forward every round_time seconds from when we were created,
+    # with the first round stamped with the timestamp we were given.
+    def current_round(self):
+        return self.first_round + int((time.monotonic() - self.started) / self.round_time)
+
+    # Move the chain on by a number of rounds straight away.
+    def advance(self, rounds=1):
+        self.started -= rounds * self.round_time
+
+    def round_timestamp(self, rnd):
+        return self.timestamp + int((rnd - self.first_round) * self.round_time)
+
+    # Each handler receives the regex match for its route, the query
+    # parameters and the request body, and returns a status code along with the JSON body (or the
+    # raw bytes of a msgpack one).
+    def status(self, m, query, body):
+        rnd = self.current_round()
+        since = time.monotonic() - self.started - (rnd - self.first_round) * self.round_time
+        return 200, {
+            'last-round': rnd,
+            'time-since-last-round': int(since * 1000000000),
+            'catchup-time': 0,
+        }
+
+    # Like algod, wait for the round after the one given (or give up after a
+    # while) and then return the status.
+    def wait_for_block(self, m, query, body):
+        deadline = time.monotonic() + 5
+        while self.current_round() <= int(m[1]) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.status(m, query, body)
+
+    # Blocks are empty, nothing happens on the fake chain.
+    def block(self, m, query, body):
+        block = {'block': {'rnd': int(m[1]), 'ts': self.round_timestamp(int(m[1]))}}
+        if query.get('format') == 'msgpack':
+            return 200, msgpack.packb(block)
+        return 200, block
+
+    def account(self, m, query, body):
+        if m[1] not in self.accounts:
+            return 200, {'address': m[1], 'amount': 0, 'apps-local-state': [], 'created-apps': [], 'created-assets': []}
+        return 200, self.accounts[m[1]]
+
+    def asset(self, m, query, body):
+        if int(m[1]) not in self.assets:
+            return 404, {'message': 'asset does not exist'}
+        return 200, self.assets[int(m[1])]
+
+    def application(self, m, query, body):
+        if int(m[1]) not in self.apps:
+            return 404, {'message': 'application does not exist'}
+        return 200, self.apps[int(m[1])]
+
+    def params(self, m, query, body):
+        return 200, {
+            'consensus-version': 'future',
+            'fee': 0,
+            'genesis-hash': 'SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=',
+            'genesis-id': 'sandnet-v1',
+            'last-round': self.current_round(),
+            'min-fee': 1000,
+        }
+
+    def send(self, m, query, body):
+        rnd = self.current_round()
+        txids = []
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        unpacker.feed(body)
+        for stxn in unpacker:
+            txid = transaction_id(stxn['txn'])
+            self.transactions[txid] = (stxn, rnd)
+            txids.append(txid)
+        return 200, {'txId': txids[0]}
+
+    def pending_transactions(self, m, query, body):
+        rnd = self.current_round()
+        pending = [stxn for txid, (stxn, sent) in self.transactions.items() if sent >= rnd and txid not in self.rejected]
+        return 200, msgpack.packb({'top-transactions': pending, 'total-transactions': len(pending)})
+
+    def pending_transaction(self, m, query, body):
+        if m[1] not in self.transactions:
+            return 404, {'message': 'txn does not exist'}
+        stxn, sent = self.transactions[m[1]]
+        info = {'txn': {}, 'pool-error': ''}
+        if m[1] in self.rejected:
+            info['pool-error'] = 'transaction rejected'
+        elif self.current_round() > sent:
+            info['confirmed-round'] = sent + 1
+        return 200, info
+
+    # There's no assembler here, so the "bytecode" is just derived from the
+    # source, which is enough to tell programs apart.
+    def compile(self, m, query, body):
+        program = b'\x06' + hashlib.sha256(body).digest()
+        return 200, {'hash': logic.address(program), 'result': base64.b64encode(program).decode()}
+
+    routes = [
+        (re.compile(r'^/v2/status$'), 'status'),
+        (re.compile(r'^/v2/status/wait-for-block-after/(\d+)$'), 'wait_for_block'),
+        (re.compile(r'^/v2/blocks/(\d+)$'), 'block'),
+        (re.compile(r'^/v2/accounts/(\w+)$'), 'account'),
+        (re.compile(r'^/v2/assets/(\d+)$'), 'asset'),
+        (re.compile(r'^/v2/applications/(\d+)$'), 'application'),
+        (re.compile(r'^/v2/transactions/params$'), 'params'),
+        (re.compile(r'^/v2/teal/compile$'), 'compile'),
+        (re.compile(r'^/v2/transactions$'), 'send'),
+        (re.compile(r'^/v2/transactions/pending$'), 'pending_transactions'),
+        (re.compile(r'^/v2/transactions/pending/(\w+)$'), 'pending_transaction'),
+    ]
+
+    def handle(self, method, path, body=b''):
+        path, _, query = path.partition('?')
+        query = dict(parse.parse_qsl(query))
+        for pattern, name in self.routes:
+            m = pattern.match(path)
+            if m:
+                with self.lock:
+                    self.requests[name] = self.requests.get(name, 0) + 1
+                    if self.unavailable:
+                        self.unavailable -= 1
+                        return 503, {'message': 'service unavailable'}
+                if self.latency:
+                    time.sleep(self.latency)
+                return getattr(self, name)(m, query, body)
+        return 404, {'message': 'unknown route'}
+
+    # Total number of requests served, or the number for a single route.
+    def request_count(self, name=None):
+        with self.lock:
+            if name is None:
+                return sum(self.requests.values())
+            return self.requests.get(name, 0)
+
+    def reset_counts(self):
+        with self.lock:
+            self.requests = {}
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            # Like algod, don't hold back small writes on keep-alive
+            # connections waiting for an ACK.
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with fake.lock:
+                    fake.connections += 1
+
+            def respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                request_body = self.rfile.read(length) if length else b''
+                code, body = fake.handle(self.command, self.path, request_body)
+                if isinstance(body, bytes):
+                    payload, content_type = body, 'application/msgpack'
+                else:
+                    payload, content_type = json.dumps(body).encode(), 'application/json'
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = respond
+            do_POST = respond
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 128
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.address = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
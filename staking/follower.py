@@ -0,0 +1,158 @@
+from django.db import transaction
+
+from algosdk import encoding
+from algosdk.future.transaction import OnComplete
+
+from .models import Account, Checkpoint, Pool, Position
+from .state import GLOBAL_FIELDS, LOCAL_FIELDS
+
+import msgpack
+
+# Follows the chain a block at a time, applying the changes made to the
+# staking pools to the state mirror's models.
+#
+# Every application call carries the changes it made to the application's
+# global state, and to the local state of the accounts it references, in its
+# eval delta. Calls to pools we know about (or the deployer creating a new
+# one) are picked out of each block and those changes applied to the rows.
+# Pools and accounts which weren't touched are left alone, but marked as up
+# to date as of the round.
+#
+# Local state is only followed for accounts the mirror already has a full
+# copy of, a change to a single key doesn't tell us about the rest.
+#
+# The last round processed is kept in a Checkpoint, so after a restart we
+# carry on from where we left off. If we're more than 'max_catchup' rounds
+# behind, it's quicker to refetch everything from the node instead.
+
+# The action recorded for each key in an eval delta.
+SET_BYTES = 1
+SET_UINT = 2
+DELETE = 3
+
+# algod encodes state keys and byte values as msgpack strings, which needn't
+# be valid UTF-8, so they're decoded with surrogate escapes and turned back
+# into the original bytes here.
+def raw(value):
+    if isinstance(value, str):
+        return value.encode('utf-8', 'surrogateescape')
+    return value
+
+def delta_value(delta):
+    action = delta.get('at')
+    if action == SET_BYTES:
+        return raw(delta.get('bs', b''))
+    if action == SET_UINT:
+        return delta.get('ui', 0)
+    return None
+
+def decode_block(data):
+    return msgpack.unpackb(data, raw=False, unicode_errors='surrogateescape', strict_map_key=False)['block']
+
+# Every application call in the block, including those made by other
+# applications as inner transactions.
+def app_calls(stxns):
+    for stxn in stxns:
+        if stxn['txn'].get('type') == 'appl':
+            yield stxn
+        yield from app_calls(stxn.get('dt', {}).get('itx', []))
+
+class BlockFollower:
+    def __init__(self, client, clock, mirror, name='blocks', max_catchup=1000):
+        self.client = client
+        self.mirror = mirror
+        self.name = name
+        self.max_catchup = max_catchup
+        clock.subscribe(self.follow)
+
+    def checkpoint(self):
+        row = Checkpoint.objects.filter(name=self.name).first()
+        return row.round if row is not None else None
+
+    def fetch(self, rnd):
+        return decode_block(self.client.block_info(rnd, response_format='msgpack'))
+
+    # Called by the chain clock with each new round.
+    def follow(self, snapshot):
+        self.catch_up(snapshot[0])
+
+    # Process every round after the checkpoint, up to and including last_round.
+    def catch_up(self, last_round):
+        checkpoint = self.checkpoint()
+        if checkpoint is None or last_round - checkpoint > self.max_catchup:
+            # Everything is fetched before the transaction, so the database
+            # isn't locked while we wait on the node.
+            fetched = self.mirror.fetch_all(last_round)
+            with transaction.atomic():
+                self.mirror.store_all(fetched, last_round)
+                Checkpoint.objects.update_or_create(name=self.name, defaults={'round': last_round})
+            return
+
+        for rnd in range(checkpoint + 1, last_round + 1):
+            self.apply(rnd, self.fetch(rnd))
+
+    def apply(self, rnd, block):
+        with transaction.atomic():
+            for stxn in app_calls(block.get('txns', [])):
+                self.apply_call(rnd, stxn)
+
+            # Everything else hasn't changed, so is now up to date as of this
+            # round. Rows fetched from the node after this round are left be.
+            Pool.objects.filter(round__lt=rnd).update(round=rnd)
+            Account.objects.filter(round__lt=rnd).update(round=rnd)
+            Checkpoint.objects.update_or_create(name=self.name, defaults={'round': rnd})
+
+    def apply_call(self, rnd, stxn):
+        txn = stxn['txn']
+        delta = stxn.get('dt', {})
+        sender = encoding.encode_address(txn['snd'])
+        on_complete = txn.get('apan', OnComplete.NoOpOC)
+
+        # A new application has no ID in the call, it's given in the apply
+        # data instead.
+        app_id = txn.get('apid') or stxn.get('apid')
+        pool = Pool.objects.filter(app_id=app_id).first()
+        if pool is None:
+            if 'apid' in txn or sender not in self.mirror.deployers:
+                return
+            pool = Pool(app_id=app_id, creator=sender, round=rnd - 1, changed=rnd)
+
+        if pool.round < rnd:
+            if on_complete == OnComplete.DeleteApplicationOC:
+                pool.delete()
+                return
+            for key, value in delta.get('gd', {}).items():
+                field = GLOBAL_FIELDS.get(raw(key))
+                if field is not None:
+                    setattr(pool, field, delta_value(value))
+                    pool.changed = rnd
+            pool.save()
+
+        # Local state deltas are indexed by the account's position in the
+        # call, the sender first and then the accounts array.
+        accounts = [sender] + [encoding.encode_address(account) for account in txn.get('apat', [])]
+        followed = set(Account.objects.filter(address__in=accounts, round__lt=rnd).values_list('address', flat=True))
+
+        changed = set()
+        if sender in followed:
+            if on_complete in (OnComplete.CloseOutOC, OnComplete.ClearStateOC):
+                Position.objects.filter(pool=pool, account_id=sender).delete()
+                followed.discard(sender)
+                changed.add(sender)
+            elif on_complete == OnComplete.OptInOC:
+                Position.objects.get_or_create(pool=pool, account_id=sender)
+                changed.add(sender)
+
+        for index, changes in delta.get('ld', {}).items():
+            address = accounts[index]
+            if address not in followed:
+                continue
+            position, _ = Position.objects.get_or_create(pool=pool, account_id=address)
+            for key, value in changes.items():
+                field = LOCAL_FIELDS.get(raw(key))
+                if field is not None:
+                    setattr(position, field, delta_value(value))
+            position.save()
+            changed.add(address)
+
+        Account.objects.filter(address__in=changed).update(changed=rnd)
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from dataclasses import astuple, is_dataclass
+
+from algosdk.future.transaction import SuggestedParams
+from django.conf import settings
+
+import json
+import threading
+import time
+
+# A cache of the unsigned transaction groups built in transactions.py, so a
+# user double clicking or retrying gets back the group they were given a
+# moment ago, rather than it being composed and encoded all over again.
+#
+# The builders are deterministic, so a group is identified by the builder and
+# everything passed to it: the request data, the pool state and position
+# read for it, and the window of rounds the suggested parameters are valid
+# for. Once the parameters move on to a new window, the old groups are never
+# asked for again and are left to be evicted.
+
+# The part of a value which decides what gets built, in a form that can be
+# hashed and compared.
+def freeze(value):
+    if isinstance(value, SuggestedParams):
+        return (value.first, value.last, value.gh, value.gen)
+    if is_dataclass(value):
+        return (type(value).__name__,) + astuple(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+class GroupCache:
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # The total time spent building groups, and how long it would have
+        # taken to build again those that were found in the cache.
+        self.build_time = 0.0
+        self.time_saved = 0.0
+
+    def key(self, builder, args):
+        return (builder.__name__,) + tuple(freeze(arg) for arg in args)
+
+    # Build the group with 'builder', unless it's been built with the same
+    # arguments before.
+    def build(self, builder, *args):
+        key = self.key(builder, args)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                group, elapsed = entry
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.time_saved += elapsed
+                return [dict(txn) for txn in group]
+            self.misses += 1
+
+        start = time.perf_counter()
+        group = builder(*args)
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            self.build_time += elapsed
+            self.entries[key] = ([dict(txn) for txn in group], elapsed)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return group
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'build_time': self.build_time,
+                'time_saved': self.time_saved,
+            }
+
+group_cache = GroupCache(
+    max_size=getattr(settings, 'STAKING_GROUP_CACHE_SIZE', 1024),
+)
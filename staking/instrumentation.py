@@ -0,0 +1,174 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from django.template import loader
+from django.views.decorators.http import require_GET
+
+from .algod import algod_metrics
+from .pages import page_cache
+from .singleflight import algod_single_flight
+from .timing import RequestTimings, current_timings, timed
+
+import threading
+import time
+
+# Times each request with a RequestTimings (see timing.py), sends the
+# breakdown back in a Server-Timing header, and keeps totals for every URL to
+# be scraped by Prometheus from /metrics.
+
+# Upper bounds of the request duration histogram, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Render the template, timing it against the request.
+def render_template(name, context, request):
+    with timed('template'):
+        return loader.get_template(name).render(context, request)
+
+# The totals for every URL, since the server started.
+class RequestMetrics:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint, status, seconds, timings):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {
+                    'count': 0,
+                    'errors': 0,
+                    'total': 0.0,
+                    'buckets': [0] * len(self.buckets),
+                    'phases': {},
+                    'algod_calls': {},
+                }
+            stats['count'] += 1
+            stats['errors'] += status >= 500
+            stats['total'] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stats['buckets'][i] += 1
+            with timings.lock:
+                for phase, (phase_seconds, count) in timings.phases.items():
+                    total, calls = stats['phases'].get(phase, (0.0, 0))
+                    stats['phases'][phase] = (total + phase_seconds, calls + count)
+                for algod_endpoint, count in timings.algod_calls.items():
+                    stats['algod_calls'][algod_endpoint] = stats['algod_calls'].get(algod_endpoint, 0) + count
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+    # The metrics in the Prometheus text format.
+    def export(self):
+        lines = []
+
+        def metric(name, kind, description):
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+        def sample(name, labels, value):
+            label_text = ','.join('{}="{}"'.format(key, str(label).replace('\\', '\\\\').replace('"', '\\"')) for key, label in labels.items())
+            lines.append('{}{{{}}} {}'.format(name, label_text, value))
+
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+
+            metric('staking_request_duration_seconds', 'histogram', 'Time taken to handle requests, by URL name.')
+            for endpoint, stats in endpoints:
+                for bound, count in zip(self.buckets, stats['buckets']):
+                    sample('staking_request_duration_seconds_bucket', {'endpoint': endpoint, 'le': bound}, count)
+                sample('staking_request_duration_seconds_bucket', {'endpoint': endpoint, 'le': '+Inf'}, stats['count'])
+                sample('staking_request_duration_seconds_sum', {'endpoint': endpoint}, stats['total'])
+                sample('staking_request_duration_seconds_count', {'endpoint': endpoint}, stats['count'])
+
+            metric('staking_request_errors_total', 'counter', 'Requests answered with a server error, by URL name.')
+            for endpoint, stats in endpoints:
+                sample('staking_request_errors_total', {'endpoint': endpoint}, stats['errors'])
+
+            metric('staking_request_phase_seconds_total', 'counter', 'Time spent in each phase of handling requests, by URL name.')
+            for endpoint, stats in endpoints:
+                for phase, (seconds, _) in sorted(stats['phases'].items()):
+                    sample('staking_request_phase_seconds_total', {'endpoint': endpoint, 'phase': phase}, seconds)
+
+            metric('staking_request_phase_calls_total', 'counter', 'Number of times each phase was entered, by URL name.')
+            for endpoint, stats in endpoints:
+                for phase, (_, count) in sorted(stats['phases'].items()):
+                    sample('staking_request_phase_calls_total', {'endpoint': endpoint, 'phase': phase}, count)
+
+            metric('staking_request_algod_calls_total', 'counter', 'Requests made to the algod node, by URL name and algod endpoint.')
+            for endpoint, stats in endpoints:
+                for algod_endpoint, count in sorted(stats['algod_calls'].items()):
+                    sample('staking_request_algod_calls_total', {'endpoint': endpoint, 'algod_endpoint': algod_endpoint}, count)
+
+        # Every request to the node, including those made in the background.
+        upstream = sorted(algod_metrics.snapshot().items())
+        metric('staking_algod_request_seconds', 'summary', 'Latency of the requests sent to the algod node, by endpoint.')
+        for algod_endpoint, stats in upstream:
+            sample('staking_algod_request_seconds_sum', {'algod_endpoint': algod_endpoint}, stats['total'])
+            sample('staking_algod_request_seconds_count', {'algod_endpoint': algod_endpoint}, stats['count'])
+        metric('staking_algod_request_errors_total', 'counter', 'Failed requests to the algod node, by endpoint.')
+        for algod_endpoint, stats in upstream:
+            sample('staking_algod_request_errors_total', {'algod_endpoint': algod_endpoint}, stats['errors'])
+
+        shared = algod_single_flight.stats()
+        metric('staking_algod_shared_total', 'counter', 'Requests to the algod node which were sent, or saved by sharing another.')
+        for outcome in ('upstream', 'coalesced', 'memo_hits'):
+            sample('staking_algod_shared_total', {'outcome': outcome}, shared[outcome])
+
+        pages = page_cache.stats()
+        metric('staking_page_cache_total', 'counter', 'Pool pages and fragments found in the cache, or rendered.')
+        for layer, prefix in (('page', ''), ('fragment', 'fragment_')):
+            sample('staking_page_cache_total', {'layer': layer, 'outcome': 'hit'}, pages[prefix + 'hits'])
+            sample('staking_page_cache_total', {'layer': layer, 'outcome': 'miss'}, pages[prefix + 'misses'])
+
+        return '\n'.join(lines) + '\n'
+
+request_metrics = RequestMetrics()
+
+# Times every request. Works for both the sync and async views.
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'STAKING_SERVER_TIMING', True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    def finish(self, request, response, timings, seconds):
+        match = request.resolver_match
+        endpoint = (match.url_name or match.view_name) if match is not None else 'unmatched'
+        request_metrics.record(endpoint, response.status_code, seconds, timings)
+        if self.server_timing:
+            response['Server-Timing'] = timings.header(seconds)
+        return response
+
+# Everything recorded above, for Prometheus to scrape.
+@require_GET
+def metrics(request):
+    return HttpResponse(request_metrics.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
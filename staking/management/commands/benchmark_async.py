@@ -0,0 +1,155 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from concurrent.futures import ThreadPoolExecutor
+
+from staking import async_views, views
+from staking.assets import asset_cache
+from staking.fakealgod import FakeAlgod, DEPLOYER, FIRST_APP_ID
+from staking.groups import group_cache
+from staking.pages import page_cache
+from staking.programs import program_store
+from staking.singleflight import algod_single_flight
+from staking.urls import build_urlpatterns
+
+from pathlib import Path
+
+import asyncio
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+import types
+
+# A URL configuration holding just the staking URLs, served by the given
+# version of the views.
+def urlconf(name, module):
+    conf = types.ModuleType(name)
+    conf.urlpatterns = build_urlpatterns(module)
+    return conf
+
+# A database of our own, which is thrown away afterwards, so the benchmarks
+# never touch the real one. SQLite's is a file rather than in memory, so the
+# threads can share it. Yields a temporary directory for anything else.
+@contextlib.contextmanager
+def throwaway_database():
+    directory = tempfile.TemporaryDirectory()
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    test_name = test_settings.get('NAME')
+    if connection.vendor == 'sqlite':
+        test_settings['NAME'] = os.path.join(directory.name, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield Path(directory.name)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = test_name
+        directory.cleanup()
+
+# Everything the views cache, emptied so each run starts out cold.
+def invalidate_caches():
+    asset_cache.invalidate()
+    group_cache.invalidate()
+    page_cache.invalidate()
+    algod_single_flight.new_round(None)
+    views.params_cache.params = None
+
+# Point the views at the fake node, and put them back afterwards. The chain
+# clock is stopped, so the next caller starts it against the real node, and
+# nothing learnt from the fake is kept.
+@contextlib.contextmanager
+def using_fake(fake, directory):
+    addresses = (views.algod_client.algod_address, async_views.async_algod_client.algod_address)
+    cache_dir = program_store.cache_dir
+    views.algod_client.algod_address = fake.address
+    async_views.async_algod_client.algod_address = fake.address
+    # The fake node's "bytecode" mustn't end up in the real program cache.
+    program_store.cache_dir = directory / 'build'
+    program_store.programs = {}
+    try:
+        yield
+    finally:
+        views.chain_clock.stop()
+        views.chain_clock.snapshot = None
+        views.algod_client.algod_address, async_views.async_algod_client.algod_address = addresses
+        program_store.cache_dir = cache_dir
+        program_store.programs = {}
+        invalidate_caches()
+
+# The requests we'll make, as (name, method, path, body).
+def requests():
+    return [
+        ('index', 'get', '/', None),
+        ('pool', 'get', '/pool/{}'.format(FIRST_APP_ID), None),
+        ('deposit', 'post', '/{}/deposit'.format(FIRST_APP_ID), json.dumps({'sender': DEPLOYER, 'amount': 1})),
+    ]
+
+class Command(BaseCommand):
+    help = 'Compare requests per second of the sync views under WSGI against the async views under ASGI, against a local fake algod.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--latency', type=float, default=0.02, help='Seconds of delay added to each algod request.')
+        parser.add_argument('--pools', type=int, default=20)
+        parser.add_argument('--assets', type=int, default=4)
+
+    # Drive the sync views through Django's WSGI handler from a pool of threads.
+    def run_sync(self, method, url, body, options):
+        local = threading.local()
+
+        def one(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.cookies['account'] = DEPLOYER
+            if method == 'get':
+                response = local.client.get(url)
+            else:
+                response = local.client.post(url, body, content_type='application/json')
+            assert response.status_code == 200, response.status_code
+
+        # The first request fills the empty database, so isn't timed.
+        one(None)
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            start = time.perf_counter()
+            list(executor.map(one, range(options['requests'])))
+            return options['requests'] / (time.perf_counter() - start)
+
+    # Drive the async views through Django's ASGI handler on one event loop.
+    def run_async(self, method, url, body, options):
+        async def run():
+            client = AsyncClient()
+            client.cookies['account'] = DEPLOYER
+            slots = asyncio.Semaphore(options['concurrency'])
+
+            async def one():
+                async with slots:
+                    if method == 'get':
+                        response = await client.get(url)
+                    else:
+                        response = await client.post(url, body, content_type='application/json')
+                assert response.status_code == 200, response.status_code
+
+            await one()
+            start = time.perf_counter()
+            await asyncio.gather(*[one() for _ in range(options['requests'])])
+            return options['requests'] / (time.perf_counter() - start)
+
+        return asyncio.run(run())
+
+    def handle(self, *args, **options):
+        with throwaway_database() as directory, FakeAlgod(pools=options['pools'], assets=options['assets'], latency=options['latency']) as fake, using_fake(fake, directory):
+            self.stdout.write('{:<10} {:>12} {:>12}'.format('request', 'wsgi req/s', 'asgi req/s'))
+            for name, method, url, body in requests():
+                results = []
+                for conf, run in ((urlconf('sync_urls', views), self.run_sync), (urlconf('async_urls', async_views), self.run_async)):
+                    with override_settings(ROOT_URLCONF=conf, ALLOWED_HOSTS=['testserver']):
+                        clear_url_caches()
+                        results.append(run(method, url, body, options))
+                clear_url_caches()
+                self.stdout.write('{:<10} {:>12.1f} {:>12.1f}'.format(name, *results))
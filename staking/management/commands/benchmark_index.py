@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from algosdk import v2client
+
+from staking.assets import asset_cache
+from staking.fakealgod import FakeAlgod, DEPLOYER
+from staking.pools import collect_asset_ids
+from staking.state import decode_pool
+
+import base64
+import time
+
+# The way the index page used to look up assets, one after another and twice
+# per pool. Kept here so we have something to compare against.
+def list_pools_sequential(client, deployer):
+    apps = client.account_info(deployer)['created-apps']
+    for app in apps:
+        for gs in app['params']['global-state']:
+            match base64.b64decode(gs['key']).decode('utf8'):
+                case "SA":
+                    app['staking_asset'] = client.asset_info(gs['value']['uint'])
+                case "RA":
+                    app['reward_asset'] = client.asset_info(gs['value']['uint'])
+    return apps
+
+# The pools, with the details of each distinct asset fetched once through the
+# asset cache. The cache is emptied first, so we're measuring the cost of
+# fetching the assets rather than reading them from memory.
+def list_pools_cold(client):
+    asset_cache.invalidate()
+    apps = client.account_info(DEPLOYER)['created-apps']
+    states = [decode_pool(app) for app in apps]
+    assets = asset_cache.get_many(client, collect_asset_ids(states))
+    return states, assets
+
+class Command(BaseCommand):
+    help = 'Measure the pool listing against a local stub algod with a varying number of pools and assets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pools', type=int, nargs='+', default=[10, 50, 200])
+        parser.add_argument('--assets', type=int, nargs='+', default=[2, 20])
+        parser.add_argument('--latency', type=float, default=0.005, help='Seconds of delay added to each algod request.')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:>6} {:>7} {:>12} {:>8} {:>12} {:>8}'.format('pools', 'assets', 'sequential', 'calls', 'engine', 'calls'))
+        for pools in options['pools']:
+            for assets in options['assets']:
+                with FakeAlgod(pools=pools, assets=assets, latency=options['latency']) as fake:
+                    client = v2client.algod.AlgodClient('a' * 64, fake.address)
+                    results = []
+                    for fn in (lambda: list_pools_sequential(client, DEPLOYER), lambda: list_pools_cold(client)):
+                        fake.reset_counts()
+                        start = time.perf_counter()
+                        for _ in range(options['repeat']):
+                            fn()
+                        elapsed = (time.perf_counter() - start) / options['repeat']
+                        results.append((elapsed * 1000, fake.request_count() // options['repeat']))
+                self.stdout.write('{:>6} {:>7} {:>10.1f}ms {:>8} {:>10.1f}ms {:>8}'.format(pools, assets, results[0][0], results[0][1], results[1][0], results[1][1]))
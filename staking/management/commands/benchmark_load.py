@@ -0,0 +1,254 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from algosdk import account, encoding
+from algosdk.future import transaction
+
+from concurrent.futures import ThreadPoolExecutor
+
+from staking import async_views, views
+from staking.fakealgod import FakeAlgod, DEPLOYER, FIRST_APP_ID, FIRST_ASSET_ID
+from staking.urls import build_urlpatterns
+from staking.management.commands.benchmark_async import invalidate_caches, throwaway_database, urlconf, using_fake
+
+import asyncio
+import datetime
+import json
+import math
+import threading
+import time
+
+# A load test of every URL the staking app serves, against a fake algod node
+# (see fakealgod.py) in a throwaway database, so the results only depend on the
+# options given. Each request is made many times from a number of clients at
+# once, through the sync views under WSGI and the async views under ASGI, and
+# the latency percentiles and throughput are reported.
+#
+# Save the results with --save, and compare a later run against them with
+# --baseline to catch requests which have got slower.
+
+# The pools the fake node has are alternately ended and live (see FakeAlgod),
+# these are one of each.
+ENDED_POOL = FIRST_APP_ID
+LIVE_POOL = FIRST_APP_ID + 2
+
+# The p'th percentile of the sorted samples, by the nearest rank.
+def percentile(samples, p):
+    return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+# A signed transaction for /submit, a different one each time.
+def signed_group(key, address, i):
+    sp = transaction.SuggestedParams(1000, 1000, 2000, 'SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=', 'sandnet-v1', flat_fee=True)
+    stxn = transaction.PaymentTxn(address, sp, address, 0, note=i.to_bytes(8, 'big')).sign(key)
+    return json.dumps([{'blob': encoding.msgpack_encode(stxn)}])
+
+# The requests we'll make, as (name, url name, method, path, body). The body
+# is worked out from the number of the request, so they're not all the same.
+def scenarios(txid, key, address):
+    tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+
+    # A new pool, beginning n minutes after tomorrow and lasting a day.
+    def pool_request(n=0):
+        begin = tomorrow + datetime.timedelta(minutes=n)
+        end = begin + datetime.timedelta(days=1)
+        return {'staking': FIRST_ASSET_ID, 'reward': FIRST_ASSET_ID + 1, 'begin': begin.strftime('%Y-%m-%dT%H:%M'), 'end': end.strftime('%Y-%m-%dT%H:%M')}
+
+    return [
+        ('index', 'index', 'get', '/', None),
+        ('index (live)', 'index', 'get', '/?status=live&sort=-end', None),
+        ('pool', 'pool', 'get', '/pool/{}'.format(LIVE_POOL), None),
+        ('pool (ended)', 'pool', 'get', '/pool/{}'.format(ENDED_POOL), None),
+        ('deposit', 'deposit', 'post', '/{}/deposit'.format(LIVE_POOL), lambda i: json.dumps({'sender': DEPLOYER, 'amount': 1 + i % 50})),
+        ('withdraw', 'withdraw', 'post', '/{}/withdraw'.format(LIVE_POOL), lambda i: json.dumps({'sender': DEPLOYER, 'amount': 1 + i % 50, 'all': False})),
+        ('claim', 'claim', 'post', '/{}/claim'.format(LIVE_POOL), lambda i: json.dumps({'sender': DEPLOYER})),
+        ('rewards', 'rewards', 'get', '/{}/rewards/{}'.format(LIVE_POOL, DEPLOYER), None),
+        ('stream', 'stream', 'get', '/{}/stream'.format(LIVE_POOL), None),
+        ('submit', 'submit', 'post', '/submit', lambda i: signed_group(key, address, i)),
+        ('transaction_status', 'transaction_status', 'get', '/transactions/{}'.format(txid), None),
+        ('transaction_stream', 'transaction_stream', 'get', '/transactions/{}/stream'.format(txid), None),
+        ('new_pool', 'new_pool', 'get', '/new_pool', None),
+        ('create_pool', 'create_pool', 'post', '/create_pool', lambda i: json.dumps({'sender': DEPLOYER, **pool_request()})),
+        ('init_pool', 'init_pool', 'post', '/init_pool', lambda i: json.dumps({'sender': DEPLOYER, 'pool_id': LIVE_POOL, 'fixed-rate': 1 + i % 50})),
+        ('create_pools', 'create_pools', 'post', '/create_pools', lambda i: json.dumps({'sender': DEPLOYER, 'pools': [pool_request(n) for n in range(8)]})),
+        ('init_pools', 'init_pools', 'post', '/init_pools', lambda i: json.dumps({'sender': DEPLOYER, 'pools': [{'pool_id': FIRST_APP_ID + n, 'fixed-rate': 1 + i % 50} for n in range(8)]})),
+        ('new_asset', 'new_asset', 'get', '/new_asset', None),
+        ('create_asset', 'create_asset', 'post', '/create_asset', lambda i: json.dumps({'sender': DEPLOYER, 'total': 1 + i, 'decimals': 0, 'name': 'Asset', 'unit_name': 'A'})),
+        ('api_pools', 'api_pools', 'get', '/api/pools', None),
+        ('api_pool', 'api_pool', 'get', '/api/pools/{}'.format(LIVE_POOL), None),
+        ('api_position', 'api_position', 'get', '/api/pools/{}/accounts/{}'.format(LIVE_POOL, DEPLOYER), None),
+        ('api_programs', 'api_programs', 'get', '/api/programs', None),
+        ('api_algod', 'api_algod', 'get', '/api/algod', None),
+        ('metrics', 'metrics', 'get', '/metrics', None),
+    ]
+
+class Command(BaseCommand):
+    help = 'Load test every staking URL with the sync and async views against a local fake algod, reporting latency percentiles and throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests made to each URL.')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=5, help='Requests made to each URL before timing it.')
+        parser.add_argument('--latency', type=float, default=0.02, help='Seconds of delay added to each algod request.')
+        parser.add_argument('--pools', type=int, default=20)
+        parser.add_argument('--assets', type=int, default=4)
+        parser.add_argument('--accounts', type=int, default=100, help='Accounts staking in the pools.')
+        parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+        parser.add_argument('--only', nargs='+', help='Only the requests with these names.')
+        parser.add_argument('--save', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare against the results saved in this JSON file.')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='How much slower (as a fraction) than the baseline a request may be.')
+
+    # Make a request with the test client, reading the first event of any
+    # stream and then hanging up.
+    def request(self, client, method, path, body):
+        if method == 'get':
+            response = client.get(path)
+        else:
+            response = client.post(path, body, content_type='application/json')
+        if response.streaming:
+            next(iter(response.streaming_content))
+            response.close()
+        return response.status_code
+
+    async def arequest(self, client, method, path, body):
+        if method == 'get':
+            response = await client.get(path)
+        else:
+            response = await client.post(path, body, content_type='application/json')
+        if response.streaming:
+            content = response.streaming_content
+            if hasattr(content, '__anext__'):
+                await content.__anext__()
+                await content.aclose()
+            else:
+                next(content)
+                content.close()
+        return response.status_code
+
+    # Drive the sync views through Django's WSGI handler from a pool of
+    # threads, returning the latency of each request, the number which
+    # failed and the total time taken.
+    def run_sync(self, method, path, body, options):
+        local = threading.local()
+
+        def one(i):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.cookies['account'] = DEPLOYER
+            start = time.perf_counter()
+            status = self.request(local.client, method, path, body(i) if body else None)
+            return time.perf_counter() - start, status >= 400
+
+        for i in range(options['warmup']):
+            one(i)
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(one, range(options['requests'])))
+            return results, time.perf_counter() - start
+
+    # Drive the async views through Django's ASGI handler on one event loop.
+    def run_async(self, method, path, body, options):
+        async def run():
+            client = AsyncClient()
+            client.cookies['account'] = DEPLOYER
+            slots = asyncio.Semaphore(options['concurrency'])
+
+            async def one(i):
+                async with slots:
+                    start = time.perf_counter()
+                    status = await self.arequest(client, method, path, body(i) if body else None)
+                    return time.perf_counter() - start, status >= 400
+
+            for i in range(options['warmup']):
+                await one(i)
+            start = time.perf_counter()
+            results = await asyncio.gather(*[one(i) for i in range(options['requests'])])
+            return results, time.perf_counter() - start
+
+        return asyncio.run(run())
+
+    def summarise(self, results, elapsed):
+        latencies = sorted(seconds for seconds, _ in results)
+        return {
+            'p50': percentile(latencies, 50) * 1000,
+            'p95': percentile(latencies, 95) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'rps': len(results) / elapsed,
+            'errors': sum(failed for _, failed in results),
+        }
+
+    # Send a transaction through the views, so there's one to ask about.
+    def submitted(self, client, key, address):
+        response = client.post('/submit', signed_group(key, address, 2 ** 63), content_type='application/json')
+        return response.json()['txid']
+
+    def benchmark(self, options):
+        # Every URL must be covered, so new ones aren't forgotten.
+        key, address = account.generate_account()
+        names = {pattern.name for pattern in build_urlpatterns(views)}
+        missing = names - {url_name for _, url_name, _, _, _ in scenarios('', key, address)}
+        if missing:
+            raise CommandError('No requests for {}'.format(', '.join(sorted(missing))))
+
+        modes = [('sync', views, self.run_sync), ('async', async_views, self.run_async)]
+        if options['mode'] != 'both':
+            modes = [mode for mode in modes if mode[0] == options['mode']]
+
+        results = {}
+        for mode, module, run in modes:
+            # Each run of the views starts out with nothing cached.
+            invalidate_caches()
+
+            conf = urlconf('{}_urls'.format(mode), module)
+            with override_settings(ROOT_URLCONF=conf, ALLOWED_HOSTS=['testserver']):
+                clear_url_caches()
+                client = Client()
+                txid = self.submitted(client, key, address)
+
+                self.stdout.write('{} views'.format(mode))
+                self.stdout.write('{:<20} {:>9} {:>9} {:>9} {:>9} {:>7}'.format('request', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+                results[mode] = {}
+                for name, _, method, path, body in scenarios(txid, key, address):
+                    if options['only'] and name not in options['only']:
+                        continue
+                    summary = self.summarise(*run(method, path, body, options))
+                    results[mode][name] = summary
+                    self.stdout.write('{:<20} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>7}'.format(name, summary['rps'], summary['p50'], summary['p95'], summary['p99'], summary['errors']))
+            clear_url_caches()
+        return results
+
+    # The requests which are slower than in the baseline by more than the
+    # tolerance.
+    def regressions(self, results, baseline, tolerance):
+        found = []
+        for mode, requests in results.items():
+            for name, summary in requests.items():
+                before = baseline.get(mode, {}).get(name)
+                if before is None:
+                    continue
+                if summary['p95'] > before['p95'] * (1 + tolerance):
+                    found.append('{} {}: p95 {:.1f}ms, was {:.1f}ms'.format(mode, name, summary['p95'], before['p95']))
+                if summary['rps'] * (1 + tolerance) < before['rps']:
+                    found.append('{} {}: {:.1f} req/s, was {:.1f}'.format(mode, name, summary['rps'], before['rps']))
+                if summary['errors'] > before['errors']:
+                    found.append('{} {}: {} errors, was {}'.format(mode, name, summary['errors'], before['errors']))
+        return found
+
+    def handle(self, *args, **options):
+        with throwaway_database() as directory, FakeAlgod(pools=options['pools'], assets=options['assets'], latency=options['latency'], accounts=options['accounts']) as fake, using_fake(fake, directory):
+            fake.opt_in(DEPLOYER, LIVE_POOL, staked=1_000_000, last_updated=fake.timestamp - 3600)
+            results = self.benchmark(options)
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump({'options': {name: options[name] for name in ('requests', 'concurrency', 'latency', 'pools', 'assets', 'accounts')}, 'results': results}, f, indent=1)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['results']
+            found = self.regressions(results, baseline, options['tolerance'])
+            if found:
+                raise CommandError('Slower than the baseline:\n' + '\n'.join(found))
+            self.stdout.write('No regressions against {}'.format(options['baseline']))
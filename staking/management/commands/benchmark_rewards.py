@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from staking import projection
+from staking.rewards import accrued_rewards
+from staking.state import PoolState, Position
+
+import numpy as np
+import time
+
+class Command(BaseCommand):
+    help = 'Compare projecting rewards for every staker with NumPy against the reward engine one at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stakers', type=int, default=100000)
+        parser.add_argument('--grid', type=int, default=24, help='Number of times to project rewards at.')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        stakers = options['stakers']
+        begin = 1650000000
+        state = PoolState(begin_timestamp=begin, end_timestamp=begin + 31557600, fixed_rate=1000, total_rewards=10 ** 14)
+        amount_staked = rng.integers(0, 10 ** 11, stakers, dtype=np.uint64)
+        amount_rewarded = rng.integers(0, 10 ** 9, stakers, dtype=np.uint64)
+        last_updated = rng.integers(begin - 86400, begin + 86400 * 30, stakers, dtype=np.uint64)
+        now = begin + 86400 * 60
+        grid = np.linspace(now, state.end_timestamp, options['grid'], dtype=np.uint64)
+
+        positions = [Position(amount_staked=int(a), amount_rewarded=int(r), last_updated=int(u)) for a, r, u in zip(amount_staked, amount_rewarded, last_updated)]
+
+        def timed(name, fn):
+            start = time.perf_counter()
+            result = fn()
+            self.stdout.write('{:<28} {:>10.1f}ms'.format(name, (time.perf_counter() - start) * 1000))
+            return result
+
+        expected = timed('accrued, one at a time', lambda: [accrued_rewards(state, p, now) for p in positions])
+        accrued, failed = timed('accrued, vectorized', lambda: projection.accrued_rewards(state, amount_staked, amount_rewarded, last_updated, now))
+        assert accrued.tolist() == expected and not failed.any()
+
+        timed('projected, one at a time', lambda: [[accrued_rewards(state, p, int(t)) for t in grid] for p in positions])
+        timed('projected, vectorized', lambda: projection.project_rewards(state, amount_staked, amount_rewarded, last_updated, grid))
+        timed('everyone withdraws', lambda: projection.withdraw_all(state, amount_staked, last_updated, now))
+        depleted = timed('depletion forecast', lambda: projection.depletion_time(state, amount_staked, last_updated, now))
+        self.stdout.write('{} stakers, rewards run out at {}'.format(stakers, depleted))
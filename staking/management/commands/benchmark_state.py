@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand
+
+from staking.fakealgod import state_entry
+from staking.state import decode_pool, decode_position
+
+import base64
+import timeit
+
+# How the views used to decode the pool's global state, one key at a time.
+def decode_pool_per_view(app):
+    pool = {}
+    for gs in app['params']['global-state']:
+        match base64.b64decode(gs['key']).decode('utf8'):
+            case "SA":
+                pool['staked_asset'] = gs['value']['uint']
+            case "RA":
+                pool['reward_asset'] = gs['value']['uint']
+            case "TS":
+                pool['total_staked'] = gs['value']['uint']
+            case "BT":
+                pool['begin_timestamp'] = gs['value']['uint']
+            case "ET":
+                pool['end_timestamp'] = gs['value']['uint']
+            case "FR":
+                pool['fixed_rate'] = gs['value']['uint']
+    return pool
+
+# How the views used to find and decode an account's local state.
+def decode_position_per_view(acc, pool_id):
+    position = {}
+    for acc_app in acc['apps-local-state']:
+        if acc_app['id'] != pool_id:
+            continue
+        for ls in acc_app['key-value']:
+            match base64.b64decode(ls['key']).decode('utf8'):
+                case "AS":
+                    position['amount_staked'] = ls['value']['uint']
+                case "AR":
+                    position['amount_rewarded'] = ls['value']['uint']
+                case "LU":
+                    position['last_updated'] = ls['value']['uint']
+    return position
+
+class Command(BaseCommand):
+    help = 'Compare decoding pool state with the shared decoder against the per-view loops.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=100000)
+        parser.add_argument('--apps', type=int, default=10, help='Number of apps the account has opted in to.')
+
+    def handle(self, *args, **options):
+        app = {
+            'id': 1,
+            'params': {
+                'global-state': [
+                    state_entry('A', b'\x00' * 32),
+                    state_entry('I', 1),
+                    state_entry('SA', 10),
+                    state_entry('RA', 11),
+                    state_entry('BT', 1650000000),
+                    state_entry('ET', 1660000000),
+                    state_entry('FR', 1000),
+                    state_entry('TS', 5000000),
+                    state_entry('TR', 9000000),
+                    state_entry('LU', 1655000000),
+                ],
+            },
+        }
+        acc = {
+            'apps-local-state': [
+                {'id': i, 'key-value': [state_entry('AS', 100), state_entry('AR', 5), state_entry('LU', 1655000000)]}
+                for i in range(1, options['apps'] + 1)
+            ],
+        }
+        pool_id = options['apps']
+
+        number = options['number']
+        cases = [
+            ('global state, per view', lambda: decode_pool_per_view(app)),
+            ('global state, decoder', lambda: decode_pool(app)),
+            ('local state, per view', lambda: decode_position_per_view(acc, pool_id)),
+            ('local state, decoder', lambda: decode_position(acc, pool_id)),
+        ]
+        for name, fn in cases:
+            elapsed = timeit.timeit(fn, number=number)
+            self.stdout.write('{:<24} {:>8.2f}us'.format(name, elapsed / number * 1000000))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from staking.programs import program_store
+from staking.views import algod_client
+
+# Assemble any programs which haven't been already, so the server has them
+# ready to load from the cache when it starts.
+class Command(BaseCommand):
+    help = 'Compile the staking contract programs, and show their hash and size.'
+
+    def handle(self, *args, **options):
+        program_store.load(algod_client)
+        for name, info in program_store.info().items():
+            self.stdout.write('{}: {} ({} bytes, source {})'.format(name, info['hash'], info['size'], info['source_hash'][:12]))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from algosdk import encoding
+
+from staking.views import deployer_registry
+
+# Pools are listed from every registered deployer. A new deployer's pools are
+# fetched the next time the index is viewed, and followed from then on.
+class Command(BaseCommand):
+    help = 'List, add or remove the deployers whose pools are shown.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'add', 'remove'], nargs='?', default='list')
+        parser.add_argument('address', nargs='?')
+
+    def handle(self, *args, **options):
+        action, address = options['action'], options['address']
+        if action == 'list':
+            for address in deployer_registry.addresses():
+                self.stdout.write(address)
+            return
+
+        if address is None or not encoding.is_valid_address(address):
+            raise CommandError('A valid address is required')
+        if action == 'add':
+            added = deployer_registry.add(address)
+            self.stdout.write('Added {}'.format(address) if added else '{} is already registered'.format(address))
+        else:
+            removed = deployer_registry.remove(address)
+            self.stdout.write('Removed {}'.format(address) if removed else '{} is not registered'.format(address))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from staking.views import algod_client
+
+import base64
+import json
+
+# Blocks are recorded exactly as the node returns them in msgpack, base64
+# encoded and keyed by round, so they can be replayed to the BlockFollower.
+class Command(BaseCommand):
+    help = 'Record blocks from the algod node, for replaying in tests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('first', type=int)
+        parser.add_argument('last', type=int)
+        parser.add_argument('--output', default='blocks.json')
+
+    def handle(self, *args, **options):
+        blocks = {}
+        for rnd in range(options['first'], options['last'] + 1):
+            blocks[str(rnd)] = base64.b64encode(algod_client.block_info(rnd, response_format='msgpack')).decode()
+
+        with open(options['output'], 'w') as f:
+            json.dump(blocks, f, indent=1)
+        self.stdout.write('Recorded {} blocks to {}'.format(len(blocks), options['output']))
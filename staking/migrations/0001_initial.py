@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+import staking.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Account',
+            fields=[
+                ('address', models.CharField(max_length=58, primary_key=True, serialize=False)),
+                ('round', models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Pool',
+            fields=[
+                ('app_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('creator', models.CharField(db_index=True, max_length=58)),
+                ('admin', models.BinaryField(null=True)),
+                ('initialised', staking.models.Uint64Field(null=True)),
+                ('paused', staking.models.Uint64Field(null=True)),
+                ('staked_asset', staking.models.Uint64Field(null=True)),
+                ('reward_asset', staking.models.Uint64Field(null=True)),
+                ('begin_timestamp', staking.models.Uint64Field(null=True)),
+                ('end_timestamp', staking.models.Uint64Field(null=True)),
+                ('fixed_rate', staking.models.Uint64Field(null=True)),
+                ('total_staked', staking.models.Uint64Field(null=True)),
+                ('total_rewards', staking.models.Uint64Field(null=True)),
+                ('last_updated', staking.models.Uint64Field(null=True)),
+                ('round', models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Position',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount_staked', staking.models.Uint64Field(null=True)),
+                ('amount_rewarded', staking.models.Uint64Field(null=True)),
+                ('last_updated', staking.models.Uint64Field(null=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='staking.account')),
+                ('pool', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='staking.pool')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='position',
+            constraint=models.UniqueConstraint(fields=('pool', 'account'), name='unique_pool_account'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staking', '0002_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='changed',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pool',
+            name='changed',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
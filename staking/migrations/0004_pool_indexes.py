@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staking', '0003_changed_round'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pool',
+            index=models.Index(fields=['creator', 'begin_timestamp', 'app_id'], name='pool_creator_begin'),
+        ),
+        migrations.AddIndex(
+            model_name='pool',
+            index=models.Index(fields=['creator', 'end_timestamp', 'app_id'], name='pool_creator_end'),
+        ),
+        migrations.AddIndex(
+            model_name='pool',
+            index=models.Index(fields=['creator', 'round'], name='pool_creator_round'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staking', '0004_pool_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Deployer',
+            fields=[
+                ('address', models.CharField(max_length=58, primary_key=True, serialize=False)),
+                ('round', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='pool',
+            name='pool_creator_begin',
+        ),
+        migrations.RemoveIndex(
+            model_name='pool',
+            name='pool_creator_end',
+        ),
+        migrations.RemoveIndex(
+            model_name='pool',
+            name='pool_creator_round',
+        ),
+        migrations.AddIndex(
+            model_name='pool',
+            index=models.Index(fields=['begin_timestamp', 'app_id'], name='pool_begin'),
+        ),
+        migrations.AddIndex(
+            model_name='pool',
+            index=models.Index(fields=['end_timestamp', 'app_id'], name='pool_end'),
+        ),
+    ]
@@ -0,0 +1,235 @@
+from django.db import transaction
+
+from algosdk import error
+
+from .models import Account, Deployer, Pool, Position
+from .state import GLOBAL_KEYS, LOCAL_KEYS, decode_pool, decode_position, decode_state, Position as PositionState
+
+# Keeps the Pool, Account and Position models in step with the chain.
+#
+# Views read the pool and an account's position in it from the database with
+# indexed lookups. The rows are kept up to date by the BlockFollower in
+# follower.py, which applies the changes made by each new round.
+#
+# If the follower has fallen behind by more than 'max_lag' rounds (or hasn't
+# seen the pool or account yet) the node is asked directly and the result
+# stored, so a view never serves state older than that.
+#
+# The pools are those created by the accounts in the DeployerRegistry. Each
+# deployer's applications are only fetched in full when it's first seen, after
+# which the follower picks up any new pools as they're created.
+class StateMirror:
+    def __init__(self, client, clock, deployers, max_lag=2):
+        self.client = client
+        self.clock = clock
+        self.deployers = deployers
+        self.max_lag = max_lag
+
+    def stale(self, row, current_round):
+        return row is None or row.round < current_round - self.max_lag
+
+    # Store the global state of applications, as found in application_info or
+    # an account's 'created-apps'.
+    def store_pools(self, apps, current_round):
+        with transaction.atomic():
+            existing = Pool.objects.in_bulk([app['id'] for app in apps])
+            for app in apps:
+                state = decode_pool(app)
+                fields = {field: getattr(state, field) for field in GLOBAL_KEYS.values()}
+                fields['creator'] = app['params']['creator']
+                fields['round'] = current_round
+                row = existing.get(app['id'])
+                if row is None or row.state() != state:
+                    fields['changed'] = current_round
+                Pool.objects.update_or_create(app_id=app['id'], defaults=fields)
+
+    # Store an account's positions, as found in its account_info. Only pools
+    # we already know about are stored, and positions in pools the account is
+    # no longer opted in to are removed.
+    def store_account(self, account, current_round):
+        local_states = {app['id']: app for app in account.get('apps-local-state', [])}
+        with transaction.atomic():
+            row, created = Account.objects.get_or_create(address=account['address'], defaults={'round': current_round})
+            before = {position.pool_id: position.state() for position in row.positions.all()}
+            pool_ids = set(Pool.objects.filter(app_id__in=local_states).values_list('app_id', flat=True))
+            after = {
+                app_id: decode_state(PositionState, LOCAL_KEYS, app_id, local_states[app_id].get('key-value', []))
+                for app_id in pool_ids
+            }
+
+            Position.objects.filter(account=row).exclude(pool_id__in=pool_ids).delete()
+            for app_id, state in after.items():
+                Position.objects.update_or_create(pool_id=app_id, account=row, defaults={
+                    'amount_staked': state.amount_staked,
+                    'amount_rewarded': state.amount_rewarded,
+                    'last_updated': state.last_updated,
+                })
+
+            row.round = current_round
+            if created or before != after:
+                row.changed = current_round
+            row.save()
+
+    # Store every application created by the deployer, forgetting any of its
+    # pools which have since been deleted.
+    def store_deployer(self, address, apps, current_round):
+        with transaction.atomic():
+            self.store_pools(apps, current_round)
+            Pool.objects.filter(creator=address).exclude(app_id__in=[app['id'] for app in apps]).delete()
+            self.deployers.synced(address, current_round)
+
+    def sync_deployer(self, address, current_round):
+        self.store_deployer(address, self.client.account_info(address)['created-apps'], current_round)
+
+    # Fetch every pool and account we know about from the node, for
+    # store_all. The pools created by each deployer come from a single
+    # account_info call, anything else is fetched individually. Nothing is
+    # written, so this can be done before taking the write lock.
+    def fetch_all(self, current_round):
+        addresses = self.deployers.addresses()
+        created = {address: self.client.account_info(address)['created-apps'] for address in addresses}
+        others = Pool.objects.filter(round__lt=current_round).exclude(creator__in=addresses)
+
+        apps = []
+        deleted = []
+        for app_id in others.values_list('app_id', flat=True):
+            try:
+                apps.append(self.client.application_info(app_id))
+            except error.AlgodHTTPError as e:
+                if e.code != 404:
+                    raise
+                deleted.append(app_id)
+
+        accounts = [self.client.account_info(address) for address in Account.objects.values_list('address', flat=True)]
+        return created, apps, deleted, accounts
+
+    # Store everything fetched by fetch_all in one transaction. Any
+    # application which has since been deleted is forgotten.
+    def store_all(self, fetched, current_round):
+        created, apps, deleted, accounts = fetched
+        with transaction.atomic():
+            for address, created_apps in created.items():
+                self.store_deployer(address, created_apps, current_round)
+            self.store_pools(apps, current_round)
+            Pool.objects.filter(app_id__in=deleted).delete()
+            for account in accounts:
+                self.store_account(account, current_round)
+
+    # Bring every pool and account we know about up to date, by fetching them
+    # all from the node.
+    def refresh(self, current_round=None):
+        if current_round is None:
+            current_round = self.clock.round()
+        self.store_all(self.fetch_all(current_round), current_round)
+
+    # Every pool created by the registered deployers, as a queryset to be
+    # filtered and paged. Only deployers which haven't been seen before are
+    # fetched from the node, so use fresh_rows on the rows actually shown.
+    def pools(self, current_round=None):
+        if current_round is None:
+            current_round = self.clock.round()
+        for address in self.deployers.unsynced():
+            self.sync_deployer(address, current_round)
+        return Pool.objects.filter(creator__in=Deployer.objects.values('address'))
+
+    # The rows, with any which are stale fetched again from the node. Any
+    # which have since been deleted are dropped.
+    def fresh_rows(self, rows, current_round):
+        fresh = []
+        for row in rows:
+            if self.stale(row, current_round):
+                try:
+                    self.store_pools([self.client.application_info(row.app_id)], current_round)
+                except error.AlgodHTTPError as e:
+                    if e.code != 404:
+                        raise
+                    row.delete()
+                    continue
+                row = Pool.objects.get(app_id=row.app_id)
+            fresh.append(row)
+        return fresh
+
+    # The Pool row, fetched from the node first if it's missing or stale.
+    # None if there's no such application, in which case any row we had is
+    # forgotten.
+    def pool_row(self, app_id, current_round=None):
+        if current_round is None:
+            current_round = self.clock.round()
+        row = Pool.objects.filter(app_id=app_id).first()
+        if self.stale(row, current_round):
+            try:
+                self.store_pools([self.client.application_info(app_id)], current_round)
+            except error.AlgodHTTPError as e:
+                if e.code != 404:
+                    raise
+                Pool.objects.filter(app_id=app_id).delete()
+                return None
+            row = Pool.objects.get(app_id=app_id)
+        return row
+
+    # The Account row, fetched from the node first if it's missing or stale.
+    # None if the node doesn't know the account (or it isn't a valid address).
+    def account_row(self, address, current_round=None):
+        if current_round is None:
+            current_round = self.clock.round()
+        row = Account.objects.filter(address=address).first()
+        if self.stale(row, current_round):
+            try:
+                self.store_account(self.client.account_info(address), current_round)
+            except error.AlgodHTTPError as e:
+                if e.code not in (400, 404):
+                    raise
+                return None
+            row = Account.objects.get(address=address)
+        return row
+
+    def pool(self, app_id, current_round=None):
+        if current_round is None:
+            current_round = self.clock.round()
+        row = Pool.objects.filter(app_id=app_id).first()
+        if self.stale(row, current_round):
+            app = self.client.application_info(app_id)
+            self.store_pools([app], current_round)
+            return decode_pool(app)
+        return row.state()
+
+    # An account's position in a pool, or None if it hasn't opted in.
+    def position(self, app_id, address, current_round=None):
+        if current_round is None:
+            current_round = self.clock.round()
+        row = Account.objects.filter(address=address).first()
+        if self.stale(row, current_round):
+            account = self.client.account_info(address)
+            self.store_account(account, current_round)
+            return decode_position(account, app_id)
+        position = Position.objects.filter(pool_id=app_id, account_id=address).first()
+        return position.state() if position is not None else None
+
+    # The Pool and Account rows, which say when the pool and the account's
+    # positions last changed. The pool is fetched first, so the account's
+    # position in it is stored if the account is fetched too. Either is None
+    # if the node doesn't know it, and the account isn't looked up if the
+    # pool is unknown.
+    def rows(self, app_id, address, current_round=None):
+        if current_round is None:
+            current_round = self.clock.round()
+        pool = self.pool_row(app_id, current_round)
+        if pool is None:
+            return None, None
+        return pool, self.account_row(address, current_round)
+
+    # The account's position as stored, for after rows() has brought it up to
+    # date.
+    def stored_position(self, app_id, address):
+        position = Position.objects.filter(pool_id=app_id, account_id=address).first()
+        return position.state() if position is not None else None
+
+    # Both the pool and the account's position within it. The pool is None if
+    # the node doesn't know it, and the position if the account hasn't opted
+    # in (or the node doesn't know the account either).
+    def lookup(self, app_id, address):
+        pool, account = self.rows(app_id, address)
+        if pool is None:
+            return None, None
+        position = self.stored_position(app_id, address) if account is not None else None
+        return pool.state(), position
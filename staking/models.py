@@ -1,3 +1,109 @@
 from django.db import models
 
-# Create your models here.
+from .state import PoolState, Position as PositionState
+
+# A local copy of the staking contracts' global and local state, kept up to
+# date by the StateMirror in mirror.py, so pages can be served from indexed
+# database reads rather than fetching whole accounts from the algod node.
+#
+# Every row records the round it was last brought up to date at, so readers
+# can tell how stale it is, and the round its state last changed at.
+
+# The contract stores uint64s, which don't fit into a signed 64 bit integer
+# column. Values are stored with the same bits as a signed integer instead,
+# so the full range round trips, although anything above 2^63 - 1 won't sort
+# or compare correctly in queries.
+class Uint64Field(models.BigIntegerField):
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is not None and value >= 2 ** 63:
+            value -= 2 ** 64
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        if value is not None and value < 0:
+            value += 2 ** 64
+        return value
+
+class Pool(models.Model):
+    app_id = models.BigIntegerField(primary_key=True)
+    creator = models.CharField(max_length=58, db_index=True)
+    admin = models.BinaryField(null=True)
+    initialised = Uint64Field(null=True)
+    paused = Uint64Field(null=True)
+    staked_asset = Uint64Field(null=True)
+    reward_asset = Uint64Field(null=True)
+    begin_timestamp = Uint64Field(null=True)
+    end_timestamp = Uint64Field(null=True)
+    fixed_rate = Uint64Field(null=True)
+    total_staked = Uint64Field(null=True)
+    total_rewards = Uint64Field(null=True)
+    last_updated = Uint64Field(null=True)
+    round = models.BigIntegerField()
+    changed = models.BigIntegerField(default=0)
+
+    # For paging through the pools in timestamp order (see pools.page_pools).
+    class Meta:
+        indexes = [
+            models.Index(fields=['begin_timestamp', 'app_id'], name='pool_begin'),
+            models.Index(fields=['end_timestamp', 'app_id'], name='pool_end'),
+        ]
+
+    def state(self) -> PoolState:
+        admin = bytes(self.admin) if self.admin is not None else None
+        return PoolState(
+            app_id=self.app_id,
+            admin=admin,
+            initialised=self.initialised,
+            paused=self.paused,
+            staked_asset=self.staked_asset,
+            reward_asset=self.reward_asset,
+            begin_timestamp=self.begin_timestamp,
+            end_timestamp=self.end_timestamp,
+            fixed_rate=self.fixed_rate,
+            total_staked=self.total_staked,
+            total_rewards=self.total_rewards,
+            last_updated=self.last_updated,
+        )
+
+# An account we keep the positions of. Having a row here, without any
+# positions, tells us the account hasn't opted in to any pools as of 'round'.
+class Account(models.Model):
+    address = models.CharField(max_length=58, primary_key=True)
+    round = models.BigIntegerField()
+    # The last round any of the account's positions changed at.
+    changed = models.BigIntegerField(default=0)
+
+class Position(models.Model):
+    pool = models.ForeignKey(Pool, on_delete=models.CASCADE, related_name='positions')
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='positions')
+    amount_staked = Uint64Field(null=True)
+    amount_rewarded = Uint64Field(null=True)
+    last_updated = Uint64Field(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pool', 'account'], name='unique_pool_account'),
+        ]
+
+    def state(self) -> PositionState:
+        return PositionState(
+            app_id=self.pool_id,
+            amount_staked=self.amount_staked,
+            amount_rewarded=self.amount_rewarded,
+            last_updated=self.last_updated,
+        )
+
+# An account whose applications are staking pools. The pools themselves are
+# the Pool rows with it as their creator.
+class Deployer(models.Model):
+    address = models.CharField(max_length=58, primary_key=True)
+    # The round all of its applications were last fetched from the node at, or
+    # 0 if they haven't been yet. Since then the follower has kept them up to
+    # date.
+    round = models.BigIntegerField(default=0)
+
+# The last round a follower has processed, so it can carry on from there.
+class Checkpoint(models.Model):
+    name = models.CharField(max_length=32, primary_key=True)
+    round = models.BigIntegerField()
@@ -0,0 +1,147 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.template import loader
+from django.utils.safestring import mark_safe
+
+from .timing import timed
+
+import threading
+
+# Caches the rendered pool pages, so a popular pool isn't rendered again for
+# every visitor.
+#
+# A pool page only depends on the pool's state, the visiting account's
+# position in it and whether the pool has ended. The mirror records the last
+# round each of the first two changed at, so a page is identified by
+# (pool, the round it last changed, account, the round its positions last
+# changed, ended), and a cached page is never out of date. Pages which are no
+# longer asked for are left to be evicted.
+#
+# When the whole page isn't cached it's put together from two fragments,
+# which are cached separately:
+#
+#  * The pool, the same for every account. The template is rendered with
+#    HOLE where the position goes, and kept split around it. Once a pool has
+#    ended nothing more can happen to it but withdrawals, so the fragments of
+#    ended pools are kept for good rather than being evicted.
+#  * The account's position, which fills in the holes. It's rendered with
+#    HOLE between its parts.
+#
+# So a deposit only renders the depositor's position again, and a new visitor
+# to a pool only renders theirs.
+
+HOLE = mark_safe('<!-- position -->')
+
+POSITION_TEMPLATE = 'staking/pool_position.html'
+
+# Which template the pool is shown with, and the key of its page for the
+# account.
+def page_key(pool_row, account_row, now):
+    ended = pool_row.end_timestamp <= now
+    template_name = 'staking/pool_ended.html' if ended else 'staking/pool.html'
+    return (template_name, pool_row.app_id, pool_row.changed, account_row.address, account_row.changed, ended)
+
+class PageCache:
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.pages = OrderedDict()
+        self.fragments = OrderedDict()
+        # The pool fragment of each ended pool, by template and pool, with the
+        # round it was rendered for.
+        self.ended = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+
+    def get_lru(self, entries, key):
+        with self.lock:
+            value = entries.get(key)
+            if value is not None:
+                entries.move_to_end(key)
+            return value
+
+    def put_lru(self, entries, key, value):
+        with self.lock:
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+
+    # The fragment, rendering and splitting it around the holes if it isn't
+    # cached.
+    def fragment(self, key, template_name, context, request, forever=False):
+        if forever:
+            with self.lock:
+                version, parts = self.ended.get(key[:-1], (None, None))
+            if version != key[-1]:
+                parts = None
+        else:
+            parts = self.get_lru(self.fragments, key)
+
+        with self.lock:
+            if parts is not None:
+                self.fragment_hits += 1
+                return parts
+            self.fragment_misses += 1
+
+        with timed('template'):
+            parts = loader.get_template(template_name).render(context, request).strip().split(HOLE)
+        if forever:
+            with self.lock:
+                self.ended[key[:-1]] = (key[-1], parts)
+        else:
+            self.put_lru(self.fragments, key, parts)
+        return parts
+
+    # The cached page, or None.
+    def get(self, key):
+        html = self.get_lru(self.pages, key)
+        with self.lock:
+            if html is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return html
+
+    # Render the page from its fragments, rendering whichever of those
+    # aren't cached.
+    def render(self, key, context, request):
+        template_name, app_id, pool_changed, address, account_changed, ended = key
+        pool = self.fragment(
+            (template_name, app_id, pool_changed),
+            template_name, dict(context, position=HOLE), request, forever=ended,
+        )
+        position = self.fragment(
+            (POSITION_TEMPLATE, app_id, address, account_changed),
+            POSITION_TEMPLATE, dict(context, hole=HOLE), request,
+        )
+        parts = [pool[0]]
+        for hole, rest in zip(position, pool[1:]):
+            parts += [hole, rest]
+        html = ''.join(parts)
+        self.put_lru(self.pages, key, html)
+        return html
+
+    def invalidate(self):
+        with self.lock:
+            self.pages.clear()
+            self.fragments.clear()
+            self.ended.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.pages),
+                'hits': self.hits,
+                'misses': self.misses,
+                'fragments': len(self.fragments) + len(self.ended),
+                'fragment_hits': self.fragment_hits,
+                'fragment_misses': self.fragment_misses,
+            }
+
+page_cache = PageCache(
+    max_size=getattr(settings, 'STAKING_PAGE_CACHE_SIZE', 1024),
+)
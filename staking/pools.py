@@ -0,0 +1,110 @@
+from django.db.models import Q
+
+import base64
+import datetime
+
+# The index page shows the pools a page at a time, from the state mirror.
+# Pages are found by where the last one finished (a cursor) rather than by
+# counting, so with the indexes on Pool, fetching any page costs the same
+# however many pools there are.
+#
+# Pools are sorted by their begin or end timestamp, in either direction, with
+# the app ID breaking ties. Pools without them can't be staked in, so aren't
+# listed.
+
+PAGE_SIZE = 20
+
+STATUSES = ('upcoming', 'live', 'ended')
+
+SORTS = {
+    'begin': 'begin_timestamp',
+    '-begin': '-begin_timestamp',
+    'end': 'end_timestamp',
+    '-end': '-end_timestamp',
+}
+
+def encode_cursor(timestamp, app_id):
+    return base64.urlsafe_b64encode('{}.{}'.format(timestamp, app_id).encode()).decode()
+
+# Raises a ValueError if the cursor isn't one of ours.
+def decode_cursor(cursor):
+    timestamp, app_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('.')
+    return int(timestamp), int(app_id)
+
+# Filter the pools by whether they're yet to begin, running or have ended,
+# the same way describe_rows decides.
+def filter_status(rows, status, current_time):
+    if status == 'upcoming':
+        return rows.filter(begin_timestamp__gt=current_time)
+    if status == 'live':
+        return rows.filter(begin_timestamp__lte=current_time, end_timestamp__gte=current_time)
+    if status == 'ended':
+        return rows.filter(end_timestamp__lt=current_time)
+    return rows
+
+# A page of Pool rows, and the cursor for the next page (None if this is the
+# last one). Raises a ValueError for an unknown status, sort or cursor.
+def page_pools(rows, current_time, status=None, sort='begin', cursor=None, size=PAGE_SIZE):
+    if status is not None and status not in STATUSES:
+        raise ValueError("Unknown status {!r}".format(status))
+    if sort not in SORTS:
+        raise ValueError("Unknown sort {!r}".format(sort))
+
+    order = SORTS[sort]
+    field = order.lstrip('-')
+    descending = order.startswith('-')
+    rows = filter_status(rows.filter(**{field + '__isnull': False}), status, current_time)
+
+    if cursor is not None:
+        timestamp, app_id = decode_cursor(cursor)
+        after = 'lt' if descending else 'gt'
+        rows = rows.filter(Q(**{field + '__' + after: timestamp}) | Q(**{field: timestamp, 'app_id__' + after: app_id}))
+
+    page = list(rows.order_by(order, ('-' if descending else '') + 'app_id')[:size + 1])
+    next_cursor = None
+    if len(page) > size:
+        page = page[:size]
+        next_cursor = encode_cursor(getattr(page[-1], field), page[-1].app_id)
+    return page, next_cursor
+
+# Every asset ID used by the rows.
+def row_asset_ids(rows):
+    return collect_asset_ids([row.state() for row in rows])
+
+def collect_asset_ids(states):
+    asset_ids = []
+    for state in states:
+        if state.staked_asset is not None:
+            asset_ids.append(state.staked_asset)
+        if state.reward_asset is not None:
+            asset_ids.append(state.reward_asset)
+    return asset_ids
+
+# Get the rows ready for the index page, attaching the asset details (which
+# come from the asset cache, see row_asset_ids) and working out the duration.
+def describe_rows(rows, assets, current_time):
+    pools = []
+    for row in rows:
+        state = row.state()
+        app = {'id': row.app_id, 'state': state}
+        if state.staked_asset is not None:
+            app['staking_asset'] = assets[state.staked_asset]
+        if state.reward_asset is not None:
+            app['reward_asset'] = assets[state.reward_asset]
+        if state.fixed_rate is not None:
+            app['rate'] = "%s%%" % (state.fixed_rate / 100)
+
+        # Provide a start time if not started, the seconds remaining if
+        # in-progress, or "Ended" if finished.
+        begin_time = state.begin_timestamp or 0
+        end_time = state.end_timestamp or 0
+        if begin_time > current_time:
+            app['duration'] = datetime.datetime.fromtimestamp(begin_time)
+        elif end_time >= current_time:
+            app['duration'] = "{} seconds remaining".format(end_time - current_time)
+        else:
+            app['duration'] = 'Ended'
+
+        pools.append(app)
+
+    return pools
@@ -0,0 +1,155 @@
+from dataclasses import dataclass
+
+from algosdk import logic
+from django.conf import settings
+
+from pathlib import Path
+
+import base64
+import hashlib
+import importlib.util
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CONTRACTS_DIR = Path(__file__).resolve().parent / 'contracts'
+
+# The TEAL source of each program, relative to the contracts directory.
+TEAL_SOURCES = {
+    'approval': 'staking.teal',
+    'clear': 'clear.teal',
+}
+
+# The staking contract's approval and clear programs, compiled from their
+# source rather than pasted in as base64.
+#
+# The source is either the .teal files, or contracts.py compiled with PyTeal
+# (which must be installed). Either way the TEAL is assembled by the algod
+# node, and the bytecode is saved to the cache directory named by the hash of
+# its source. So it's only assembled once for each version of the contract,
+# and after that is read from disk when the server starts. The programs are
+# then kept in memory for create_pool.
+#
+# The sources are checked for changes like the ABI in contract.py, so editing
+# a .teal file doesn't require restarting the server.
+
+@dataclass(slots=True)
+class Program:
+    name: str = None
+    source_hash: str = None
+    bytecode: bytes = None
+
+    # The program's hash, as an address, the same as algod returns.
+    @property
+    def hash(self):
+        return logic.address(self.bytecode)
+
+    @property
+    def size(self):
+        return len(self.bytecode)
+
+# Compile contracts.py with PyTeal, returning the TEAL of each program.
+def pyteal_sources(path=CONTRACTS_DIR / 'contracts.py'):
+    spec = importlib.util.spec_from_file_location('staking_contracts', path)
+    contracts = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(contracts)
+    approval, clear, _ = contracts.router.compile_program(version=contracts.CONTRACT_VERSION)
+    return {'approval': approval, 'clear': clear}
+
+class ProgramStore:
+    def __init__(self, contracts_dir=CONTRACTS_DIR, cache_dir=None, pyteal=False, check_interval=1.0):
+        self.contracts_dir = Path(contracts_dir)
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else self.contracts_dir / 'build'
+        self.pyteal = pyteal
+        self.check_interval = check_interval
+        self.programs = {}
+        self.mtimes = {}
+        self.last_checked = 0
+        self.lock = threading.Lock()
+        self.compiled = 0
+
+    # The files each program is built from.
+    def source_paths(self, name):
+        if self.pyteal:
+            return [self.contracts_dir / 'contracts.py']
+        return [self.contracts_dir / TEAL_SOURCES[name]]
+
+    def mtime(self, name):
+        return tuple(os.stat(path).st_mtime_ns for path in self.source_paths(name))
+
+    def sources(self):
+        if self.pyteal:
+            return pyteal_sources(self.contracts_dir / 'contracts.py')
+        return {name: (self.contracts_dir / path).read_text() for name, path in TEAL_SOURCES.items()}
+
+    def cache_path(self, name, source_hash):
+        return self.cache_dir / '{}-{}.tok'.format(name, source_hash)
+
+    # Save the bytecode to the cache, without anyone reading it half written.
+    def save(self, path, bytecode):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(bytecode)
+        os.replace(tmp, path)
+
+    # Build every program, from the cache where possible. Without a client,
+    # programs which haven't been assembled before are left until they're
+    # asked for.
+    def load(self, client=None):
+        with self.lock:
+            mtimes = {name: self.mtime(name) for name in TEAL_SOURCES}
+            for name, source in self.sources().items():
+                source_hash = hashlib.sha256(source.encode()).hexdigest()
+                path = self.cache_path(name, source_hash)
+                if path.exists():
+                    bytecode = path.read_bytes()
+                elif client is not None:
+                    bytecode = base64.b64decode(client.compile(source)['result'])
+                    self.save(path, bytecode)
+                    self.compiled += 1
+                    logger.info('Compiled the %s program (%s)', name, source_hash)
+                else:
+                    self.programs.pop(name, None)
+                    continue
+                self.programs[name] = Program(name, source_hash, bytecode)
+                self.mtimes[name] = mtimes[name]
+            self.last_checked = time.monotonic()
+        return self.programs
+
+    # Whether any of the sources have changed, checked at most once every
+    # check_interval seconds.
+    def modified(self):
+        if time.monotonic() - self.last_checked <= self.check_interval:
+            return False
+        self.last_checked = time.monotonic()
+        return any(self.mtimes.get(name) != self.mtime(name) for name in TEAL_SOURCES)
+
+    # The program, assembling it with the client if it hasn't been before or
+    # its source has changed.
+    def get(self, client, name) -> Program:
+        program = self.programs.get(name)
+        if program is None or self.modified():
+            program = self.load(client)[name]
+        return program
+
+    def approval(self, client) -> Program:
+        return self.get(client, 'approval')
+
+    def clear(self, client) -> Program:
+        return self.get(client, 'clear')
+
+    def info(self):
+        return {
+            name: {'hash': program.hash, 'size': program.size, 'source_hash': program.source_hash}
+            for name, program in self.programs.items()
+        }
+
+program_store = ProgramStore(
+    cache_dir=getattr(settings, 'STAKING_PROGRAM_CACHE_DIR', None),
+    pyteal=getattr(settings, 'STAKING_PROGRAM_SOURCE', 'teal') == 'pyteal',
+)
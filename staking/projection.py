@@ -0,0 +1,102 @@
+from .models import Position
+from .rewards import BASIS_POINTS, SECONDS_PER_YEAR, UINT64_MAX
+
+import numpy as np
+
+# The reward engine in rewards.py, evaluated for every position in a pool at
+# once with NumPy. Positions are given as arrays of their AS, AR and LU
+# values, and the results match calculating each one individually.
+#
+# NumPy's uint64 arithmetic wraps around rather than failing, so anything the
+# contract would fail on is checked for up front. Rather than raising, those
+# positions are marked as failed and given no rewards.
+
+MAX = np.uint64(UINT64_MAX)
+
+# The AS, AR and LU of every position in the pool, from the state mirror.
+def pool_positions(app_id):
+    rows = Position.objects.filter(pool_id=app_id).values_list('amount_staked', 'amount_rewarded', 'last_updated')
+    values = np.array([[value or 0 for value in row] for row in rows], dtype=np.uint64).reshape(-1, 3)
+    return values[:, 0], values[:, 1], values[:, 2]
+
+# The sum of a uint64 array without wrapping, by adding up the high and low
+# halves separately.
+def exact_sum(values):
+    return (int((values >> np.uint64(32)).sum()) << 32) + int((values & np.uint64(0xFFFFFFFF)).sum())
+
+# The rewards for each position at 'timestamp' (which may be an array to
+# broadcast against), before they're limited to what's left in the pool.
+# Returns the rewards and which positions would fail.
+def uncapped_rewards(state, amount_staked, last_updated, timestamp):
+    begin = np.uint64(state.begin_timestamp or 0)
+    end = np.uint64(state.end_timestamp or 0)
+    fixed_rate = np.uint64(state.fixed_rate or 0)
+    timestamp = np.asarray(timestamp, dtype=np.uint64)
+
+    skip = (timestamp < begin) | (last_updated > end)
+    stop = np.minimum(timestamp, end)
+    start = np.maximum(last_updated, begin)
+    failed = ~skip & (start > stop)
+    duration = np.where(skip | failed, np.uint64(0), stop - start)
+
+    failed |= (duration != 0) & (amount_staked > MAX // np.maximum(duration, np.uint64(1)))
+    rewards = amount_staked * duration // np.uint64(SECONDS_PER_YEAR)
+    if fixed_rate:
+        failed |= rewards > MAX // fixed_rate
+    rewards = rewards * fixed_rate // np.uint64(BASIS_POINTS)
+    return np.where(failed, np.uint64(0), rewards), failed
+
+# The same as rewards.calculate_rewards for every position.
+def calculate_rewards(state, amount_staked, last_updated, timestamp):
+    rewards, failed = uncapped_rewards(state, amount_staked, last_updated, timestamp)
+    return np.minimum(rewards, np.uint64(state.total_rewards or 0)), failed
+
+# The same as rewards.accrued_rewards for every position.
+def accrued_rewards(state, amount_staked, amount_rewarded, last_updated, timestamp):
+    rewards, failed = calculate_rewards(state, amount_staked, last_updated, timestamp)
+    failed |= amount_rewarded > MAX - rewards
+    return np.where(failed, np.uint64(0), amount_rewarded + rewards), failed
+
+# What each position would be able to claim at every time in 'timestamps',
+# as an array with a row per position and a column per time. Each assumes
+# nobody else has claimed in the meantime.
+def project_rewards(state, amount_staked, amount_rewarded, last_updated, timestamps):
+    timestamps = np.asarray(timestamps, dtype=np.uint64)[np.newaxis, :]
+    return accrued_rewards(state, amount_staked[:, np.newaxis], amount_rewarded[:, np.newaxis], last_updated[:, np.newaxis], timestamps)
+
+# The rewards paid out if every position withdrew at 'timestamp', in the
+# order given. Each is paid in full until the pool runs out, after which
+# they only get what's left, and then nothing.
+def withdraw_all(state, amount_staked, last_updated, timestamp):
+    total_rewards = state.total_rewards or 0
+    rewards, failed = calculate_rewards(state, amount_staked, last_updated, timestamp)
+
+    # Each reward is at most the total, so the running total only needs more
+    # than 64 bits if there are a lot of them.
+    dtype = np.uint64 if total_rewards <= UINT64_MAX // max(len(rewards), 1) else object
+    paid_before = np.cumsum(rewards, dtype=dtype) - rewards.astype(dtype)
+    left = np.maximum(total_rewards - paid_before, 0) if dtype is object else np.uint64(total_rewards) - np.minimum(paid_before, np.uint64(total_rewards))
+    return np.minimum(rewards, left.astype(np.uint64)), failed
+
+# The first time after 'timestamp' that the pool won't have enough rewards left
+# to pay every position what it's owed, or None if it lasts until the end.
+def depletion_time(state, amount_staked, last_updated, timestamp):
+    total_rewards = state.total_rewards or 0
+
+    def owed(at):
+        return exact_sum(uncapped_rewards(state, amount_staked, last_updated, at)[0])
+
+    low, high = timestamp, max(timestamp, state.end_timestamp or 0)
+    if owed(low) > total_rewards:
+        return low
+    if owed(high) <= total_rewards:
+        return None
+
+    # Rewards only grow with time, so search for when they first exceed it.
+    while high - low > 1:
+        middle = (low + high) // 2
+        if owed(middle) > total_rewards:
+            high = middle
+        else:
+            low = middle
+    return high
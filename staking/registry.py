@@ -0,0 +1,40 @@
+from .models import Deployer
+
+# The accounts which deploy staking pools, kept in the database so more can be
+# added (see the deployers command) without changing the code.
+#
+# The addresses given when it's created are registered the first time it's
+# used, so there's always at least one.
+class DeployerRegistry:
+    def __init__(self, seeds=()):
+        self.seeds = list(seeds)
+        self.seeded = False
+
+    def seed(self):
+        if not self.seeded:
+            Deployer.objects.bulk_create([Deployer(address=address) for address in self.seeds], ignore_conflicts=True)
+            self.seeded = True
+
+    def addresses(self):
+        self.seed()
+        return list(Deployer.objects.order_by('address').values_list('address', flat=True))
+
+    # Deployers whose pools haven't been fetched from the node yet.
+    def unsynced(self):
+        self.seed()
+        return list(Deployer.objects.filter(round=0).values_list('address', flat=True))
+
+    def add(self, address):
+        _, created = Deployer.objects.get_or_create(address=address)
+        return created
+
+    # Forgets the deployer, but not its pools, which are still followed.
+    def remove(self, address):
+        return Deployer.objects.filter(address=address).delete()[0] > 0
+
+    def synced(self, address, current_round):
+        Deployer.objects.filter(address=address).update(round=current_round)
+
+    def __contains__(self, address):
+        self.seed()
+        return Deployer.objects.filter(address=address).exists()
@@ -0,0 +1,46 @@
+from .state import PoolState, Position
+
+# The staking contract's reward calculation (calculate_rewards in
+# contracts/contracts.py), reproduced with the same integer arithmetic so the
+# rewards we show match what the contract would pay out at that moment.
+#
+# Like the AVM, every value is a uint64. Multiplication and subtraction
+# which over or underflow would fail the contract call, so they raise an
+# OverflowError here. Division truncates, and happens in the same order as the
+# contract: AS * duration / 31557600 * FR / 10000.
+#
+# Any state which hasn't been set reads as 0, the same as app_global_get and
+# app_local_get.
+
+UINT64_MAX = 2 ** 64 - 1
+
+# Seconds in a Julian year, and the fixed rate is given in basis points.
+SECONDS_PER_YEAR = 31557600
+BASIS_POINTS = 10000
+
+def uint64(value):
+    if value < 0 or value > UINT64_MAX:
+        raise OverflowError("{} is out of range for a uint64".format(value))
+    return value
+
+# The rewards the contract would issue to the position if it were updated at
+# 'timestamp', limited to what's left in the pool.
+def calculate_rewards(state: PoolState, position: Position, timestamp: int) -> int:
+    begin = state.begin_timestamp or 0
+    end = state.end_timestamp or 0
+    last_updated = position.last_updated or 0
+
+    # Skip if not begun, or updated since the end.
+    if timestamp < begin or last_updated > end:
+        return 0
+
+    duration = uint64(min(timestamp, end) - max(last_updated, begin))
+    rewards = uint64((position.amount_staked or 0) * duration) // SECONDS_PER_YEAR
+    rewards = uint64(rewards * (state.fixed_rate or 0)) // BASIS_POINTS
+
+    # Once the pool has run out, only what's left can be rewarded.
+    return min(rewards, state.total_rewards or 0)
+
+# Everything the position would be able to claim at 'timestamp'.
+def accrued_rewards(state: PoolState, position: Position, timestamp: int) -> int:
+    return uint64((position.amount_rewarded or 0) + calculate_rewards(state, position, timestamp))
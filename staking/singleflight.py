@@ -0,0 +1,181 @@
+from django.conf import settings
+
+from .algod import LONG_POLL_PREFIXES
+
+import asyncio
+import threading
+import weakref
+
+# Many page views arriving at once tend to ask the algod node the same thing,
+# the same pool's application or the same account, within a few milliseconds
+# of each other. SingleFlight makes sure only one of those requests goes to the
+# node: anyone asking for something which is already being fetched waits for
+# that response rather than making a request of their own.
+#
+# Responses for the things which only change from one round to the next
+# (applications, assets and blocks) are also remembered until the chain clock
+# sees a new round, so later requests in the same round are answered from
+# memory too. Anything else, like the status, is only shared between requests
+# in flight at the same time.
+#
+# Accounts aren't remembered. Whether an account has opted in to a pool is
+# always checked with the node when it deposits (see views.deposit), and it
+# may have only just done so in this round.
+#
+# Only GETs are shared, and only the raw status and body of the response, so
+# each caller parses its own copy.
+
+MEMOIZED_PREFIXES = (
+    '/v2/applications/',
+    '/v2/assets/',
+    '/v2/blocks/',
+)
+
+# A request being made, which others asking for the same thing wait on.
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self, memoized=MEMOIZED_PREFIXES, max_memo=10000):
+        self.memoized = memoized
+        self.max_memo = max_memo
+        self.lock = threading.Lock()
+        self.calls = {}
+        # Futures for the requests in flight from async clients, per event
+        # loop since they can only be awaited from their own loop.
+        self.futures = weakref.WeakKeyDictionary()
+        self.memo = {}
+        # Bumped each round, so a response which was asked for in the last
+        # round isn't remembered for this one.
+        self.generation = 0
+
+        # How many requests were made to the node, and how many were saved by
+        # waiting on one in flight or being answered from memory.
+        self.upstream = 0
+        self.coalesced = 0
+        self.memo_hits = 0
+
+    # Whether requests to the URL may be shared at all.
+    def shared(self, method, requrl):
+        return method == 'GET' and not requrl.startswith(LONG_POLL_PREFIXES)
+
+    def remember(self, key, requrl, generation, result):
+        if result[0] != 200 or not requrl.startswith(self.memoized):
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            if len(self.memo) >= self.max_memo:
+                self.memo.clear()
+            self.memo[key] = result
+
+    # Look up the key, returning (memoized result, call to wait on, whether
+    # we're the one to make the request, the generation it's made in).
+    def join(self, key, calls, new_call):
+        with self.lock:
+            if key in self.memo:
+                self.memo_hits += 1
+                return self.memo[key], None, False, None
+            call = calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return None, call, False, None
+            call = calls[key] = new_call()
+            self.upstream += 1
+            return None, call, True, self.generation
+
+    # Make the request with fetch(), unless the same request is in flight or
+    # has been made this round already.
+    def request(self, key, requrl, fetch):
+        result, call, leader, generation = self.join(key, self.calls, Call)
+        if call is None:
+            return result
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fetch()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        self.remember(key, requrl, generation, call.result)
+        return call.result
+
+    # The same as request, for async clients. fetch is a coroutine function.
+    async def arequest(self, key, requrl, fetch):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            futures = self.futures.setdefault(loop, {})
+        result, future, leader, generation = self.join(key, futures, loop.create_future)
+        if future is None:
+            return result
+        if not leader:
+            # Shielded so a follower being cancelled doesn't cancel the
+            # request for everyone else.
+            return await asyncio.shield(future)
+
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting, which is fine.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self.lock:
+                del futures[key]
+        self.remember(key, requrl, generation, result)
+        return result
+
+    # Called by the chain clock with each new round.
+    def new_round(self, snapshot):
+        with self.lock:
+            self.generation += 1
+            self.memo.clear()
+
+    def stats(self):
+        with self.lock:
+            saved = self.coalesced + self.memo_hits
+            total = self.upstream + saved
+            return {
+                'upstream': self.upstream,
+                'coalesced': self.coalesced,
+                'memo_hits': self.memo_hits,
+                'saved': saved,
+                'saved_rate': saved / total if total else 0.0,
+                'memo_size': len(self.memo),
+            }
+
+# Wraps a transport (see algod.PooledTransport) so the requests made through
+# it are shared.
+class CoalescingTransport:
+    def __init__(self, transport, single_flight):
+        self.transport = transport
+        self.single_flight = single_flight
+
+    def request(self, address, method, requrl, headers, data=None):
+        if not self.single_flight.shared(method, requrl):
+            return self.transport.request(address, method, requrl, headers, data)
+        key = (address, requrl, tuple(sorted(headers.items())))
+        return self.single_flight.request(key, requrl, lambda: self.transport.request(address, method, requrl, headers, data))
+
+# Shared by the sync and async clients, so a request from either is shared
+# with the other's.
+algod_single_flight = SingleFlight(
+    max_memo=getattr(settings, 'STAKING_ALGOD_MEMO_SIZE', 10000),
+)
@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+
+import base64
+
+# Decoding of the staking contract's global and local state, as returned by
+# the algod node.
+#
+# algod gives us every key base64 encoded. Rather than decoding every key we
+# come across, the tables below hold each key we care about already in its
+# encoded form, so finding out which field an entry belongs to is a single
+# dictionary lookup.
+
+def encode_keys(table):
+    return {base64.b64encode(key).decode(): field for key, field in table.items()}
+
+# Global state keys, and the PoolState field they're stored in.
+GLOBAL_FIELDS = {
+    b'A': 'admin',
+    b'I': 'initialised',
+    b'P': 'paused',
+    b'SA': 'staked_asset',
+    b'RA': 'reward_asset',
+    b'BT': 'begin_timestamp',
+    b'ET': 'end_timestamp',
+    b'FR': 'fixed_rate',
+    b'TS': 'total_staked',
+    b'TR': 'total_rewards',
+    b'LU': 'last_updated',
+}
+GLOBAL_KEYS = encode_keys(GLOBAL_FIELDS)
+
+# Local state keys, and the Position field they're stored in.
+LOCAL_FIELDS = {
+    b'AS': 'amount_staked',
+    b'AR': 'amount_rewarded',
+    b'LU': 'last_updated',
+}
+LOCAL_KEYS = encode_keys(LOCAL_FIELDS)
+
+# The state of a staking pool. Any value which hasn't been set by the contract
+# yet (e.g. the fixed rate before the pool has been funded) is left as None.
+@dataclass(slots=True)
+class PoolState:
+    app_id: int = None
+    admin: bytes = None
+    initialised: int = None
+    paused: int = None
+    staked_asset: int = None
+    reward_asset: int = None
+    begin_timestamp: int = None
+    end_timestamp: int = None
+    fixed_rate: int = None
+    total_staked: int = None
+    total_rewards: int = None
+    last_updated: int = None
+
+# An account's position within a staking pool.
+@dataclass(slots=True)
+class Position:
+    app_id: int = None
+    amount_staked: int = None
+    amount_rewarded: int = None
+    last_updated: int = None
+
+# Bytes values are the only ones we need to decode, uints are used as-is.
+def state_value(value):
+    if value['type'] == 1:
+        return base64.b64decode(value['bytes'])
+    return value['uint']
+
+def decode_state(cls, keys, app_id, kvs):
+    state = cls(app_id=app_id)
+    for kv in kvs:
+        field = keys.get(kv['key'])
+        if field is not None:
+            setattr(state, field, state_value(kv['value']))
+    return state
+
+# Decode the global state of an application, as found in application_info or
+# an account's 'created-apps'.
+def decode_pool(app) -> PoolState:
+    return decode_state(PoolState, GLOBAL_KEYS, app['id'], app['params'].get('global-state', []))
+
+# Find and decode an account's position in the pool from its account_info.
+# If the account hasn't opted in to the pool, None is returned.
+def decode_position(account, app_id) -> Position:
+    for app in account.get('apps-local-state', []):
+        if app['id'] == app_id:
+            return decode_state(Position, LOCAL_KEYS, app_id, app.get('key-value', []))
+    return None
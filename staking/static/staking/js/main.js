@@ -1,7 +1,5 @@
 // Various globals.
-var updated_rewards;
-var urInterval;
-var live;
+var rewardStream;
 
 // Attach event listeners to controls on the page if found.
 window.addEventListener('load', async function() {
@@ -33,9 +31,10 @@ window.addEventListener('load', async function() {
 	if (document.getElementById('claim')) {
 		document.getElementById('claim').addEventListener('click', claim);
 	}
-	if (document.getElementById('current_rewards')) {
-		urInterval = setInterval(update_rewards, 1000);
-		await update_rewards();
+	// Only live pools have the deposit button. Once a pool has ended its
+	// rewards won't change, so there's nothing to follow.
+	if (document.getElementById('current_rewards') && document.getElementById('deposit')) {
+		follow_rewards();
 	}
 	if (document.getElementById('wallet_select')) {
 		document.getElementById('wallet_select').addEventListener('change', changeAddress);
@@ -321,41 +320,34 @@ async function sign_transactions(txns) {
 	return signedTxns;
 }
 
-async function wait_for_transaction(txid) {
+// Wait for the server to tell us the transaction has been confirmed, it
+// follows everything submitted through it so we don't have to ask the node
+// ourselves each round.
+function wait_for_transaction(txid) {
 	console.log("Wait For Transaction");
 	document.getElementById('wait').style.display = 'flex';
-	let status = await AlgoSigner.algod({
-		ledger: 'SandNet',
-		path: '/v2/status',
-	});
-	let current_round = status['last-round'];
-	let last_round = current_round + 5;
-	while (current_round < last_round) {
-		console.log("Checking round: "+current_round);
-		try {
-			let pending = await AlgoSigner.algod({
-				ledger: 'SandNet',
-				path: '/v2/transactions/pending/'+txid,
-			});
-
-			if (pending['confirmed-round']) {
-				document.getElementById('wait').style.display = 'none';
+	return new Promise(function(resolve) {
+		const statusStream = new EventSource('/transactions/' + txid + '/stream');
+		function done(result) {
+			statusStream.close();
+			document.getElementById('wait').style.display = 'none';
+			resolve(result);
+		}
+		statusStream.onmessage = function(e) {
+			const status = JSON.parse(e.data);
+			if (status['status'] == 'confirmed') {
 				console.log("Found");
-				return pending;
+				done(status);
+			} else if (status['status'] != 'pending') {
+				console.log(status);
+				done(false);
 			}
-		} catch(err) {
-			document.getElementById('wait').style.display = 'none';
+		};
+		statusStream.onerror = function(err) {
 			console.log(err);
-		}
-
-		await AlgoSigner.algod({
-			ledger: 'SandNet',
-			path: '/v2/status/wait-for-block-after/'+current_round,
-		});
-		current_round += 1;
-	}
-	document.getElementById('wait').style.display = 'none';
-	return false;
+			done(false);
+		};
+	});
 }
 
 async function submit_transactions(txns) {
@@ -370,60 +362,41 @@ async function submit_transactions(txns) {
 	if (submit_response.ok) {
 		let json = await submit_response.json();
 		if (json['success']) {
-			return txns[0].txID;
+			return json['txid'];
 		} else {
 			return false;
 		}
 	}
 }
 
-// Update the amount of rewards the user has accumulated with their stake in
-// the pool.
-async function update_rewards() {
-	const amount_staked = parseInt(document.getElementById('amount_staked').text.split(" ")[0]);
-	const amount_staked_raw = parseInt(document.getElementById('amount_staked').attributes['value'].value);
-	const amount_rewarded = parseInt(document.getElementById('current_rewards').text.split(" ")[0]);
-	const amount_rewarded_raw = parseInt(document.getElementById('current_rewards').attributes['value'].value);
-	const reward_units = document.getElementById('current_rewards').text.split(" ").pop();
-	const begin_timestamp = parseInt(document.getElementById('begin_timestamp').attributes['value'].value);
-	const end_timestamp = parseInt(document.getElementById('end_timestamp').attributes['value'].value);
-	const last_updated = parseInt(document.getElementById('last_updated').attributes['value'].value);
-	const current_timestamp = parseInt(Math.floor(Date.now() / 1000));
-	const fixed_rate = parseInt(document.getElementById('fixed_rate').attributes['value'].value);
+// Follow the amount of rewards the user has accumulated with their stake in
+// the pool, along with the total staked. The server sends us an update each
+// time the chain moves on, worked out the same way as the smart contract.
+function follow_rewards() {
+	const current_rewards = document.getElementById('current_rewards');
+	const staked_units = document.getElementById('amount_staked').text.split(" ").pop();
+	const reward_units = current_rewards.text.split(" ").pop();
 
-	if (current_timestamp < begin_timestamp) {
-		return
-	}
+	rewardStream = new EventSource(current_rewards.dataset.stream);
+	rewardStream.onmessage = function(e) {
+		const update = JSON.parse(e.data);
+		document.getElementById('total_staked').text = update.total_staked + " " + staked_units;
+		document.getElementById('amount_staked').text = update.user_staked + " " + staked_units;
+		document.getElementById('amount_staked').attributes['value'].value = update.user_staked_raw;
+		current_rewards.text = update.user_rewards + " " + reward_units;
+		current_rewards.attributes['value'].value = update.user_rewards_raw;
 
-	if (amount_staked == 0) {
-		return
-	}
-
-	const decimals = 6;
-	const dp = 10**decimals;
-	const tick = (amount_staked_raw / dp) * fixed_rate / 10000 / 31557600;
-	if (current_timestamp < end_timestamp) {
-		// Live
-		live = true
-		if (last_updated > begin_timestamp) {
-			duration = current_timestamp - last_updated;
-		} else {
-			duration = current_timestamp - begin_timestamp;
-		}
-		updated_rewards = (amount_rewarded_raw / dp) + (tick * duration);
-	} else {
-		// Ended
-		if (last_updated > begin_timestamp) {
-			duration = end_timestamp - last_updated;
-		} else {
-			duration = end_timestamp - begin_timestamp;
+		// Nothing more will change once the pool has ended, so swap the
+		// controls over to those for an ended pool.
+		if (update.ended) {
+			rewardStream.close();
+			for (const id of ['amount', 'deposit', 'withdraw', 'claim']) {
+				if (document.getElementById(id)) document.getElementById(id).hidden = true;
+			}
+			if (document.getElementById('withdraw_all')) {
+				document.getElementById('withdraw_all').hidden = false;
+			}
 		}
-		updated_rewards = (amount_rewarded_raw / dp) + (tick * duration);
-		clearInterval(urInterval);
-		if (live) window.location.reload(false);
-	}
-
-	const new_value = Math.round((updated_rewards * dp)) / dp
-	document.getElementById('current_rewards').text = new_value + " " + reward_units;
+	};
 }
 
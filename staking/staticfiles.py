@@ -0,0 +1,182 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+from pathlib import Path
+
+import gzip
+import mimetypes
+import threading
+
+# Brotli is optional (pip install brotli). Without it only gzip is used.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Serving the static files (the stylesheets, main.js and the spinner) in
+# production, so browsers download each version of them once.
+#
+# `./manage.py collectstatic` copies the files to STATIC_ROOT with the hash of
+# their content in their name (e.g. main.3f2a1c.js), which is what {% static %}
+# links to, along with compressed copies of the text files. Since a hashed name
+# always has the same content, it's served with a far-future Cache-Control and
+# browsers never need to check it again. A change to a file gives it a new
+# name, and the pages link to that instead.
+#
+# The middleware serves the files in STATIC_ROOT, picking the smallest copy the
+# browser accepts, straight from memory. Anything under the size limit is read
+# once when the first static file is asked for, so restart the server after
+# running collectstatic.
+#
+# With DEBUG on the files are linked to and served by staticfiles as usual,
+# unhashed and straight from the app, so there's nothing to collect during
+# development. With it off, linking to a file which collectstatic hasn't
+# hashed is an error, as with ManifestStaticFilesStorage.
+
+# Files which are worth compressing, by extension.
+COMPRESSIBLE = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html')
+
+# Don't bother compressing anything smaller than this, in bytes.
+MIN_COMPRESS_SIZE = 256
+
+# A year, for the names which include their content's hash.
+FOREVER = 'public, max-age=31536000, immutable'
+
+# Files larger than this are served from disk rather than memory, in bytes.
+MAX_MEMORY_SIZE = 1024 * 1024
+
+# The compressed copies, by the Content-Encoding they're served with, in order
+# of preference.
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+def compress(path):
+    data = path.read_bytes()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data)
+    for suffix, compressed in variants.items():
+        # Only keep copies which are meaningfully smaller.
+        if len(compressed) < len(data) * 0.95:
+            path.with_name(path.name + suffix).write_bytes(compressed)
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # After hashing, write compressed copies of the text files, both under
+    # their original and hashed names.
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                compress(Path(self.path(name)))
+
+# A file in STATIC_ROOT, and the compressed copies of it.
+class StaticFile:
+    def __init__(self, path, immutable):
+        self.path = path
+        stat = path.stat()
+        self.mtime = int(stat.st_mtime)
+        self.last_modified = http_date(self.mtime)
+        self.content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        self.cache_control = FOREVER if immutable else 'public, max-age=60'
+        self.variants = {}
+        for encoding, suffix in ENCODINGS.items():
+            variant = path.with_name(path.name + suffix)
+            if variant.exists():
+                self.variants[encoding] = variant
+        self.contents = {}
+        if stat.st_size <= MAX_MEMORY_SIZE:
+            self.contents[None] = path.read_bytes()
+            for encoding, variant in self.variants.items():
+                self.contents[encoding] = variant.read_bytes()
+
+    # The encoding to send, of those the browser accepts.
+    def encoding(self, accept_encoding):
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.split(',')}
+        for encoding in self.variants:
+            if encoding in accepted:
+                return encoding
+        return None
+
+    # Whether the browser's copy, from the If-Modified-Since header, is at
+    # least as new as ours.
+    def not_modified(self, since):
+        since = parse_http_date_safe(since) if since is not None else None
+        return since is not None and since >= self.mtime
+
+    def response(self, request):
+        if self.not_modified(request.headers.get('If-Modified-Since')):
+            response = HttpResponseNotModified()
+        else:
+            encoding = self.encoding(request.headers.get('Accept-Encoding', ''))
+            path = self.variants[encoding] if encoding is not None else self.path
+            if request.method == 'HEAD':
+                # The same headers as a GET, without the body.
+                size = len(self.contents[encoding]) if encoding in self.contents else path.stat().st_size
+                response = HttpResponse(content_type=self.content_type)
+                response['Content-Length'] = size
+            elif encoding in self.contents:
+                response = HttpResponse(self.contents[encoding], content_type=self.content_type)
+            else:
+                response = FileResponse(path.open('rb'), content_type=self.content_type)
+            if encoding is not None:
+                response['Content-Encoding'] = encoding
+            response['Last-Modified'] = self.last_modified
+        response['Cache-Control'] = self.cache_control
+        if self.variants:
+            response['Vary'] = 'Accept-Encoding'
+        return response
+
+# Serves the files in STATIC_ROOT, see above. Does nothing with DEBUG on, or if
+# collectstatic hasn't been run.
+class StaticFilesMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.files = None
+        self.lock = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    # Every file under STATIC_ROOT, by the path it's served at.
+    def load(self):
+        with self.lock:
+            if self.files is None:
+                files = {}
+                root = Path(settings.STATIC_ROOT) if settings.STATIC_ROOT else None
+                if not settings.DEBUG and root is not None and root.is_dir():
+                    hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+                    for path in root.rglob('*'):
+                        name = path.relative_to(root).as_posix()
+                        if path.is_file() and not name.endswith(tuple(ENCODINGS.values())):
+                            files[self.prefix + name] = StaticFile(path, name in hashed)
+                self.files = files
+        return self.files
+
+    def find(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        return (self.files if self.files is not None else self.load()).get(request.path)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.find(request)
+        if static_file is not None:
+            return static_file.response(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = self.find(request)
+        if static_file is not None:
+            return static_file.response(request)
+        return await self.get_response(request)
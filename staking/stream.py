@@ -0,0 +1,187 @@
+from asgiref.sync import sync_to_async
+
+from .assets import asset_cache
+from .rewards import accrued_rewards
+
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Pushes updates of an account's rewards and the pool's total stake to the
+# pool page as server-sent events, rather than every page working them out
+# for itself on a timer.
+#
+# Each time the chain clock sees a new round, everyone watching is told about
+# it, and works out their update from the state mirror in their own request.
+# The first watcher of a (pool, account) to do so for the round keeps the
+# update for any others watching the same thing, so it's only worked out once
+# a round however many pages are open, and the node is only followed by the
+# chain clock.
+#
+# If nothing has been sent for 'heartbeat' seconds a comment is sent instead,
+# so proxies don't give up on the connection.
+#
+# Under WSGI each stream holds a worker thread for as long as it's open, so
+# 'lifetime' seconds after it starts (if not None) the stream is closed, and
+# the browser's EventSource reconnects for another. Async streams don't hold a
+# thread, so are left open until the pool ends.
+
+def encode_event(update):
+    return 'data: {}\n\n'.format(json.dumps(update))
+
+HEARTBEAT = ': keep-alive\n\n'
+
+class RewardStream:
+    def __init__(self, client, clock, mirror, heartbeat=15, lifetime=None):
+        self.client = client
+        self.clock = clock
+        self.mirror = mirror
+        self.heartbeat = heartbeat
+        self.lifetime = lifetime
+        self.subscribers = {}
+        # The last update worked out for each (pool, account) being watched.
+        self.latest = {}
+        self.lock = threading.Lock()
+
+        # How many updates have been worked out, and how many sent.
+        self.updates = 0
+        self.deliveries = 0
+
+        clock.subscribe(self.publish)
+
+    # The account's position in the pool as of the snapshot, in the same
+    # units as the pool page.
+    def update(self, pool_id, account, snapshot):
+        state = self.mirror.pool(pool_id, snapshot[0])
+        position = self.mirror.position(pool_id, account, snapshot[0])
+        assets = asset_cache.get_many(self.client, [state.staked_asset, state.reward_asset])
+        staked_dp = pow(10, assets[state.staked_asset]['params']['decimals'])
+        reward_dp = pow(10, assets[state.reward_asset]['params']['decimals'])
+
+        timestamp = self.clock.extrapolate(snapshot)
+        user_staked = 0
+        user_rewards = 0
+        if position is not None:
+            user_staked = position.amount_staked or 0
+            # The contract is always called at or after the last update.
+            user_rewards = accrued_rewards(state, position, max(timestamp, position.last_updated or 0))
+
+        return {
+            'round': snapshot[0],
+            'timestamp': timestamp,
+            'total_staked': (state.total_staked or 0) / staked_dp,
+            'total_staked_raw': state.total_staked or 0,
+            'user_staked': user_staked / staked_dp,
+            'user_staked_raw': user_staked,
+            'user_rewards': user_rewards / reward_dp,
+            'user_rewards_raw': user_rewards,
+            'ended': timestamp >= (state.end_timestamp or 0),
+        }
+
+    # The update for the round, worked out unless another watcher already
+    # has. Returns None if it couldn't be.
+    def shared_update(self, pool_id, account, snapshot):
+        key = (pool_id, account)
+        with self.lock:
+            update = self.latest.get(key)
+            if update is None or update['round'] != snapshot[0]:
+                update = None
+        if update is None:
+            try:
+                update = self.update(pool_id, account, snapshot)
+            except Exception:
+                logger.exception('Failed to update rewards for pool %s', pool_id)
+                return None
+            with self.lock:
+                self.updates += 1
+                if key in self.subscribers:
+                    self.latest[key] = update
+        with self.lock:
+            self.deliveries += 1
+        return update
+
+    # Call 'deliver' with every new snapshot, until unsubscribed.
+    def subscribe(self, pool_id, account, deliver):
+        with self.lock:
+            self.subscribers.setdefault((pool_id, account), set()).add(deliver)
+
+    def unsubscribe(self, pool_id, account, deliver):
+        with self.lock:
+            watchers = self.subscribers.get((pool_id, account), set())
+            watchers.discard(deliver)
+            if not watchers:
+                self.subscribers.pop((pool_id, account), None)
+                self.latest.pop((pool_id, account), None)
+
+    # Called by the chain clock with each new round. Only hands the snapshot
+    # over, the watchers do the work.
+    def publish(self, snapshot):
+        with self.lock:
+            watchers = [deliver for delivers in self.subscribers.values() for deliver in delivers]
+        for deliver in watchers:
+            deliver(snapshot)
+
+    # The events to send a page, starting with where things are now. Once the
+    # pool has ended the rewards won't change, so the stream ends too, as it
+    # does once its lifetime is up.
+    def events(self, pool_id, account):
+        snapshots = queue.SimpleQueue()
+        self.subscribe(pool_id, account, snapshots.put)
+        deadline = time.monotonic() + self.lifetime if self.lifetime is not None else None
+        try:
+            snapshot = self.clock.current()
+            while True:
+                update = self.shared_update(pool_id, account, snapshot) if snapshot is not None else None
+                if update is None:
+                    yield HEARTBEAT
+                else:
+                    yield encode_event(update)
+                    if update['ended']:
+                        return
+                timeout = self.heartbeat
+                if deadline is not None:
+                    timeout = min(timeout, deadline - time.monotonic())
+                    if timeout <= 0:
+                        return
+                try:
+                    snapshot = snapshots.get(timeout=timeout)
+                except queue.Empty:
+                    snapshot = None
+        finally:
+            self.unsubscribe(pool_id, account, snapshots.put)
+
+    # The same as events, for async views. Snapshots are published from the
+    # chain clock's thread, so are passed over to the event loop, and the
+    # updates worked out from a thread.
+    async def aevents(self, pool_id, account):
+        loop = asyncio.get_running_loop()
+        snapshots = asyncio.Queue()
+
+        def deliver(snapshot):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(snapshots.put_nowait, snapshot)
+
+        self.subscribe(pool_id, account, deliver)
+        try:
+            snapshot = await self.clock.acurrent()
+            while True:
+                update = None
+                if snapshot is not None:
+                    update = await sync_to_async(self.shared_update, thread_sensitive=False)(pool_id, account, snapshot)
+                if update is None:
+                    yield HEARTBEAT
+                else:
+                    yield encode_event(update)
+                    if update['ended']:
+                        return
+                try:
+                    snapshot = await asyncio.wait_for(snapshots.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    snapshot = None
+        finally:
+            self.unsubscribe(pool_id, account, deliver)
@@ -0,0 +1,186 @@
+from collections import OrderedDict
+
+from algosdk import error
+
+from .stream import HEARTBEAT, encode_event
+from .transactions import transaction_id
+
+import asyncio
+import logging
+import msgpack
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Sends the signed transaction groups handed to us by the frontend, and keeps
+# track of them until they're confirmed, rather than every browser polling the
+# node for its own transaction each round.
+#
+# Each time the chain clock sees a new round, the node's pool of pending
+# transactions is fetched once. Any group we're waiting on which has left the
+# pool has either been confirmed or rejected, and only those are looked up
+# individually. So the node is asked once a round however many groups are
+# pending (and not at all when none are), plus once for each group as it's
+# finished.
+#
+# A group is known by the ID of its first transaction. If it's still pending
+# after its last valid round it can never be confirmed, so it's expired.
+
+PENDING = 'pending'
+CONFIRMED = 'confirmed'
+FAILED = 'failed'
+EXPIRED = 'expired'
+
+class SubmissionQueue:
+    def __init__(self, client, clock, heartbeat=15, max_finished=10000):
+        self.client = client
+        self.clock = clock
+        self.heartbeat = heartbeat
+        self.max_finished = max_finished
+        # The groups we're waiting on, by ID, with the last round they're
+        # valid for. The last 'max_finished' groups to finish are kept, in the
+        # order they finished, so they can still be asked about.
+        self.pending = {}
+        self.finished = OrderedDict()
+        self.statuses = {}
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+        # How many times the pool's been swept, and how many transactions have
+        # been looked up individually.
+        self.sweeps = 0
+        self.lookups = 0
+
+        clock.subscribe(self.sweep)
+
+    # Start tracking a group which has been sent.
+    def track(self, txgroup):
+        txid = txgroup[0].transaction.get_txid()
+        last_valid = max(stxn.transaction.last_valid_round for stxn in txgroup)
+        with self.lock:
+            self.pending[txid] = last_valid
+            self.finished.pop(txid, None)
+            self.statuses[txid] = {'txid': txid, 'status': PENDING}
+        return txid
+
+    # Send the group to the node, and track it. Any error sending it is
+    # raised, without the group being tracked.
+    def send(self, txgroup):
+        self.client.send_transactions(txgroup)
+        return self.track(txgroup)
+
+    def status(self, txid):
+        with self.lock:
+            return self.statuses.get(txid)
+
+    def finish(self, txid, status):
+        with self.lock:
+            self.pending.pop(txid, None)
+            self.statuses[txid] = status
+            self.finished[txid] = None
+            self.finished.move_to_end(txid)
+            while len(self.finished) > self.max_finished:
+                self.statuses.pop(self.finished.popitem(last=False)[0], None)
+            watchers = list(self.subscribers.get(txid, ()))
+        for deliver in watchers:
+            deliver(status)
+
+    # The IDs of every transaction in the node's pending pool.
+    def pool(self):
+        response = msgpack.unpackb(self.client.pending_transactions(response_format='msgpack'), raw=False, strict_map_key=False)
+        return {transaction_id(stxn['txn']) for stxn in response.get('top-transactions') or []}
+
+    # Called by the chain clock with each new round.
+    def sweep(self, snapshot):
+        with self.lock:
+            pending = dict(self.pending)
+        if not pending:
+            return
+
+        self.sweeps += 1
+        in_pool = self.pool()
+        for txid, last_valid in pending.items():
+            if txid in in_pool:
+                continue
+            try:
+                info = self.client.pending_transaction_info(txid)
+            except error.AlgodHTTPError as e:
+                # The node has forgotten about it, so it was never confirmed.
+                if e.code == 404:
+                    self.finish(txid, {'txid': txid, 'status': EXPIRED})
+                else:
+                    logger.exception('Failed to look up transaction %s', txid)
+                continue
+            self.lookups += 1
+
+            if info.get('confirmed-round'):
+                self.finish(txid, {
+                    'txid': txid,
+                    'status': CONFIRMED,
+                    'confirmed-round': info['confirmed-round'],
+                    'application-index': info.get('application-index'),
+                    'asset-index': info.get('asset-index'),
+                })
+            elif info.get('pool-error'):
+                self.finish(txid, {'txid': txid, 'status': FAILED, 'pool-error': info['pool-error']})
+            elif snapshot[0] > last_valid:
+                self.finish(txid, {'txid': txid, 'status': EXPIRED})
+
+    def subscribe(self, txid, deliver):
+        with self.lock:
+            self.subscribers.setdefault(txid, set()).add(deliver)
+
+    def unsubscribe(self, txid, deliver):
+        with self.lock:
+            watchers = self.subscribers.get(txid, set())
+            watchers.discard(deliver)
+            if not watchers:
+                self.subscribers.pop(txid, None)
+
+    # The events to send a page waiting on the group, starting with its
+    # status now and ending once it's finished.
+    def events(self, txid):
+        updates = queue.SimpleQueue()
+        self.subscribe(txid, updates.put)
+        try:
+            status = self.status(txid)
+            while True:
+                if status is None:
+                    yield HEARTBEAT
+                else:
+                    yield encode_event(status)
+                    if status['status'] != PENDING:
+                        return
+                try:
+                    status = updates.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    status = None
+        finally:
+            self.unsubscribe(txid, updates.put)
+
+    # The same as events, for async views.
+    async def aevents(self, txid):
+        loop = asyncio.get_running_loop()
+        updates = asyncio.Queue()
+
+        def deliver(status):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(updates.put_nowait, status)
+
+        self.subscribe(txid, deliver)
+        try:
+            status = self.status(txid)
+            while True:
+                if status is None:
+                    yield HEARTBEAT
+                else:
+                    yield encode_event(status)
+                    if status['status'] != PENDING:
+                        return
+                try:
+                    status = await asyncio.wait_for(updates.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    status = None
+        finally:
+            self.unsubscribe(txid, deliver)
@@ -1,3 +1,1144 @@
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
 
-# Create your tests here.
+from algosdk import account, encoding, error, v2client
+from algosdk.future import transaction
+
+import asyncio
+import gzip
+import base64
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from pathlib import Path
+from unittest import mock
+
+from .algod import LatencyMetrics, PooledAlgodClient, PooledTransport, endpoint_name
+from .assets import AssetCache, asset_cache
+from .async_algod import AsyncAlgodClient
+from .chain import ChainClock, SuggestedParamsCache
+from .contract import ContractRegistry, CONTRACT_PATH
+from .follower import BlockFollower
+from .groups import GroupCache
+from .instrumentation import request_metrics
+from .mirror import StateMirror
+from .models import Account, Checkpoint, Pool, Position as PositionRow
+from .pages import PageCache, page_key
+from .fakealgod import FakeAlgod, DEPLOYER, FIRST_APP_ID, state_entry
+from .pools import decode_cursor, describe_rows, page_pools, row_asset_ids
+from .programs import CONTRACTS_DIR, ProgramStore, TEAL_SOURCES
+from .registry import DeployerRegistry
+from .singleflight import CoalescingTransport, SingleFlight
+from .rewards import UINT64_MAX, accrued_rewards, calculate_rewards
+from . import api, views
+from .stream import RewardStream
+from .submissions import SubmissionQueue
+from .timing import RequestTimings, current_timings
+from .views import MAX_BATCH, batch_requests, pool_details, rewards_details
+from .state import PoolState, Position, decode_pool, decode_position
+from .staticfiles import StaticFilesMiddleware
+from .transactions import claim_group, deposit_group
+
+# NumPy is optional (pip install numpy). Only the projection needs it.
+try:
+    import numpy as np
+    from . import projection
+except ImportError:
+    np = projection = None
+
+class DescribeRowsTests(TestCase):
+    def setUp(self):
+        asset_cache.invalidate()
+
+    def test_pool_details(self):
+        with FakeAlgod(pools=3, assets=2) as fake:
+            client = v2client.algod.AlgodClient('a' * 64, fake.address)
+            clock = ChainClock(client)
+            mirror = StateMirror(client, clock, DeployerRegistry([DEPLOYER]))
+            rows = list(mirror.pools(clock.sync()[0]).order_by('app_id'))
+            assets = asset_cache.get_many(client, row_asset_ids(rows))
+            pools = {p['id']: p for p in describe_rows(rows, assets, fake.timestamp)}
+
+            self.assertEqual(fake.request_count('asset'), 2)
+            self.assertEqual(pools[FIRST_APP_ID]['staking_asset']['index'], 1000)
+            self.assertEqual(pools[FIRST_APP_ID]['reward_asset']['index'], 1001)
+            self.assertEqual(pools[FIRST_APP_ID]['rate'], '10.0%')
+            self.assertEqual(pools[FIRST_APP_ID]['duration'], 'Ended')
+            self.assertEqual(pools[FIRST_APP_ID + 1]['duration'], '0 seconds remaining')
+
+class PagePoolsTests(TestCase):
+    def setUp(self):
+        # Pools beginning an hour apart and lasting two, in a jumbled order.
+        self.now = 1700000000
+        for i in range(45):
+            begin = self.now + 3600 * ((i * 7) % 45 - 20)
+            Pool.objects.create(app_id=FIRST_APP_ID + i, creator=DEPLOYER, round=1, begin_timestamp=begin, end_timestamp=begin + 7200)
+        Pool.objects.create(app_id=1, creator='OTHER', round=1, begin_timestamp=self.now, end_timestamp=self.now)
+
+    def pages(self, **kwargs):
+        rows, cursor, pages = [], None, 0
+        while True:
+            page, cursor = page_pools(Pool.objects.filter(creator=DEPLOYER), self.now, cursor=cursor, size=20, **kwargs)
+            rows.extend(page)
+            pages += 1
+            if cursor is None:
+                return rows, pages
+
+    def test_every_pool_once_in_order(self):
+        rows, pages = self.pages(sort='-end')
+        self.assertEqual(pages, 3)
+        self.assertEqual(len({row.app_id for row in rows}), 45)
+        self.assertEqual([row.end_timestamp for row in rows], sorted((row.end_timestamp for row in rows), reverse=True))
+
+    def test_filter_by_status(self):
+        upcoming, _ = self.pages(status='upcoming')
+        live, _ = self.pages(status='live')
+        ended, _ = self.pages(status='ended', sort='end')
+        self.assertEqual((len(upcoming), len(live), len(ended)), (24, 3, 18))
+        self.assertTrue(all(row.begin_timestamp > self.now for row in upcoming))
+        self.assertTrue(all(row.begin_timestamp <= self.now <= row.end_timestamp for row in live))
+
+    def test_ties_broken_by_app_id(self):
+        Pool.objects.update(begin_timestamp=self.now)
+        rows, _ = self.pages()
+        self.assertEqual([row.app_id for row in rows], list(range(FIRST_APP_ID, FIRST_APP_ID + 45)))
+        self.assertEqual(decode_cursor(page_pools(Pool.objects.all(), self.now, size=1)[1]), (self.now, 1))
+
+    def test_invalid_queries(self):
+        for kwargs in ({'status': 'paused'}, {'sort': 'app_id'}, {'cursor': 'nonsense'}):
+            with self.assertRaises(ValueError):
+                page_pools(Pool.objects.all(), self.now, **kwargs)
+
+class AssetCacheTests(SimpleTestCase):
+    def test_repeat_lookups_hit_cache(self):
+        cache = AssetCache()
+        with FakeAlgod(pools=0, assets=3) as fake:
+            client = v2client.algod.AlgodClient('a' * 64, fake.address)
+            cache.get_many(client, [1000, 1001, 1002])
+            cache.get_many(client, [1000, 1001, 1002])
+            asset = cache.get(client, 1001)
+
+            self.assertEqual(asset['params']['unit-name'], 'A1')
+            self.assertEqual(fake.request_count('asset'), 3)
+            self.assertEqual(cache.stats(), {'size': 3, 'hits': 4, 'misses': 3})
+
+    def test_copies_are_returned(self):
+        cache = AssetCache()
+        with FakeAlgod(pools=0, assets=1) as fake:
+            client = v2client.algod.AlgodClient('a' * 64, fake.address)
+            cache.get(client, 1000)['params']['unit_name'] = 'changed'
+
+            self.assertNotIn('unit_name', cache.get(client, 1000)['params'])
+
+    def test_least_recently_used_evicted(self):
+        cache = AssetCache(max_size=2)
+        with FakeAlgod(pools=0, assets=3) as fake:
+            client = v2client.algod.AlgodClient('a' * 64, fake.address)
+            cache.get(client, 1000)
+            cache.get(client, 1001)
+            cache.get(client, 1000)
+            cache.get(client, 1002)
+            fake.reset_counts()
+            cache.get(client, 1000)
+            cache.get(client, 1001)
+
+            self.assertEqual(fake.request_count('asset'), 1)
+
+    def test_backend_persistence_and_invalidation(self):
+        with FakeAlgod(pools=0, assets=1) as fake:
+            client = v2client.algod.AlgodClient('a' * 64, fake.address)
+            AssetCache(backend='default').get(client, 1000)
+            AssetCache(backend='default').get(client, 1000)
+            self.assertEqual(fake.request_count('asset'), 1)
+
+            cache = AssetCache(backend='default')
+            cache.get(client, 1000)
+            cache.invalidate(1000)
+            AssetCache(backend='default').get(client, 1000)
+            self.assertEqual(fake.request_count('asset'), 2)
+
+class ChainClockTests(SimpleTestCase):
+    def test_now_answered_from_memory(self):
+        with FakeAlgod(pools=0, assets=0, round_time=60) as fake:
+            clock = ChainClock(v2client.algod.AlgodClient('a' * 64, fake.address))
+            try:
+                first = clock.now()
+                for _ in range(10):
+                    clock.now()
+                self.assertAlmostEqual(first, fake.timestamp, delta=1)
+                self.assertEqual(fake.request_count('status'), 1)
+                self.assertEqual(fake.request_count('block'), 1)
+            finally:
+                clock.stop()
+
+    def test_follows_new_rounds(self):
+        with FakeAlgod(pools=0, assets=0, round_time=0.1) as fake:
+            clock = ChainClock(v2client.algod.AlgodClient('a' * 64, fake.address))
+            try:
+                first = clock.round()
+                time.sleep(0.5)
+                self.assertGreater(clock.round(), first)
+                self.assertGreater(fake.request_count('wait_for_block'), 0)
+            finally:
+                clock.stop()
+
+    def test_started_again_after_stop(self):
+        with FakeAlgod(pools=0, assets=0, round_time=0.1) as fake:
+            clock = ChainClock(v2client.algod.AlgodClient('a' * 64, fake.address))
+            clock.round()
+            first = clock.thread
+            clock.stop()
+            self.assertIsNone(clock.thread)
+            try:
+                clock.round()
+                self.assertIsNot(clock.thread, first)
+                self.assertTrue(clock.thread.is_alive())
+            finally:
+                clock.stop()
+
+    def test_slow_listener_does_not_hold_back_clock(self):
+        with FakeAlgod(pools=0, assets=0, round_time=0.1) as fake:
+            clock = ChainClock(v2client.algod.AlgodClient('a' * 64, fake.address), slow_listener=0.2)
+            heard = []
+            def slow(snapshot):
+                heard.append(snapshot[0])
+                if len(heard) == 1:
+                    time.sleep(0.5)
+            clock.subscribe(slow)
+            try:
+                first = clock.round()
+                with self.assertLogs('staking.chain', 'WARNING'):
+                    time.sleep(0.7)
+                self.assertGreater(clock.round(), first + 2)
+                # Rounds which went by while it was busy are skipped.
+                self.assertLess(len(heard), clock.round() - first)
+                self.assertGreaterEqual(clock.stats()[slow.__qualname__]['slowest'], 0.5)
+            finally:
+                clock.stop()
+
+class ContractRegistryTests(SimpleTestCase):
+    def test_methods_and_selectors(self):
+        registry = ContractRegistry(CONTRACT_PATH)
+        deploy = registry.method('deploy')
+
+        self.assertEqual(deploy.name, 'deploy')
+        self.assertEqual(registry.selector('deploy'), deploy.get_selector())
+        with self.assertRaises(Exception):
+            registry.method('missing')
+
+    def test_reloads_when_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'staking.json')
+            shutil.copy(CONTRACT_PATH, path)
+            registry = ContractRegistry(path, check_interval=0)
+            registry.method('deploy')
+
+            with open(path) as f:
+                js = json.load(f)
+            js['methods'][0]['name'] = 'renamed'
+            with open(path, 'w') as f:
+                json.dump(js, f)
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1000000000))
+
+            self.assertEqual(registry.method('renamed').name, 'renamed')
+
+class StateTests(SimpleTestCase):
+    def test_decode_pool(self):
+        app = {'id': 7, 'params': {'global-state': [
+            state_entry('A', b'admin'),
+            state_entry('SA', 10),
+            state_entry('RA', 11),
+            state_entry('BT', 100),
+            state_entry('ET', 200),
+            state_entry('XX', 1),
+        ]}}
+
+        self.assertEqual(decode_pool(app), PoolState(app_id=7, admin=b'admin', staked_asset=10, reward_asset=11, begin_timestamp=100, end_timestamp=200))
+
+    def test_decode_position(self):
+        account = {'apps-local-state': [
+            {'id': 6, 'key-value': [state_entry('AS', 1)]},
+            {'id': 7, 'key-value': [state_entry('AS', 50), state_entry('AR', 3), state_entry('LU', 150)]},
+        ]}
+
+        self.assertEqual(decode_position(account, 7), Position(app_id=7, amount_staked=50, amount_rewarded=3, last_updated=150))
+        self.assertIsNone(decode_position(account, 8))
+
+class ProgramStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        for path in TEAL_SOURCES.values():
+            shutil.copy(CONTRACTS_DIR / path, self.dir / path)
+
+    def store(self):
+        return ProgramStore(self.dir, check_interval=0)
+
+    def test_nothing_loaded_until_compiled(self):
+        self.assertEqual(self.store().load(), {})
+
+    def test_compiled_once_per_source(self):
+        with FakeAlgod(pools=0, assets=0) as fake:
+            client = v2client.algod.AlgodClient('a' * 64, fake.address)
+            store = self.store()
+            approval = store.approval(client)
+            self.assertEqual(fake.request_count('compile'), 2)
+
+            # Another process finds them in the cache.
+            self.assertEqual(self.store().load(), {'approval': approval, 'clear': store.clear(client)})
+            self.assertEqual(store.info()['approval'], {'hash': approval.hash, 'size': 33, 'source_hash': approval.source_hash})
+
+            # Changing the source compiles it again.
+            with open(self.dir / 'staking.teal', 'a') as f:
+                f.write('// Changed\n')
+            os.utime(self.dir / 'staking.teal', ns=(0, 0))
+            self.assertNotEqual(store.approval(client).hash, approval.hash)
+            self.assertEqual(fake.request_count('compile'), 3)
+
+class GroupCacheTests(SimpleTestCase):
+    def params(self, first):
+        return transaction.SuggestedParams(1000, first, first + 1000, 'SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=', 'sandnet-v1')
+
+    def test_same_group_built_once(self):
+        cache = GroupCache()
+        state = PoolState(app_id=FIRST_APP_ID, staked_asset=1000, reward_asset=1001)
+        data = {'sender': DEPLOYER}
+        group = cache.build(claim_group, data, self.params(10), FIRST_APP_ID, state)
+        self.assertEqual(cache.build(claim_group, data, self.params(10), FIRST_APP_ID, state), group)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+        # Anything which changes the group is built again.
+        cache.build(claim_group, data, self.params(11), FIRST_APP_ID, state)
+        cache.build(claim_group, {'sender': encoding.encode_address(bytes(32))}, self.params(10), FIRST_APP_ID, state)
+        cache.build(deposit_group, dict(data, amount=5), self.params(10), FIRST_APP_ID, state, None)
+        cache.build(deposit_group, dict(data, amount=5), self.params(10), FIRST_APP_ID, state, Position(app_id=FIRST_APP_ID))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size'], stats['hit_rate']), (1, 5, 5, 1 / 6))
+        self.assertGreater(stats['time_saved'], 0)
+
+class BatchRequestsTests(SimpleTestCase):
+    def test_sender_shared(self):
+        requests = batch_requests({'sender': DEPLOYER, 'pools': [{'pool_id': 1, 'fixed-rate': 5}, {'pool_id': 2, 'fixed-rate': 5}]}, ['pool_id', 'fixed-rate'])
+        self.assertEqual(requests, [
+            {'pool_id': 1, 'fixed-rate': 5, 'sender': DEPLOYER},
+            {'pool_id': 2, 'fixed-rate': 5, 'sender': DEPLOYER},
+        ])
+
+    def test_invalid_batches(self):
+        # Not a list, empty, not an object, missing a field, repeated and too many.
+        for pools in (None, [], [1], [{'fixed-rate': 5}], [{'pool_id': 1}] * 2, [{'pool_id': i} for i in range(MAX_BATCH + 1)]):
+            with self.assertRaises(ValueError):
+                batch_requests({'sender': DEPLOYER, 'pools': pools}, ['pool_id'])
+
+        # Not an object, or without a sender.
+        for data in ([], {'pools': [{'pool_id': 1}]}):
+            with self.assertRaises(ValueError):
+                batch_requests(data, ['pool_id'])
+
+class SuggestedParamsCacheTests(SimpleTestCase):
+    def test_served_from_memory_and_refreshed_each_round(self):
+        with FakeAlgod(pools=0, assets=0, round_time=0.2) as fake:
+            client = v2client.algod.AlgodClient('a' * 64, fake.address)
+            clock = ChainClock(client)
+            cache = SuggestedParamsCache(client, clock)
+            try:
+                first = cache.get()
+                first.fee = 5000
+                for _ in range(10):
+                    self.assertEqual(cache.get().fee, 0)
+                self.assertEqual(fake.request_count('params'), 1)
+
+                time.sleep(0.7)
+                self.assertGreater(cache.get().first, first.first)
+                self.assertEqual(cache.misses, 1)
+            finally:
+                clock.stop()
+
+    def test_refetched_near_end_of_window(self):
+        with FakeAlgod(pools=0, assets=0, round_time=60) as fake:
+            client = v2client.algod.AlgodClient('a' * 64, fake.address)
+            clock = ChainClock(client)
+            cache = SuggestedParamsCache(client, clock, margin=10)
+            try:
+                cache.get()
+                cache.params.last = clock.round() + 5
+                self.assertEqual(cache.get().last, clock.round() + 1000)
+                self.assertEqual(fake.request_count('params'), 2)
+            finally:
+                clock.stop()
+
+class AsyncAlgodClientTests(SimpleTestCase):
+    def test_connections_reused(self):
+        with FakeAlgod(pools=2, assets=2) as fake:
+            client = AsyncAlgodClient('a' * 64, fake.address, max_connections=2)
+
+            async def run():
+                for _ in range(5):
+                    await client.status()
+                return await asyncio.gather(*[client.asset_info(1000) for _ in range(10)])
+
+            assets = asyncio.run(run())
+            self.assertEqual(assets[0]['params']['unit-name'], 'A0')
+            self.assertEqual(fake.request_count(), 15)
+            self.assertEqual(fake.connections, 2)
+
+    def test_errors(self):
+        with FakeAlgod(pools=0, assets=0) as fake:
+            client = AsyncAlgodClient('a' * 64, fake.address)
+            with self.assertRaisesMessage(error.AlgodHTTPError, 'asset does not exist'):
+                asyncio.run(client.asset_info(1))
+
+class PooledAlgodClientTests(SimpleTestCase):
+    def pooled_client(self, fake, **kwargs):
+        self.metrics = LatencyMetrics()
+        return PooledAlgodClient('a' * 64, fake.address, transport=PooledTransport(backoff=0, metrics=self.metrics, **kwargs))
+
+    def test_endpoint_name(self):
+        self.assertEqual(endpoint_name('GET', '/v2/assets/1000'), 'GET /v2/assets/{}')
+        self.assertEqual(endpoint_name('GET', '/v2/accounts/' + DEPLOYER + '?format=json'), 'GET /v2/accounts/{}')
+        self.assertEqual(endpoint_name('GET', '/v2/status/wait-for-block-after/12'), 'GET /v2/status/wait-for-block-after/{}')
+
+    def test_connections_reused(self):
+        with FakeAlgod(pools=2, assets=2) as fake:
+            client = self.pooled_client(fake, pool_size=2)
+            for _ in range(5):
+                client.status()
+            self.assertEqual(client.asset_info(1000)['params']['unit-name'], 'A0')
+            self.assertEqual(fake.connections, 1)
+
+            stats = self.metrics.snapshot()
+            self.assertEqual(stats['GET /v2/status']['count'], 5)
+            self.assertEqual(stats['GET /v2/assets/{}']['count'], 1)
+            self.assertEqual(stats['GET /v2/assets/{}']['errors'], 0)
+
+    def test_errors(self):
+        with FakeAlgod(pools=0, assets=0) as fake:
+            client = self.pooled_client(fake)
+            with self.assertRaisesMessage(error.AlgodHTTPError, 'asset does not exist'):
+                client.asset_info(1)
+            self.assertEqual(fake.request_count('asset'), 1)
+            self.assertEqual(self.metrics.snapshot()['GET /v2/assets/{}']['errors'], 1)
+
+    def test_unavailable_retried(self):
+        with FakeAlgod(pools=0, assets=0) as fake:
+            client = self.pooled_client(fake, retries=2)
+            fake.unavailable = 2
+            self.assertIn('last-round', client.status())
+            self.assertEqual(fake.request_count('status'), 3)
+
+            fake.unavailable = 3
+            with self.assertRaises(error.AlgodHTTPError):
+                client.status()
+
+            # Anything other than a GET may not be safe to repeat, so isn't
+            # retried.
+            fake.reset_counts()
+            fake.unavailable = 1
+            with self.assertRaises(error.AlgodHTTPError):
+                client.algod_request('POST', '/status', data=b'')
+            self.assertEqual(fake.request_count('status'), 1)
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeAlgod(pools=1, assets=1, latency=0.05).start()
+        self.addCleanup(self.fake.stop)
+        self.single_flight = SingleFlight()
+        self.client = PooledAlgodClient('a' * 64, self.fake.address, transport=CoalescingTransport(PooledTransport(backoff=0), self.single_flight))
+
+    def test_concurrent_calls_coalesced(self):
+        barrier = threading.Barrier(10)
+
+        def one():
+            barrier.wait()
+            return self.client.application_info(FIRST_APP_ID)
+
+        threads = [threading.Thread(target=one) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.fake.request_count('application'), 1)
+        stats = self.single_flight.stats()
+        self.assertEqual(stats['upstream'], 1)
+        self.assertEqual(stats['saved'], 9)
+
+    def test_memoized_until_next_round(self):
+        self.client.asset_info(1000)
+        self.client.asset_info(1000)
+        self.assertEqual(self.fake.request_count('asset'), 1)
+        self.assertEqual(self.single_flight.memo_hits, 1)
+
+        # Errors and the status are never remembered.
+        for _ in range(2):
+            self.client.status()
+            with self.assertRaises(error.AlgodHTTPError):
+                self.client.asset_info(1)
+        self.assertEqual(self.fake.request_count('status'), 2)
+        self.assertEqual(self.fake.request_count('asset'), 3)
+
+        self.single_flight.new_round(None)
+        self.client.asset_info(1000)
+        self.assertEqual(self.fake.request_count('asset'), 4)
+
+    def test_shared_with_async_client(self):
+        client = AsyncAlgodClient('a' * 64, self.fake.address, single_flight=self.single_flight)
+
+        async def run():
+            return await asyncio.gather(*[client.account_info(DEPLOYER) for _ in range(10)])
+
+        accounts = asyncio.run(run())
+        self.assertEqual(accounts[0], accounts[9])
+        self.assertEqual(self.fake.request_count('account'), 1)
+        self.assertEqual(self.single_flight.coalesced, 9)
+
+    def test_opt_in_seen_within_round(self):
+        address = 'B' * 58
+        self.assertIsNone(decode_position(self.client.account_info(address), FIRST_APP_ID))
+        self.fake.opt_in(address, FIRST_APP_ID, staked=500)
+        self.assertEqual(decode_position(self.client.account_info(address), FIRST_APP_ID).amount_staked, 500)
+        self.assertEqual(self.single_flight.memo_hits, 0)
+
+    def test_only_upstream_calls_counted(self):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        self.addCleanup(current_timings.reset, token)
+        for _ in range(3):
+            self.client.asset_info(1000)
+        self.assertEqual(self.single_flight.memo_hits, 2)
+        self.assertEqual(timings.algod_calls, {'GET /v2/assets/{}': 1})
+        self.assertEqual(timings.phases['algod'][1], 3)
+
+class InstrumentationTests(SimpleTestCase):
+    def test_algod_calls_timed(self):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        self.addCleanup(current_timings.reset, token)
+        with FakeAlgod(pools=0, assets=1) as fake:
+            client = PooledAlgodClient('a' * 64, fake.address)
+            client.status()
+            client.status()
+            asyncio.run(AsyncAlgodClient('a' * 64, fake.address).asset_info(1000))
+
+        self.assertEqual(timings.algod_calls, {'GET /v2/status': 2, 'GET /v2/assets/{}': 1})
+        self.assertEqual(timings.phases['algod'][1], 3)
+        self.assertRegex(timings.header(0.5), r'^algod;dur=[\d.]+;desc="3 calls", total;dur=500.0$')
+
+    def test_server_timing_and_metrics(self):
+        request_metrics.reset()
+        response = self.client.get('/api/programs')
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertIn('staking_request_duration_seconds_count{endpoint="api_programs"} 1', metrics)
+        self.assertIn('staking_request_duration_seconds_bucket{endpoint="api_programs",le="+Inf"} 1', metrics)
+
+# The pages link to the static files without their hashes, since the tests
+# don't run collectstatic.
+UNHASHED_STATIC = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+@override_settings(STORAGES=UNHASHED_STATIC)
+class PageCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = PageCache()
+        self.pool = Pool(app_id=FIRST_APP_ID, begin_timestamp=0, end_timestamp=2000, total_staked=5, fixed_rate=100, changed=10)
+        self.account = Account(address=DEPLOYER, changed=20)
+
+    def page(self, now, staked):
+        key = page_key(self.pool, self.account, now)
+        html = self.cache.get(key)
+        if html is None:
+            position = Position(app_id=FIRST_APP_ID, amount_staked=staked, amount_rewarded=0, last_updated=0)
+            assets = [{'params': {'unit-name': 'A', 'decimals': 0}} for _ in range(2)]
+            details = pool_details(self.pool.state(), position, *assets)
+            html = self.cache.render(key, {'pool_id': FIRST_APP_ID, 'pool_details': details}, None)
+        return html
+
+    def test_pages_and_fragments(self):
+        html = self.page(1000, staked=7)
+        self.assertIn('id="amount_staked" value="7"', html)
+        self.assertIn('id="last_updated"', html)
+        self.assertNotIn('<!-- position -->', html)
+        self.assertEqual(self.page(1000, staked=8), html)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        # The account's position changing only renders it again.
+        self.account.changed = 21
+        self.assertIn('id="amount_staked" value="8"', self.page(1000, staked=8))
+        self.assertEqual((self.cache.fragment_hits, self.cache.fragment_misses), (1, 3))
+
+    def test_ended_pools_kept(self):
+        self.assertIn('Withdraw All</a>', self.page(3000, staked=7))
+        self.cache.fragments.clear()
+        self.cache.pages.clear()
+        self.page(3000, staked=7)
+        self.assertEqual(self.cache.fragment_hits, 1)
+
+        # Until the pool changes.
+        self.pool.changed = 11
+        self.page(3000, staked=7)
+        self.assertEqual((self.cache.fragment_hits, self.cache.fragment_misses), (2, 4))
+        self.assertEqual(len(self.cache.ended), 1)
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(STATIC_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse('view'))
+
+    def get(self, path, **headers):
+        return self.middleware(RequestFactory().get(path, headers=headers))
+
+    def test_hashed_and_compressed(self):
+        url = static('staking/js/main.js')
+        self.assertRegex(url, r'^/static/staking/js/main\.[0-9a-f]{12}\.js$')
+        with open(CONTRACTS_DIR.parent / 'static' / 'staking' / 'js' / 'main.js', 'rb') as f:
+            source = f.read()
+
+        response = self.get(url, accept_encoding='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.content), source)
+        self.assertLess(len(response.content), len(source))
+
+        response = self.get(url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, source)
+
+        # The unhashed name may change, so is checked again soon.
+        response = self.get('/static/staking/js/main.js')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        response = self.get('/static/staking/js/main.js', if_modified_since=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.get('/pool/1').content, b'view')
+
+    def test_head_has_no_body(self):
+        url = static('staking/js/main.js')
+        get = self.get(url, accept_encoding='gzip')
+        head = self.middleware(RequestFactory().head(url, headers={'accept_encoding': 'gzip'}))
+        self.assertEqual(head.content, b'')
+        self.assertEqual(head['Content-Length'], str(len(get.content)))
+        self.assertEqual(head['Content-Encoding'], 'gzip')
+
+    def test_missing_from_manifest(self):
+        with self.assertRaises(ValueError):
+            static('staking/js/missing.js')
+
+class StateMirrorTests(TestCase):
+    def setUp(self):
+        self.fake = FakeAlgod(pools=3, assets=2).start()
+        self.addCleanup(self.fake.stop)
+        self.client = v2client.algod.AlgodClient('a' * 64, self.fake.address)
+        self.clock = ChainClock(self.client)
+        self.clock.sync()
+        self.mirror = StateMirror(self.client, self.clock, DeployerRegistry([DEPLOYER]))
+        self.account = 'B' * 58
+
+    def test_refresh_stores_pools_and_positions(self):
+        self.fake.opt_in(self.account, FIRST_APP_ID, staked=500, rewarded=2 ** 64 - 1)
+        Account.objects.create(address=self.account, round=0)
+        self.mirror.refresh(self.clock.snapshot[0])
+        self.assertEqual(Pool.objects.count(), 3)
+
+        self.fake.reset_counts()
+        rnd = self.clock.snapshot[0]
+        state = self.mirror.pool(FIRST_APP_ID, rnd)
+        position = self.mirror.position(FIRST_APP_ID, self.account, rnd)
+        self.assertEqual(self.fake.request_count(), 0)
+        self.assertEqual(state, decode_pool(self.fake.apps[FIRST_APP_ID]))
+        self.assertEqual(position, Position(app_id=FIRST_APP_ID, amount_staked=500, amount_rewarded=2 ** 64 - 1, last_updated=0))
+        self.assertIsNone(self.mirror.position(FIRST_APP_ID + 1, self.account, rnd))
+
+        # Leaving the pool removes the position.
+        self.fake.accounts[self.account]['apps-local-state'] = []
+        self.mirror.refresh(self.clock.snapshot[0])
+        self.assertFalse(PositionRow.objects.exists())
+
+    def test_missing_or_stale_rows_fetched(self):
+        self.fake.opt_in(self.account, FIRST_APP_ID, staked=500)
+        self.fake.reset_counts()
+        rnd = self.clock.snapshot[0]
+        self.mirror.pool(FIRST_APP_ID, rnd)
+        position = self.mirror.position(FIRST_APP_ID, self.account, rnd)
+        self.assertEqual(position.amount_staked, 500)
+        self.assertEqual(self.fake.request_count('application'), 1)
+        self.assertEqual(self.fake.request_count('account'), 1)
+
+        self.mirror.pool(FIRST_APP_ID, rnd + 2)
+        self.mirror.position(FIRST_APP_ID, self.account, rnd + 2)
+        self.assertEqual(self.fake.request_count(), 2)
+
+        # Fall too far behind, and the node is asked again.
+        self.mirror.pool(FIRST_APP_ID, rnd + 3)
+        self.assertEqual(self.fake.request_count('application'), 2)
+
+    def test_pools_of_every_deployer(self):
+        other = 'C' * 58
+        app = self.fake.accounts[DEPLOYER]['created-apps'].pop()
+        app['params']['creator'] = other
+        self.fake.accounts[other] = {'address': other, 'created-apps': [app]}
+        rnd = self.clock.snapshot[0]
+        self.assertEqual(self.mirror.pools(rnd).count(), 2)
+        self.assertTrue(self.mirror.deployers.add(other))
+        self.assertEqual(self.mirror.pools(rnd).count(), 3)
+
+        # Once seen, the pools are left to the follower.
+        self.fake.reset_counts()
+        self.mirror.pools(rnd + 10)
+        self.assertEqual(self.fake.request_count(), 0)
+
+        # Unless they're shown, when any stale ones are brought up to date.
+        rows = self.mirror.fresh_rows(self.mirror.pools(rnd + 10).order_by('app_id')[:2], rnd + 10)
+        self.assertEqual([row.round for row in rows], [rnd + 10] * 2)
+        self.assertEqual(self.fake.request_count('application'), 2)
+
+class PoolAPITests(TestCase):
+    def setUp(self):
+        self.fake = FakeAlgod(pools=3, assets=2).start()
+        self.addCleanup(self.fake.stop)
+        client = v2client.algod.AlgodClient('a' * 64, self.fake.address)
+        self.clock = ChainClock(client)
+        self.snapshot = self.clock.sync()
+        self.clock.thread = threading.Thread()
+        self.mirror = StateMirror(client, self.clock, DeployerRegistry([DEPLOYER]))
+        for module in (api, views):
+            for name, value in (('state_mirror', self.mirror), ('chain_clock', self.clock)):
+                patcher = mock.patch.object(module, name, value)
+                patcher.start()
+                self.addCleanup(patcher.stop)
+
+    def test_unchanged_pool_not_modified(self):
+        response = self.client.get('/api/pools/{}'.format(FIRST_APP_ID))
+        self.assertEqual(response.json()['total_staked'], 1_000_000)
+        etag = response['ETag']
+
+        self.fake.reset_counts()
+        response = self.client.get('/api/pools/{}'.format(FIRST_APP_ID), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.fake.request_count(), 0)
+
+        # A later round which changes nothing keeps the same ETag.
+        self.mirror.store_pools([self.fake.apps[FIRST_APP_ID]], self.snapshot[0] + 1)
+        self.assertEqual(self.client.get('/api/pools/{}'.format(FIRST_APP_ID), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.fake.apps[FIRST_APP_ID]['params']['global-state'][5] = state_entry('TS', 12345)
+        self.mirror.store_pools([self.fake.apps[FIRST_APP_ID]], self.snapshot[0] + 2)
+        response = self.client.get('/api/pools/{}'.format(FIRST_APP_ID), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['total_staked'], response.json()['changed']), (12345, self.snapshot[0] + 2))
+
+    def test_init_pools_rejects_bad_pools(self):
+        def init_pools(data):
+            return self.client.post('/init_pools', json.dumps(data), content_type='application/json')
+
+        response = init_pools({'pools': [{'pool_id': FIRST_APP_ID, 'fixed-rate': 5}]})
+        self.assertEqual(response.status_code, 400)
+        response = init_pools({'sender': DEPLOYER, 'pools': [{'pool_id': FIRST_APP_ID, 'fixed-rate': 5}, {'pool_id': 1, 'fixed-rate': 5}]})
+        self.assertEqual((response.status_code, response.json()['message']), (404, "Unknown pool 1."))
+        response = init_pools({'sender': DEPLOYER, 'pools': [{'pool_id': 'x', 'fixed-rate': 5}]})
+        self.assertEqual((response.status_code, response.json()['message']), (400, 'Invalid pool "x".'))
+
+    def test_pools_and_positions(self):
+        response = self.client.get('/api/pools')
+        self.assertEqual([pool['app_id'] for pool in response.json()['pools']], [FIRST_APP_ID, FIRST_APP_ID + 1, FIRST_APP_ID + 2])
+        self.assertEqual(self.client.get('/api/pools', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        url = '/api/pools/{}/accounts/{}'.format(FIRST_APP_ID, DEPLOYER)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+        # Opting in changes the ETag, even though the pool hasn't changed.
+        self.fake.opt_in(DEPLOYER, FIRST_APP_ID, staked=500)
+        self.mirror.store_account(self.fake.accounts[DEPLOYER], self.snapshot[0] + 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.json(), {
+            'pool_id': FIRST_APP_ID,
+            'account': DEPLOYER,
+            'amount_staked': 500,
+            'amount_rewarded': 0,
+            'last_updated': 0,
+        })
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_unknown_pools_and_accounts(self):
+        missing = FIRST_APP_ID + 10
+        for url in ('/api/pools/{}'.format(missing), '/api/pools/{}/accounts/{}'.format(missing, DEPLOYER), '/api/pools/{}/accounts/nonsense-address'.format(FIRST_APP_ID)):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 404)
+            self.assertFalse(response.has_header('ETag'))
+
+        self.client.cookies['account'] = DEPLOYER
+        self.assertEqual(self.client.get('/pool/{}'.format(missing)).status_code, 404)
+        self.assertEqual(self.client.get('/{}/stream'.format(missing)).status_code, 404)
+
+        url = '/{}/rewards/{}'
+        self.assertEqual(self.client.get(url.format(missing, DEPLOYER)).json()['message'], "Unknown pool.")
+        self.assertEqual(self.client.get(url.format(FIRST_APP_ID, 'nonsense-address')).status_code, 404)
+        self.fake.opt_in(DEPLOYER, FIRST_APP_ID + 2, staked=2 ** 64 - 1)
+        self.assertEqual(self.client.get(url.format(FIRST_APP_ID + 2, DEPLOYER)).status_code, 422)
+        self.fake.opt_in(DEPLOYER, FIRST_APP_ID + 2, staked=500)
+        self.mirror.store_account(self.fake.accounts[DEPLOYER], self.snapshot[0] + 1)
+        self.assertEqual(self.client.get(url.format(FIRST_APP_ID + 2, DEPLOYER)).json()['amount_staked'], 500)
+
+        # A pool which has been deleted since it was stored is forgotten.
+        self.mirror.pool_row(FIRST_APP_ID, self.snapshot[0])
+        del self.fake.apps[FIRST_APP_ID]
+        self.assertIsNone(self.mirror.pool_row(FIRST_APP_ID, self.snapshot[0] + 10))
+        self.assertFalse(Pool.objects.filter(app_id=FIRST_APP_ID).exists())
+
+BLOCKS_PATH = Path(__file__).resolve().parent / 'testdata' / 'blocks.json'
+
+# Replays recorded blocks (see the record_blocks command), as the algod node
+# would return them.
+class RecordedBlocks:
+    def __init__(self, path=BLOCKS_PATH):
+        with open(path) as f:
+            self.blocks = {int(rnd): base64.b64decode(block) for rnd, block in json.load(f).items()}
+        self.fetched = []
+
+    def block_info(self, rnd, response_format='json'):
+        self.fetched.append(rnd)
+        return self.blocks[rnd]
+
+class BlockFollowerTests(TestCase):
+    # The accounts making calls in the recorded blocks.
+    BOB = encoding.encode_address(bytes(range(32)))
+    CAROL = encoding.encode_address(bytes(range(32, 64)))
+
+    def setUp(self):
+        self.client = RecordedBlocks()
+        self.clock = ChainClock(self.client)
+        self.mirror = StateMirror(self.client, self.clock, DeployerRegistry([DEPLOYER]))
+        Checkpoint.objects.create(name='blocks', round=1000)
+        Account.objects.create(address=self.BOB, round=1000)
+
+    def follower(self):
+        return BlockFollower(self.client, self.clock, self.mirror)
+
+    def test_applies_state_deltas(self):
+        self.follower().catch_up(1003)
+        self.assertEqual(list(Pool.objects.values_list('app_id', flat=True)), [6000])
+        self.assertEqual(Pool.objects.get().state(), PoolState(
+            app_id=6000,
+            admin=encoding.decode_address(DEPLOYER),
+            initialised=1,
+            staked_asset=1000,
+            reward_asset=1001,
+            begin_timestamp=1700000000,
+            end_timestamp=1700086400,
+            fixed_rate=1000,
+            total_staked=600,
+            total_rewards=2 ** 64 - 1,
+            last_updated=1700000010,
+        ))
+        self.assertEqual(self.mirror.position(6000, self.BOB, 1003), Position(app_id=6000, amount_staked=500, amount_rewarded=0, last_updated=1700000010))
+
+        # Carol's local state isn't followed, since we don't have the rest of it.
+        self.assertEqual(list(PositionRow.objects.values_list('account_id', flat=True)), [self.BOB])
+        self.assertEqual(Account.objects.get().round, 1003)
+
+        # Updated by another account's call, then closed out.
+        self.follower().catch_up(1005)
+        self.assertEqual(PositionRow.objects.get().amount_rewarded, 40)
+        self.follower().catch_up(1006)
+        self.assertFalse(PositionRow.objects.exists())
+        self.assertEqual(Pool.objects.get().total_staked, 100)
+        self.assertEqual((Pool.objects.get().changed, Account.objects.get().changed), (1006, 1006))
+        self.assertEqual(Checkpoint.objects.get().round, 1006)
+
+    def test_resumes_from_checkpoint(self):
+        self.follower().catch_up(1002)
+        self.follower().catch_up(1004)
+        self.assertEqual(self.client.fetched, [1001, 1002, 1003, 1004])
+
+    def test_refetched_outside_transaction(self):
+        depths = []
+        with FakeAlgod(pools=2, assets=1) as fake:
+            client = v2client.algod.AlgodClient('a' * 64, fake.address)
+            algod_request = client.algod_request
+            def recording(*args, **kwargs):
+                depths.append(len(connection.atomic_blocks))
+                return algod_request(*args, **kwargs)
+            client.algod_request = recording
+
+            mirror = StateMirror(client, self.clock, DeployerRegistry([DEPLOYER]))
+            outer = len(connection.atomic_blocks)
+            BlockFollower(client, self.clock, mirror).catch_up(3000)
+
+        self.assertEqual(Pool.objects.count(), 2)
+        self.assertEqual(Checkpoint.objects.get().round, 3000)
+        self.assertEqual(depths, [outer, outer])
+
+    def test_newer_rows_left_alone(self):
+        Pool.objects.create(app_id=6000, creator=DEPLOYER, total_staked=123, round=1005)
+        self.follower().catch_up(1003)
+        self.assertEqual(Pool.objects.get().total_staked, 123)
+        self.assertEqual(Pool.objects.get().round, 1005)
+
+# calculate_rewards from contracts.py, transcribed an expression at a time
+# with the AVM's uint64 opcodes, as the reference for the reward engine.
+# Returns the updated AR and TR.
+def avm_calculate_rewards(globals, local, latest_timestamp):
+    def op(value):
+        if not 0 <= value <= UINT64_MAX:
+            raise OverflowError()
+        return value
+
+    if latest_timestamp < globals['BT']:
+        return local['AR'], globals['TR']
+    if local['LU'] > globals['ET']:
+        return local['AR'], globals['TR']
+    end = globals['ET'] if latest_timestamp > globals['ET'] else latest_timestamp
+    start = globals['BT'] if local['LU'] < globals['BT'] else local['LU']
+    duration = op(end - start)
+    rewards = op(op(op(local['AS'] * duration) // 31557600) * globals['FR']) // 10000
+    if globals['TR'] >= rewards:
+        return op(local['AR'] + rewards), op(globals['TR'] - rewards)
+    return op(local['AR'] + globals['TR']), 0
+
+# Set REWARD_CASES in the environment to try more (or fewer) random inputs.
+# The default keeps the suite quick, see the README for the full check.
+REWARD_CASES = int(os.environ.get('REWARD_CASES', 20000))
+
+class RewardTests(SimpleTestCase):
+    def check(self, values):
+        state = PoolState(begin_timestamp=values['BT'], end_timestamp=values['ET'], fixed_rate=values['FR'], total_rewards=values['TR'])
+        position = Position(amount_staked=values['AS'], amount_rewarded=values['AR'], last_updated=values['LU'])
+        globals = {key: values[key] for key in ('BT', 'ET', 'FR', 'TR')}
+        local = {key: values[key] for key in ('AS', 'AR', 'LU')}
+        try:
+            expected = avm_calculate_rewards(globals, local, values['now'])
+        except OverflowError:
+            with self.assertRaises(OverflowError, msg=values):
+                accrued_rewards(state, position, values['now'])
+            return
+        rewards = calculate_rewards(state, position, values['now'])
+        self.assertEqual((accrued_rewards(state, position, values['now']), values['TR'] - rewards), expected, values)
+
+    def test_examples(self):
+        year = 31557600
+        base = {'BT': 1000, 'ET': 1000 + year, 'FR': 1000, 'TR': 10 ** 12, 'AS': 10 ** 6, 'AR': 5, 'LU': 0}
+        # 10% for a year, with the stake and timestamps clamped to the pool.
+        self.assertEqual(calculate_rewards(PoolState(begin_timestamp=1000, end_timestamp=1000 + year, fixed_rate=1000, total_rewards=10 ** 12), Position(amount_staked=10 ** 6), 10 ** 9), 100000)
+        for now in (0, 999, 1000, 1001, 1000 + year // 2, 1000 + year, 10 ** 9):
+            self.check({**base, 'now': now})
+        # Updated after the end, out of rewards, and overflowing.
+        self.check({**base, 'LU': 1001 + year, 'now': 2000 + year})
+        self.check({**base, 'TR': 7, 'now': 10 ** 9})
+        self.check({**base, 'AS': UINT64_MAX, 'now': 10 ** 9})
+
+    def test_matches_contract(self):
+        rng = random.Random(1)
+
+        # Mostly realistic values, with a few at the edges of the range.
+        def value(high):
+            choice = rng.random()
+            if choice < 0.05:
+                return rng.choice([0, 1, UINT64_MAX])
+            if choice < 0.15:
+                return rng.randrange(UINT64_MAX + 1)
+            return rng.randrange(high)
+
+        for _ in range(REWARD_CASES):
+            begin = value(2 ** 32)
+            self.check({
+                'BT': begin,
+                'ET': begin + value(10 ** 8) if rng.random() < 0.9 else value(2 ** 32),
+                'FR': value(100000),
+                'TR': value(10 ** 15),
+                'AS': value(10 ** 15),
+                'AR': value(10 ** 15),
+                'LU': begin + value(10 ** 8) - 10 ** 7,
+                'now': begin + value(10 ** 8) - 10 ** 7,
+            })
+
+    def test_rewards_details(self):
+        state = PoolState(app_id=5000, begin_timestamp=0, end_timestamp=31557600, fixed_rate=10000, total_rewards=10 ** 6)
+        position = Position(app_id=5000, amount_staked=1000, amount_rewarded=10, last_updated=100)
+        details = rewards_details(state, position, DEPLOYER, 50)
+        self.assertEqual(details['timestamp'], 100)
+        self.assertEqual(details['accrued'], 10)
+        details = rewards_details(state, position, DEPLOYER, 100 + 31557600 // 3)
+        self.assertEqual((details['rewards'], details['accrued'], details['total_rewards']), (333, 343, 10 ** 6 - 333))
+
+        # The contract would fail, rather than pay out.
+        position = Position(app_id=5000, amount_staked=UINT64_MAX, amount_rewarded=0, last_updated=0)
+        self.assertIsNone(rewards_details(state, position, DEPLOYER, 31557600))
+
+@unittest.skipUnless(np is not None, 'NumPy is not installed (pip install numpy).')
+class ProjectionTests(TestCase):
+    def setUp(self):
+        rng = random.Random(2)
+        self.state = PoolState(begin_timestamp=10 ** 6, end_timestamp=10 ** 6 + 31557600, fixed_rate=1500, total_rewards=10 ** 9)
+        self.positions = [
+            Position(amount_staked=rng.choice([0, rng.randrange(10 ** 10), rng.randrange(2 ** 64)]), amount_rewarded=rng.randrange(10 ** 6), last_updated=rng.randrange(2 * 10 ** 6))
+            for _ in range(500)
+        ]
+        self.arrays = [np.array([getattr(p, field) for p in self.positions], dtype=np.uint64) for field in ('amount_staked', 'amount_rewarded', 'last_updated')]
+
+    # The scalar engine's answer for a position, with None if it would fail.
+    def expected(self, position, timestamp):
+        try:
+            return accrued_rewards(self.state, position, timestamp)
+        except OverflowError:
+            return None
+
+    def test_matches_reward_engine(self):
+        amount_staked, amount_rewarded, last_updated = self.arrays
+        grid = [0, 10 ** 6, 2 * 10 ** 6, 10 ** 7, 10 ** 8]
+        accrued, failed = projection.project_rewards(self.state, amount_staked, amount_rewarded, last_updated, grid)
+        self.assertEqual(accrued.shape, (500, 5))
+        self.assertTrue(failed.any())
+        for i, position in enumerate(self.positions):
+            for j, timestamp in enumerate(grid):
+                expected = self.expected(position, timestamp)
+                self.assertEqual(None if failed[i, j] else int(accrued[i, j]), expected)
+
+    def test_withdraw_all_and_depletion(self):
+        state = PoolState(begin_timestamp=0, end_timestamp=31557600, fixed_rate=10000, total_rewards=2500)
+        amount_staked = np.array([1000, 2000, 3000], dtype=np.uint64)
+        last_updated = np.zeros(3, dtype=np.uint64)
+
+        # A full year pays out 6000, so the pool runs out partway through the second position.
+        paid, failed = projection.withdraw_all(state, amount_staked, last_updated, 31557600)
+        self.assertEqual(paid.tolist(), [1000, 1500, 0])
+
+        depleted = projection.depletion_time(state, amount_staked, last_updated, 0)
+        owed = lambda at: sum(calculate_rewards(PoolState(begin_timestamp=0, end_timestamp=31557600, fixed_rate=10000, total_rewards=UINT64_MAX), Position(amount_staked=int(a)), at) for a in amount_staked)
+        self.assertGreater(owed(depleted), 2500)
+        self.assertLessEqual(owed(depleted - 1), 2500)
+        self.assertIsNone(projection.depletion_time(PoolState(begin_timestamp=0, end_timestamp=31557600, fixed_rate=10000, total_rewards=6000), amount_staked, last_updated, 0))
+
+    def test_pool_positions(self):
+        Pool.objects.create(app_id=5000, creator=DEPLOYER, round=1)
+        account = Account.objects.create(address=DEPLOYER, round=1)
+        PositionRow.objects.create(pool_id=5000, account=account, amount_staked=UINT64_MAX, amount_rewarded=None, last_updated=7)
+        amount_staked, amount_rewarded, last_updated = projection.pool_positions(5000)
+        self.assertEqual((amount_staked.tolist(), amount_rewarded.tolist(), last_updated.tolist()), ([UINT64_MAX], [0], [7]))
+        self.assertEqual(len(projection.pool_positions(5001)[0]), 0)
+
+class RewardStreamTests(TestCase):
+    def setUp(self):
+        self.fake = FakeAlgod(pools=3, assets=2, round_time=60).start()
+        self.addCleanup(self.fake.stop)
+        client = v2client.algod.AlgodClient('a' * 64, self.fake.address)
+        self.clock = ChainClock(client)
+        self.snapshot = self.clock.sync()
+        # Stop the clock from starting its background thread.
+        self.clock.thread = threading.Thread()
+
+        # The third pool is the one that's live.
+        self.pool_id = FIRST_APP_ID + 2
+        self.mirror = StateMirror(client, self.clock, DeployerRegistry([DEPLOYER]))
+        self.fake.opt_in(DEPLOYER, self.pool_id, staked=1_000_000, rewarded=5_000_000, last_updated=self.fake.timestamp)
+        self.mirror.pool(self.pool_id, self.snapshot[0])
+        self.mirror.position(self.pool_id, DEPLOYER, self.snapshot[0])
+        self.stream = RewardStream(client, self.clock, self.mirror, heartbeat=0.01)
+
+    def test_one_update_per_round_for_every_watcher(self):
+        first, second = self.stream.events(self.pool_id, DEPLOYER), self.stream.events(self.pool_id, DEPLOYER)
+        event = json.loads(next(first)[len('data: '):])
+        next(second)
+        self.assertEqual((event['user_staked'], event['user_rewards_raw'], event['ended']), (1.0, 5_000_000, False))
+
+        # Nothing new yet.
+        self.assertEqual(next(first), ': keep-alive\n\n')
+
+        self.fake.accounts[DEPLOYER]['apps-local-state'][0]['key-value'][1] = state_entry('AR', 7_000_000)
+        self.mirror.store_account(self.fake.accounts[DEPLOYER], self.snapshot[0])
+        self.stream.publish((self.snapshot[0] + 1,) + self.snapshot[1:])
+        self.assertEqual(json.loads(next(first)[len('data: '):])['user_rewards'], 7.0)
+        self.assertEqual(json.loads(next(second)[len('data: '):])['user_rewards'], 7.0)
+        self.assertEqual(self.stream.updates, 2)
+        self.assertEqual(self.stream.deliveries, 4)
+
+        first.close()
+        second.close()
+        self.assertEqual((self.stream.subscribers, self.stream.latest), ({}, {}))
+
+    def test_ends_with_the_pool(self):
+        Pool.objects.update(end_timestamp=self.fake.timestamp - 1)
+        events = list(self.stream.events(self.pool_id, DEPLOYER))
+        self.assertEqual(len(events), 1)
+        self.assertTrue(json.loads(events[0][len('data: '):])['ended'])
+
+    def test_closes_once_its_lifetime_is_up(self):
+        self.stream.lifetime = 0.05
+        events = list(self.stream.events(self.pool_id, DEPLOYER))
+        self.assertFalse(json.loads(events[0][len('data: '):])['ended'])
+        self.assertEqual(set(events[1:]), {': keep-alive\n\n'})
+        self.assertEqual((self.stream.subscribers, self.stream.latest), ({}, {}))
+
+class SubmissionQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeAlgod(pools=0, assets=0, round_time=60).start()
+        self.addCleanup(self.fake.stop)
+        client = v2client.algod.AlgodClient('a' * 64, self.fake.address)
+        self.clock = ChainClock(client)
+        self.clock.thread = threading.Thread()
+        self.queue = SubmissionQueue(client, self.clock, heartbeat=0.01)
+        self.key, self.address = account.generate_account()
+
+    def group(self, note):
+        sp = transaction.SuggestedParams(1000, self.fake.current_round(), self.fake.current_round() + 10, 'SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=', 'sandnet-v1', flat_fee=True)
+        return [transaction.PaymentTxn(self.address, sp, self.address, 0, note=note).sign(self.key)]
+
+    def sweep(self):
+        self.queue.sweep(self.clock.sync())
+
+    def test_one_sweep_per_round_for_every_group(self):
+        groups = [self.group(bytes([i])) for i in range(10)]
+        txids = [self.queue.send(group) for group in groups]
+        self.assertEqual(txids, [group[0].transaction.get_txid() for group in groups])
+        events = self.queue.events(txids[0])
+        self.assertEqual(json.loads(next(events)[len('data: '):])['status'], 'pending')
+
+        # Still in the pool, so nothing is looked up.
+        self.sweep()
+        self.assertEqual((self.queue.sweeps, self.queue.lookups), (1, 0))
+
+        self.fake.advance()
+        self.sweep()
+        self.assertEqual((self.queue.sweeps, self.queue.lookups), (2, 10))
+        self.assertEqual(self.fake.request_count('pending_transactions'), 2)
+        self.assertEqual(json.loads(next(events)[len('data: '):])['status'], 'confirmed')
+        self.assertEqual(self.queue.status(txids[1])['confirmed-round'], self.fake.transactions[txids[1]][1] + 1)
+
+        # Nothing left to wait for.
+        self.sweep()
+        self.assertEqual(self.queue.sweeps, 2)
+
+    def test_failed_and_expired(self):
+        rejected = self.queue.send(self.group(b'rejected'))
+        self.fake.rejected.add(rejected)
+        unknown = self.queue.track(self.group(b'never sent'))
+        self.sweep()
+        self.assertEqual(self.queue.status(rejected)['status'], 'failed')
+        self.assertEqual(self.queue.status(unknown)['status'], 'expired')
+
+
+    def test_oldest_finished_evicted_around_pending(self):
+        self.queue.max_finished = 2
+        waiting = self.queue.track(self.group(b'waiting'))
+        txids = [self.queue.track(self.group(bytes([i]))) for i in range(3)]
+        for txid in txids:
+            self.queue.finish(txid, {'txid': txid, 'status': 'confirmed'})
+        self.assertIsNone(self.queue.status(txids[0]))
+        self.assertEqual([self.queue.status(txid)['status'] for txid in [waiting] + txids[1:]], ['pending', 'confirmed', 'confirmed'])
@@ -0,0 +1,64 @@
+import contextlib
+import contextvars
+import threading
+import time
+
+# Where each request spends its time. The middleware gives every request a
+# RequestTimings, and the slow parts of handling one (requests to the algod
+# node, loading the ABI, msgpack encoding and rendering templates) add how
+# long they took to it with timed(). Anything timed outside of a request, like
+# the chain clock's background thread, isn't recorded.
+#
+# At the end of the request the breakdown is sent back in a Server-Timing
+# header, so it shows up in the browser's developer tools, and added to the
+# totals for its URL which /metrics exports for Prometheus (see
+# instrumentation.py).
+#
+# Phases may overlap (e.g. the async views make algod requests at the same
+# time), so they won't always add up to the total.
+
+class RequestTimings:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Seconds and number of calls, by phase.
+        self.phases = {}
+        # Number of requests to the algod node, by its endpoint.
+        self.algod_calls = {}
+
+    def record(self, phase, seconds):
+        with self.lock:
+            total, count = self.phases.get(phase, (0.0, 0))
+            self.phases[phase] = (total + seconds, count + 1)
+
+    def algod_call(self, endpoint):
+        with self.lock:
+            self.algod_calls[endpoint] = self.algod_calls.get(endpoint, 0) + 1
+
+    # The Server-Timing header value, with the total time of the request.
+    def header(self, total):
+        with self.lock:
+            parts = ['{};dur={:.1f};desc="{} calls"'.format(phase, seconds * 1000, count) for phase, (seconds, count) in self.phases.items()]
+        parts.append('total;dur={:.1f}'.format(total * 1000))
+        return ', '.join(parts)
+
+# The timings of the request being handled. The async views copy the context
+# into any threads they use, so those are recorded against the request too.
+current_timings = contextvars.ContextVar('staking_request_timings', default=None)
+
+@contextlib.contextmanager
+def timed(phase):
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.record(phase, time.perf_counter() - start)
+
+# Count a request to the algod node against the request being handled.
+def count_algod_call(endpoint):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.algod_call(endpoint)
@@ -0,0 +1,321 @@
+from algosdk import constants, encoding, logic
+from algosdk.atomic_transaction_composer import AccountTransactionSigner, AtomicTransactionComposer, TransactionWithSigner
+from algosdk.abi import Method
+from algosdk.future import transaction
+
+from .contract import contract_registry
+from .timing import timed
+
+import base64
+import dateutil.parser
+import msgpack
+
+# Construction of the unsigned transaction groups handed to the frontend. The
+# views fetch whatever they need from the algod node and pass it in here, so
+# the same builders are shared by the sync and async views.
+
+# The value below is the maximum value that can be stored in a uint64.
+# 2^64 - 1
+# This value tells the smart contract to withdraw the maximum available for
+# the user. Including any newly calculated rewards since the transaction
+# was signed.
+ALL_AVAILABLE = 18446744073709551615
+
+# A simple helper function to get the ABI method of the staking contract from
+# the name. The contract is loaded once by the registry, not on every request.
+def get_method(name: str) -> Method:
+    return contract_registry.method(name)
+
+# Encode every transaction in the group, ready to be signed by the frontend.
+def encode_group(atc):
+    txgroup = []
+    with timed('msgpack'):
+        for tx in atc.build_group():
+            txgroup.append({'txn': encoding.msgpack_encode(tx.txn)})
+    return txgroup
+
+# Create a new ASA.
+def asset_create_group(data, sp):
+    sp.flat_fee = True
+    sp.fee = constants.MIN_TXN_FEE
+
+    # Created a transaction without the use of the ATC here since it's so
+    # straight forward and requires no application calls.
+    acfg_txn = transaction.AssetCreateTxn(
+        data['sender'],
+        sp,
+        data['total'],
+        data['decimals'],
+        False,
+        asset_name=data['name'],
+        unit_name=data['unit_name'],
+    )
+
+    txgroup = []
+    with timed('msgpack'):
+        txgroup.append({'txn': encoding.msgpack_encode(acfg_txn)})
+    return txgroup
+
+# The first step of deploying a pool, creating the application from the
+# compiled programs (see programs.py).
+def deploy_group(data, sp, approval, clear):
+    sp.flat_fee = True
+    sp.fee = constants.MIN_TXN_FEE
+
+    # We create a blank signer, since we intend to use the ATC purely to help
+    # construct the transaction group. The signer will be external to this
+    # process, such as AlgoSigner that's an extension on the users browser.
+    atc = AtomicTransactionComposer()
+    signer = AccountTransactionSigner('')
+
+    # Add the 'deploy' method call. Used when deploying the staking smart
+    # contract for the first time.
+    atc.add_method_call(
+        0,
+        get_method('deploy'),
+        data['sender'],
+        sp,
+        signer,
+        method_args=[
+            int(data['staking']),
+            int(data['reward']),
+            int(dateutil.parser.parse(data['begin']).timestamp()),
+            int(dateutil.parser.parse(data['end']).timestamp()),
+        ],
+        local_schema=transaction.StateSchema(3, 0),
+        global_schema=transaction.StateSchema(10, 1),
+        approval_program=approval.bytecode,
+        clear_program=clear.bytecode,
+    )
+
+    return encode_group(atc)
+
+# The second step of deploying a pool is initialising it. The involves sending
+# the minimum balance requirement (Algo). We also combine the final step of
+# configuring the fixed rate of reward and funding the staking contract, since
+# they can be grouped together.
+def init_group(data, sp, state, reward_asset_info):
+    sp.flat_fee = True
+    sp.fee = constants.MIN_TXN_FEE
+
+    # Calculate the new smart contract address, and use the values from the
+    # application's state.
+    pool_addr = logic.get_application_address(data['pool_id'])
+    staking_asset = state.staked_asset
+    reward_asset = state.reward_asset
+
+    # We create a blank signer, since we intend to use the ATC purely to help
+    # construct the transaction group. The signer will be external to this
+    # process, such as AlgoSigner that's an extension on the users browser.
+    atc = AtomicTransactionComposer()
+    signer = AccountTransactionSigner('')
+
+    # Construct the Payment transaction, for 0.302 Algo, the minimum balance
+    # for the smart contract account.
+    # We create a TransactionWithSigner object although we have a blank signer,
+    # as that's what the ATC expects.
+    pay_txn = transaction.PaymentTxn(data['sender'], sp, pool_addr, 302000)
+    pay_tws = TransactionWithSigner(pay_txn, signer)
+
+    # Add the 'init' method call. This expects the payment transaction, along
+    # with the two assets which it will optin to.
+    atc.add_method_call(
+        data['pool_id'],
+        get_method('init'),
+        data['sender'],
+        sp,
+        signer,
+        method_args=[
+            pay_tws,
+            staking_asset,
+            reward_asset,
+        ],
+    )
+
+    # We're also going to include another method call 'reward', which sets the
+    # fixed rate of return and also expects an asset transfer transacation.
+    # For this demo we will also send the full amount of reward assets to the
+    # staking pool.
+    all_rewards = reward_asset_info['params']['total']
+
+    # Convert the decimal percentage value to basis points.
+    fixed_rate = int(data['fixed-rate'] * 100)
+
+    # Construct the asset transfer transaction, to send the full amount of
+    # reward asset into the staking pool.
+    axfer_txn = transaction.AssetTransferTxn(data['sender'], sp, pool_addr, all_rewards, reward_asset)
+    axfer_tws = TransactionWithSigner(axfer_txn, signer)
+
+    # Add the 'reward' method call. This expects the asset transfer
+    # transaction, along with the fixed rate of return, and the reward asset.
+    atc.add_method_call(
+        data['pool_id'],
+        get_method('reward'),
+        data['sender'],
+        sp,
+        signer,
+        method_args=[
+            axfer_tws,
+            fixed_rate,
+            reward_asset,
+        ],
+    )
+
+    return encode_group(atc)
+
+# Deposit the staking asset into the pool, opting in to the pool first if the
+# user hasn't already.
+def deposit_group(data, sp, pool_id, state, position):
+    sp.flat_fee = True
+    sp.fee = 1_000
+
+    pool_addr = logic.get_application_address(pool_id)
+
+    # Assume we're going to make an OptIn call transaction unless we find the
+    # user has already opted in.
+    oncomp = transaction.OnComplete.OptInOC
+    if position is not None:
+        oncomp = transaction.OnComplete.NoOpOC
+
+    # Retrieve the reward asset ID for create the asset transfer transaction.
+    reward_asset = state.staked_asset
+
+    # We create a blank signer, since we intend to use the ATC purely to help
+    # construct the transaction group. The signer will be external to this
+    # process, such as AlgoSigner that's an extension on the users browser.
+    atc = AtomicTransactionComposer()
+    signer = AccountTransactionSigner('')
+
+    # Construct the asset transfer transaction, to send the full amount of
+    # reward asset into the staking pool.
+    axfer_txn = transaction.AssetTransferTxn(data['sender'], sp, pool_addr, data['amount'], reward_asset)
+    axfer_tws = TransactionWithSigner(axfer_txn, signer)
+
+    # Add the 'deposit' method call. This expects the asset transfer
+    # transaction, along with the reward asset.
+    atc.add_method_call(
+        pool_id,
+        get_method('deposit'),
+        data['sender'],
+        sp,
+        signer,
+        method_args=[
+            axfer_tws,
+            reward_asset,
+        ],
+        on_complete=oncomp,
+    )
+
+    return encode_group(atc)
+
+# Withdraw some of the staking asset, or everything available of both the
+# staking asset and the reward asset.
+def withdraw_group(data, sp, pool_id, state):
+    sp.flat_fee = True
+    sp.fee = constants.MIN_TXN_FEE * 2
+
+    # Retrieve the staking and reward asset IDs,
+    staking_asset = state.staked_asset
+    reward_asset = state.reward_asset
+
+    # We create a blank signer, since we intend to use the ATC purely to help
+    # construct the transaction group. The signer will be external to this
+    # process, such as AlgoSigner that's an extension on the users browser.
+    atc = AtomicTransactionComposer()
+    signer = AccountTransactionSigner('')
+
+    # Are we withdrawing just the staking asset, or the staking asset and the
+    # reward asset?
+    if (data['all']):
+        # We assume if you're withdrawing both you want the maximum available
+        # of both assets.
+        amount_staked = ALL_AVAILABLE
+        amount_rewarded = ALL_AVAILABLE
+
+        # Add 'withdraw' method call for the staking asset.
+        atc.add_method_call(
+            pool_id,
+            get_method('withdraw'),
+            data['sender'],
+            sp,
+            signer,
+            method_args=[
+                staking_asset,
+                amount_staked,
+                data['sender'],
+            ],
+        )
+
+        # Add 'withdraw' method call for the reward asset.
+        atc.add_method_call(
+            pool_id,
+            get_method('withdraw'),
+            data['sender'],
+            sp,
+            signer,
+            method_args=[
+                reward_asset,
+                amount_rewarded,
+                data['sender'],
+            ],
+        )
+    else:
+        # Add 'withdraw' method call for the staking asset.
+        atc.add_method_call(
+            pool_id,
+            get_method('withdraw'),
+            data['sender'],
+            sp,
+            signer,
+            method_args=[
+                staking_asset,
+                data['amount'],
+                data['sender'],
+            ],
+        )
+
+    return encode_group(atc)
+
+# Claim everything available of the reward asset.
+def claim_group(data, sp, pool_id, state):
+    sp.flat_fee = True
+    sp.fee = constants.MIN_TXN_FEE * 2
+
+    reward_asset = state.reward_asset
+
+    # We create a blank signer, since we intend to use the ATC purely to help
+    # construct the transaction group. The signer will be external to this
+    # process, such as AlgoSigner that's an extension on the users browser.
+    atc = AtomicTransactionComposer()
+    signer = AccountTransactionSigner('')
+
+    # Add 'withdraw' method call for the reward asset.
+    atc.add_method_call(
+        pool_id,
+        get_method('withdraw'),
+        data['sender'],
+        sp,
+        signer,
+        method_args=[
+            reward_asset,
+            ALL_AVAILABLE,
+            data['sender'],
+        ],
+    )
+
+    return encode_group(atc)
+
+# The ID of a transaction, from its msgpack decoded form (e.g. the 'txn' of a
+# signed transaction in the node's pending pool). The same as get_txid, which
+# needs a Transaction object.
+def transaction_id(txn):
+    to_sign = constants.txid_prefix + msgpack.packb(txn, use_bin_type=True)
+    return base64.b32encode(encoding.checksum(to_sign)).decode().rstrip('=')
+
+# Decode the signed transactions sent to us by the frontend.
+def decode_signed_group(data):
+    txgroup = []
+    with timed('msgpack'):
+        for stx in data:
+            txgroup.append(encoding.future_msgpack_decode(stx['blob']))
+    return txgroup
@@ -1,17 +1,41 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, instrumentation
 
-urlpatterns = [
-    path('', views.index, name='index'),
-    path('pool/<int:pool_id>', views.pool, name='pool'),
-    path('<int:pool_id>/deposit', views.deposit, name='deposit'),
-    path('<int:pool_id>/withdraw', views.withdraw, name='withdraw'),
-    path('<int:pool_id>/claim', views.claim, name='claim'),
-    path('submit', views.submit, name='submit'),
-    path('new_pool', views.new_pool, name='new_pool'),
-    path('create_pool', views.create_pool, name='create_pool'),
-    path('init_pool', views.init_pool, name='init_pool'),
-    path('new_asset', views.new_asset, name='new_asset'),
-    path('create_asset', views.create_asset, name='create_asset'),
-]
+# The URLs are the same for both the sync and async versions of the views.
+def build_urlpatterns(views):
+    return [
+        path('', views.index, name='index'),
+        path('pool/<int:pool_id>', views.pool, name='pool'),
+        path('<int:pool_id>/deposit', views.deposit, name='deposit'),
+        path('<int:pool_id>/withdraw', views.withdraw, name='withdraw'),
+        path('<int:pool_id>/claim', views.claim, name='claim'),
+        path('<int:pool_id>/rewards/<str:account>', views.rewards, name='rewards'),
+        path('<int:pool_id>/stream', views.stream, name='stream'),
+        path('submit', views.submit, name='submit'),
+        path('transactions/<str:txid>', views.transaction_status, name='transaction_status'),
+        path('transactions/<str:txid>/stream', views.transaction_stream, name='transaction_stream'),
+        path('new_pool', views.new_pool, name='new_pool'),
+        path('create_pool', views.create_pool, name='create_pool'),
+        path('init_pool', views.init_pool, name='init_pool'),
+        path('create_pools', views.create_pools, name='create_pools'),
+        path('init_pools', views.init_pools, name='init_pools'),
+        path('new_asset', views.new_asset, name='new_asset'),
+        path('create_asset', views.create_asset, name='create_asset'),
+        # The JSON API only reads the database, so is the same for both.
+        path('api/pools', api.pools, name='api_pools'),
+        path('api/pools/<int:pool_id>', api.pool, name='api_pool'),
+        path('api/pools/<int:pool_id>/accounts/<str:account>', api.position, name='api_position'),
+        path('api/programs', api.programs, name='api_programs'),
+        path('api/algod', api.algod, name='api_algod'),
+        path('metrics', instrumentation.metrics, name='metrics'),
+    ]
+
+# Under ASGI the async versions of the views are used, see asgi.py.
+if settings.STAKING_ASYNC_VIEWS:
+    from . import async_views as views
+else:
+    from . import views
+
+urlpatterns = build_urlpatterns(views)
@@ -1,172 +1,236 @@
-from django.shortcuts import redirect, render
-from django.http import HttpResponse, JsonResponse
-from django.template import loader
-from django.utils.timezone import localtime, now
-
-from algosdk import constants, encoding, logic, v2client
-from algosdk.atomic_transaction_composer import AccountTransactionSigner, AtomicTransactionComposer, TransactionWithSigner
-from algosdk.abi import Method, Argument, Returns, Contract
-from algosdk.future import transaction
-
-import random
-import base64
+from django.conf import settings
+from django.shortcuts import redirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+
+from .algod import PooledAlgodClient, PooledTransport
+from .assets import asset_cache
+from .chain import ChainClock, SuggestedParamsCache
+from .follower import BlockFollower
+from .groups import group_cache
+from .instrumentation import render_template
+from .mirror import StateMirror
+from .pages import page_cache, page_key
+from .pools import STATUSES, describe_rows, page_pools, row_asset_ids
+from .programs import program_store
+from .registry import DeployerRegistry
+from .rewards import calculate_rewards
+from .singleflight import CoalescingTransport, algod_single_flight
+from .state import decode_position
+from .stream import RewardStream
+from .submissions import SubmissionQueue
+from .transactions import asset_create_group, deploy_group, init_group, deposit_group, withdraw_group, claim_group, decode_signed_group
+
+from urllib.parse import urlencode
+
 import json
-import dateutil.parser
 import datetime
-import time
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Algod Node Connection Details
 algod_token  = 'a' * 64
 algod_addr   = 'http://127.0.0.1:4001'
-algod_client = v2client.algod.AlgodClient(algod_token, algod_addr)
 
-# Who is the deployer of the staking contracts, this demo assumes a single
-# account will be the "author" of the staking pools.
+# Requests to the node are made over a pool of keep-alive connections. These
+# control how many connections may be open at once, how long to wait for a
+# response (in seconds), and how many times to retry failed requests.
+algod_pool_size = 10
+algod_timeout = 10
+algod_retries = 2
+
+algod_client = PooledAlgodClient(algod_token, algod_addr, transport=CoalescingTransport(PooledTransport(
+    pool_size=algod_pool_size,
+    timeout=algod_timeout,
+    retries=algod_retries,
+), algod_single_flight))
+
+# Keeps track of the current time on the blockchain in the background.
+chain_clock = ChainClock(algod_client)
+
+# Forget the responses remembered for the last round before anything else
+# hears about the new one.
+chain_clock.subscribe(algod_single_flight.new_round)
+
+# Suggested transaction parameters, refreshed each round by the chain clock.
+params_cache = SuggestedParamsCache(algod_client, chain_clock)
+
+# Who is the deployer of the staking contracts. Pools created from this page
+# are deployed from, and use the assets of, this account.
 deployer = 'ALICE7Y2JOFGG2VGUC64VINB75PI56O6M2XW233KG2I3AIYJFUD4QMYTJM'
 
-# A simple helper function to get the ABI method from the name.
-def get_method(c: Contract, name: str) -> Method:
-    for m in c.methods:
-        if m.name == name:
-            return m
-    raise Exception("No method with the name {}".format(name))
+# Every account whose pools are listed. The deployer is always registered,
+# use `./manage.py deployers add <address>` to list pools from others too.
+deployer_registry = DeployerRegistry([deployer])
 
-# Page to list all available staking pools, authored by the deployer address.
-def index(request):
-    status = algod_client.status()
-    last_block = algod_client.block_info(status['last-round'])
-    current_time = int(datetime.datetime.fromtimestamp(last_block['block']['ts'] + int(status['time-since-last-round'] / 1000000000)).timestamp())
-
-    acc_apps = algod_client.account_info(deployer)['created-apps']
-    pools = []
-    for app in acc_apps:
-        for gs in app['params']['global-state']:
-            match base64.b64decode(gs['key']).decode('utf8'):
-                case "SA":
-                    app['staking_asset'] = algod_client.asset_info(gs['value']['uint'])
-                case "RA":
-                    app['reward_asset'] = algod_client.asset_info(gs['value']['uint'])
-                case "BT":
-                    begin_time = gs['value']['uint']
-                case "ET":
-                    end_time = gs['value']['uint']
-                case "FR":
-                    app['rate'] = "%s%%" % (gs['value']['uint'] / 100)
-
-        # Provide a start time if not started, the seconds remaining if
-        # in-progress, or "Ended" if finished.
-        if begin_time > current_time:
-            app['duration'] = datetime.datetime.fromtimestamp(begin_time)
-        elif end_time >= current_time:
-            app['duration'] = "{} seconds remaining".format(end_time - current_time)
-        elif current_time > end_time:
-            app['duration'] = 'Ended'
-
-        # Add the pool to be listed on the page.
-        pools.append(app)
-
-    template = loader.get_template("staking/index.html")
-    context = {
+# Local copy of the pools and accounts positions in them, kept up to date by
+# following each new block as the chain clock sees it.
+state_mirror = StateMirror(algod_client, chain_clock, deployer_registry)
+block_follower = BlockFollower(algod_client, chain_clock, state_mirror)
+
+# Pushes reward updates to the pool pages each round.
+reward_stream = RewardStream(algod_client, chain_clock, state_mirror, lifetime=getattr(settings, 'STAKING_STREAM_LIFETIME', 300))
+
+# Follows the transactions submitted through us until they're confirmed.
+submission_queue = SubmissionQueue(algod_client, chain_clock)
+
+# The filter, sort and cursor for a page of the index, from the query string.
+def index_query(request):
+    return {
+        'status': request.GET.get('status') or None,
+        'sort': request.GET.get('sort') or 'begin',
+        'cursor': request.GET.get('cursor') or None,
+    }
+
+SORT_LABELS = {
+    'begin': 'Starting first',
+    '-begin': 'Starting last',
+    'end': 'Ending first',
+    '-end': 'Ending last',
+}
+
+# The template context for a page of the index, with links to the filters and
+# the next page which keep the rest of the query.
+def index_context(pools, query, next_cursor):
+    def link(**changes):
+        params = dict(query, cursor=None)
+        params.update(changes)
+        return '?' + urlencode({key: value for key, value in params.items() if value is not None})
+
+    return {
         'pools': pools,
+        'status': query['status'],
+        'sort': query['sort'],
+        'status_links': [(status, link(status=status)) for status in (None,) + STATUSES],
+        'sort_links': [(sort, link(sort=sort), label) for sort, label in SORT_LABELS.items()],
+        'next_page': link(cursor=next_cursor) if next_cursor is not None else None,
     }
-    return HttpResponse(template.render(context, request))
 
-# Display a specific pool and the details associated with it.
-def pool(request, pool_id):
-    # If a wallet hasn't been selected and set in the cookie, redirect them.
-    if 'account' not in request.COOKIES:
-        return redirect('/')
+# Page to list the staking pools authored by the registered deployers, a page
+# at a time from the state mirror.
+def index(request):
+    snapshot = chain_clock.current()
+    current_time = chain_clock.extrapolate(snapshot)
 
-    # Retrieve account and pool from the algod node.
-    account = request.COOKIES['account']
-    pool = algod_client.application_info(pool_id)
-
-    # Fetch additional details from the pool state (e.g. asset details), and
-    # convert some values to be more human friendly for the frontend.
-    for gs in pool['params']['global-state']:
-        match base64.b64decode(gs['key']).decode('utf8'):
-            case "SA":
-                pool['staked_asset'] = algod_client.asset_info(gs['value']['uint'])
-                pool['staked_asset']['params']['unit_name'] = pool['staked_asset']['params']['unit-name']
-            case "RA":
-                pool['reward_asset'] = algod_client.asset_info(gs['value']['uint'])
-                pool['reward_asset']['params']['unit_name'] = pool['reward_asset']['params']['unit-name']
-            case "TS":
-                pool['total_staked'] = gs['value']['uint']
-            case "BT":
-                pool['begin_timestamp'] = gs['value']['uint']
-                pool['begin_datetime'] = datetime.datetime.fromtimestamp(gs['value']['uint'])
-            case "ET":
-                pool['end_timestamp'] = gs['value']['uint']
-                pool['end_datetime'] = datetime.datetime.fromtimestamp(gs['value']['uint'])
-            case "FR":
-                pool['basis_points'] = gs['value']['uint']
-                pool['rate'] = "%s%%" % (gs['value']['uint'] / 100)
-
-    # Fetch details about the accounts position within the pool.
-    acc = algod_client.account_info(account)
-    for acc_app in acc['apps-local-state']:
-        if acc_app['id'] != pool_id:
-            continue
-        for ls in acc_app['key-value']:
-            match base64.b64decode(ls['key']).decode('utf8'):
-                case "AS":
-                    pool['user_staked'] = ls['value']['uint']
-                    pool['user_staked_raw'] = ls['value']['uint']
-                case "AR":
-                    pool['user_rewards'] = ls['value']['uint']
-                    pool['user_rewards_raw'] = ls['value']['uint']
-                case "LU":
-                    pool['last_updated'] = ls['value']['uint']
-                    pool['last_updated_datetime'] = datetime.datetime.fromtimestamp(ls['value']['uint'])
+    query = index_query(request)
+    try:
+        rows, next_cursor = page_pools(state_mirror.pools(snapshot[0]), current_time, **query)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    rows = state_mirror.fresh_rows(rows, snapshot[0])
+
+    # Only the assets used by this page are needed.
+    assets = asset_cache.get_many(algod_client, row_asset_ids(rows))
+    pools = describe_rows(rows, assets, current_time)
+
+    template_name = "staking/index.html"
+    context = index_context(pools, query, next_cursor)
+    return HttpResponse(render_template(template_name, context, request))
+
+# Convert the pool state and the accounts position within it into values that
+# are more human friendly for the frontend.
+def pool_details(state, position, staked_asset, reward_asset):
+    pool = {}
+    pool['staked_asset'] = staked_asset
+    pool['staked_asset']['params']['unit_name'] = staked_asset['params']['unit-name']
+    pool['reward_asset'] = reward_asset
+    pool['reward_asset']['params']['unit_name'] = reward_asset['params']['unit-name']
+    pool['begin_timestamp'] = state.begin_timestamp
+    pool['begin_datetime'] = datetime.datetime.fromtimestamp(state.begin_timestamp)
+    pool['end_timestamp'] = state.end_timestamp
+    pool['end_datetime'] = datetime.datetime.fromtimestamp(state.end_timestamp)
+
+    if state.fixed_rate is not None:
+        pool['basis_points'] = state.fixed_rate
+        pool['rate'] = "%s%%" % (state.fixed_rate / 100)
+    else:
+        pool['rate'] = 0
+
+    if position is not None and position.last_updated is not None:
+        pool['last_updated'] = position.last_updated
+        pool['last_updated_datetime'] = datetime.datetime.fromtimestamp(position.last_updated)
 
     # Check some default values are populated if the user hasn't staked in the
     # pool yet. But provide friendlier values in a format a human can read if
     # they have. Arguably this should be done on the frontend.
-    if 'total_staked' not in pool:
+    if state.total_staked is None:
         pool['total_staked'] = 0
     else:
-        pool['total_staked'] = pool['total_staked'] / pow(10, pool['staked_asset']['params']['decimals'])
+        pool['total_staked'] = state.total_staked / pow(10, staked_asset['params']['decimals'])
 
-    if 'user_staked' not in pool:
+    if position is None or position.amount_staked is None:
         pool['user_staked'] = 0
         pool['user_staked_raw'] = 0
     else:
-        pool['user_staked'] = pool['user_staked'] / pow(10, pool['staked_asset']['params']['decimals'])
+        pool['user_staked'] = position.amount_staked / pow(10, staked_asset['params']['decimals'])
+        pool['user_staked_raw'] = position.amount_staked
 
-    if 'user_rewards' not in pool:
+    if position is None or position.amount_rewarded is None:
         pool['user_rewards'] = 0
         pool['user_rewards_raw'] = 0
     else:
-        pool['user_rewards'] = pool['user_rewards'] / pow(10, pool['reward_asset']['params']['decimals'])
+        pool['user_rewards'] = position.amount_rewarded / pow(10, reward_asset['params']['decimals'])
+        pool['user_rewards_raw'] = position.amount_rewarded
 
-    if 'rate' not in pool:
-        pool['rate'] = 0
+    return pool
 
-    # Calculate the current time of the blockchain.
-    status = algod_client.status()
-    last_block = algod_client.block_info(status['last-round'])
-    current_time = datetime.datetime.fromtimestamp(last_block['block']['ts'] + int(status['time-since-last-round'] / 1000000000))
+# The rewards an account would be able to claim from the pool at the given
+# time, worked out the same way as the smart contract. None if the contract
+# would fail working them out, because the on-chain state overflows.
+def rewards_details(state, position, account, timestamp):
+    # The contract is always called at or after the last update.
+    timestamp = max(timestamp, position.last_updated or 0)
+    try:
+        rewards = calculate_rewards(state, position, timestamp)
+    except OverflowError:
+        return None
+    amount_rewarded = position.amount_rewarded or 0
+    return {
+        'pool_id': state.app_id,
+        'account': account,
+        'timestamp': timestamp,
+        'amount_staked': position.amount_staked or 0,
+        'amount_rewarded': amount_rewarded,
+        'rewards': rewards,
+        'accrued': amount_rewarded + rewards,
+        'total_rewards': (state.total_rewards or 0) - rewards,
+    }
 
-    # If the staking period has ended, display a different page.
-    if pool['end_datetime'] <= current_time:
-        template = loader.get_template("staking/pool_ended.html")
-    else:
-        template = loader.get_template("staking/pool.html")
+# Display a specific pool and the details associated with it.
+def pool(request, pool_id):
+    # If a wallet hasn't been selected and set in the cookie, redirect them.
+    if 'account' not in request.COOKIES:
+        return redirect('/')
+
+    # Find out when the pool and the accounts positions last changed, which is
+    # all that's needed if the page is cached.
+    account = request.COOKIES['account']
+    pool_row, account_row = state_mirror.rows(pool_id, account)
+    if pool_row is None:
+        raise Http404("Unknown pool.")
+    if account_row is None:
+        return redirect('/')
+    key = page_key(pool_row, account_row, chain_clock.now())
+    html = page_cache.get(key)
+    if html is not None:
+        return HttpResponse(html)
+
+    state = pool_row.state()
+    position = state_mirror.stored_position(pool_id, account)
+    assets = asset_cache.get_many(algod_client, [state.staked_asset, state.reward_asset])
 
     context = {
         'pool_id': pool_id,
-        'pool_details': pool,
-        'current_time': current_time,
+        'pool_details': pool_details(state, position, assets[state.staked_asset], assets[state.reward_asset]),
     }
-    return HttpResponse(template.render(context, request))
+    return HttpResponse(page_cache.render(key, context, request))
 
 # Display a page to create a new ASA.
 def new_asset(request):
     # If a wallet hasn't been selected and set in the cookie, redirect them.
     if 'account' not in request.COOKIES:
         return redirect('/')
-    template = loader.get_template("staking/new_asset.html")
+    template_name = "staking/new_asset.html"
 
     # Display all existing assets created by the deployer account.
     acc_assets = algod_client.account_info(deployer)['created-assets']
@@ -177,441 +241,231 @@ def new_asset(request):
     context = {
         'assets': assets,
     }
-    return HttpResponse(template.render(context, request))
+    return HttpResponse(render_template(template_name, context, request))
 
 # API: This endpoint is requested via an in-page call.
 def create_asset(request):
     data = json.loads(request.body)
 
     # Fetch suggested parameters.
-    sp = algod_client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = constants.MIN_TXN_FEE
-
-    # Created a transaction without the use of the ATC here since it's so
-    # straight forward and requires no application calls.
-    acfg_txn = transaction.AssetCreateTxn(
-        data['sender'],
-        sp,
-        data['total'],
-        data['decimals'],
-        False,
-        asset_name=data['name'],
-        unit_name=data['unit_name'],
-    )
-
-    txgroup = []
-    txgroup.append({'txn': encoding.msgpack_encode(acfg_txn)})
-    return JsonResponse(txgroup, safe=False)
+    sp = params_cache.get()
+
+    return JsonResponse(asset_create_group(data, sp), safe=False)
 
 def new_pool(request):
     # If a wallet hasn't been selected and set in the cookie, redirect them.
     if 'account' not in request.COOKIES:
         return redirect('/')
-    template = loader.get_template("staking/new_pool.html")
+    template_name = "staking/new_pool.html"
     context = {}
-    return HttpResponse(template.render(context, request))
+    return HttpResponse(render_template(template_name, context, request))
 
 # API: This endpoint is requested via an in-page call.
 def create_pool(request):
     data = json.loads(request.body)
 
     # Fetch suggested parameters.
-    sp = algod_client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = constants.MIN_TXN_FEE
-
-    # Hardcoded contracts, although it should probably be compiled on the fly
-    # from the .teal files incase of modification.
-    approval_prog_b64 = 'BiADAQAEJgwCU0ECQVMCQVICUkECVFICVFMCQlQCRVQBUAJMVQJGUgFBNhoAgASHj9TQEkAATzYaAIAEwJ3I7xJAAIQ2GgCABD53ak4SQAF7NhoAgASg6BhyEkABhTYaAIAEH6BpGRJAAJ42GgCABC5XG98SQADHNhoAgAS+DMOFEkABBgCIAWwxGSMSMRkiEhFEMRY1ADQAIgk1ATEANAE4ABJENAE4FDIKEkQxAIgCEiMpSmI0ATgSCGYnBUlkNAE4EghnIkOIASoxGSMSMRmBAhIRRDEAiAHpNhoBF8AwNhoCFzYaAxfAHIgBJjEZQQAUNhoDF8AcKWIURDYaAxfAHCpiFEQiQzEYFEQjwByIAN0oNhoBF8AwZys2GgIXwDBnJwY2GgMXSTIHDURnJwc2GgQXSTYaAxcNRGciQ4gAvjEWNQA0ACIJNQE0ATgHMgoSRDIKYDQBOAgIMgExMSIICzIAMTELCA9EIjUCNAIxMQ5BABM0AsAaF8AwiACINAIiCDUCQv/lIkOIAHIxFjUANAAiCTUBNAE4ECQSRDQBOBQyChJENAE4EStkEkSAAlBTK2RxAURnJwRJZDQBOBIIZycKNhoBF2ciQ4gAMScINhoBFxQUZzYaAhfAHIgADyJDiAAaiAASMRkkEkQiQycLTGeJJwhkFESJJwhkRIkxACcLZBJEibGyESSyEDIKshSziTUMNQs1CjQLNAwqKTQKKGQSTWJJNQ0OQAAENA01CzQMKik0CihkEk1KYjQLCWYnBCcFNAooZBJNSWQ0CwlnsSSyEDQKshE0C7ISNAyyFCOyAbOJNTIyCihkcABESTUzQQAfgAZTaGFyZXNkSTU0QQAQNDI0Mx0jNDQfSEhMIxJEiTQyiTVRNVA0UShKYjRQCGYnBUlkNFAIZ4k1UTVQNFErSmI0UAlmJwRJZDRQCWeJNTwyBycGZA1BAFM0PCcJYicHZAxBAEc0PCliNT0yBycHZEoNTTQ8JwliJwZkSgxNCTU+ND00Ph2B4I+GD5cnCmQLgZBOCjU/ND9BABEnBElkND8JZzQ8KkpiND8IZjQ8JwkyB0pnZok='
-    clear_prog_b64 = 'BoEB'
-
-    # We will use the Atomic Transaction Composer and as a result will need to
-    # read the ABI JSON for the staking contract.
-    with open("staking/contracts/staking.json") as f:
-        js = f.read()
-    c = Contract.from_json(js)
-
-    # We create a blank signer, since we intend to use the ATC purely to help
-    # construct the transaction group. The signer will be external to this
-    # process, such as AlgoSigner that's an extension on the users browser.
-    atc = AtomicTransactionComposer()
-    signer = AccountTransactionSigner('')
-
-    # Add the 'deploy' method call. Used when deploying the staking smart
-    # contract for the first time.
-    atc.add_method_call(
-        0,
-        get_method(c, 'deploy'),
-        data['sender'],
-        sp,
-        signer,
-        method_args=[
-            int(data['staking']),
-            int(data['reward']),
-            int(dateutil.parser.parse(data['begin']).timestamp()),
-            int(dateutil.parser.parse(data['end']).timestamp()),
-        ],
-        local_schema=transaction.StateSchema(3, 0),
-        global_schema=transaction.StateSchema(10, 1),
-        approval_program=base64.b64decode(approval_prog_b64),
-        clear_program=base64.b64decode(clear_prog_b64),
-    )
-
-    txgroup = []
-    for tx in atc.build_group():
-        txgroup.append({'txn': encoding.msgpack_encode(tx.txn)})
-    return JsonResponse(txgroup, safe=False)
-    
-# The second step of deploying a pool is initialising it. The involves sending
-# the minimum balance requirement (Algo). We also combine the final step of
-# configuring the fixed rate of reward and funding the staking contract, since
-# they can be grouped together.
+    sp = params_cache.get()
+
+    # The compiled programs are held in memory by the program store.
+    approval = program_store.approval(algod_client)
+    clear = program_store.clear(algod_client)
+
+    return JsonResponse(group_cache.build(deploy_group, data, sp, approval, clear), safe=False)
+
+# The second step of deploying a pool is initialising it, see init_group for
+# the details of the transactions involved.
 def init_pool(request):
     data = json.loads(request.body)
 
-    # Calculate the new smart contract address, and retrieve the application
-    # state.
-    pool_id = data['pool_id']
-    pool_addr = logic.get_application_address(pool_id)
-    app = algod_client.application_info(pool_id)
-
-    # Decode the application's state to use the values.
-    for s in app['params']['global-state']:
-        match base64.b64decode(s['key']).decode('utf8'):
-            case "SA":
-                staking_asset = s['value']['uint']
-            case "RA":
-                reward_asset = s['value']['uint']
-            case "BT":
-                begin_timestamp = s['value']['uint']
-            case "ET":
-                end_timestamp = s['value']['uint']
+    # Retrieve the application state, and the details of the reward asset
+    # which will be sent to the pool.
+    state = state_mirror.pool(data['pool_id'])
+    reward_asset = asset_cache.get(algod_client, state.reward_asset)
 
     # Fetch suggested parameters.
-    sp = algod_client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = constants.MIN_TXN_FEE
-
-    # We will use the Atomic Transaction Composer and as a result will need to
-    # read the ABI JSON for the staking contract.
-    with open("staking/contracts/staking.json") as f:
-        js = f.read()
-    c = Contract.from_json(js)
-
-    # We create a blank signer, since we intend to use the ATC purely to help
-    # construct the transaction group. The signer will be external to this
-    # process, such as AlgoSigner that's an extension on the users browser.
-    atc = AtomicTransactionComposer()
-    signer = AccountTransactionSigner('')
-
-    # Construct the Payment transaction, for 0.302 Algo, the minimum balance
-    # for the smart contract account.
-    # We create a TransactionWithSigner object although we have a blank signer,
-    # as that's what the ATC expects.
-    pay_txn = transaction.PaymentTxn(data['sender'], sp, pool_addr, 302000)
-    pay_tws = TransactionWithSigner(pay_txn, signer)
-
-    # Add the 'init' method call. This expects the payment transaction, along
-    # with the two assets which it will optin to.
-    atc.add_method_call(
-        data['pool_id'],
-        get_method(c, 'init'),
-        data['sender'],
-        sp,
-        signer,
-        method_args=[
-            pay_tws,
-            staking_asset,
-            reward_asset,
-        ],
-    )
-
-    # We're also going to include another method call 'reward', which sets the
-    # fixed rate of return and also expects an asset transfer transacation.
-    ra = algod_client.asset_info(reward_asset)
-
-    # For this demo we will also send the full amount of reward assets to the
-    # staking pool.
-    all_rewards = ra['params']['total']
-
-    # Convert the decimal percentage value to basis points.
-    fixed_rate = int(data['fixed-rate'] * 100)
-
-    # Construct the asset transfer transaction, to send the full amount of
-    # reward asset into the staking pool.
-    axfer_txn = transaction.AssetTransferTxn(data['sender'], sp, pool_addr, all_rewards, reward_asset)
-    axfer_tws = TransactionWithSigner(axfer_txn, signer)
-
-    # Add the 'reward' method call. This expects the asset transfer
-    # transaction, along with the fixed rate of return, and the reward asset.
-    atc.add_method_call(
-        data['pool_id'],
-        get_method(c, 'reward'),
-        data['sender'],
-        sp,
-        signer,
-        method_args=[
-            axfer_tws,
-            fixed_rate,
-            reward_asset,
-        ],
-    )
-
-    txgroup = []
-    for tx in atc.build_group():
-        txgroup.append({'txn': encoding.msgpack_encode(tx.txn)})
-    return JsonResponse(txgroup, safe=False)
+    sp = params_cache.get()
+
+    return JsonResponse(group_cache.build(init_group, data, sp, state, reward_asset), safe=False)
+
+# The most pools that can be deployed or initialised in one request.
+MAX_BATCH = 64
+
+# The per-pool requests in a batch, each in the same form create_pool or
+# init_pool would receive, with the sender shared by them all. Raises a
+# ValueError if the batch isn't valid.
+def batch_requests(data, fields):
+    if not isinstance(data, dict) or 'sender' not in data:
+        raise ValueError("Expected a sender and a list of pools.")
+    pools = data.get('pools')
+    if not isinstance(pools, list) or not pools:
+        raise ValueError("Expected a list of pools.")
+    if len(pools) > MAX_BATCH:
+        raise ValueError("At most {} pools can be sent at once.".format(MAX_BATCH))
+
+    requests = []
+    for spec in pools:
+        if not isinstance(spec, dict):
+            raise ValueError("Expected each pool to be an object.")
+        missing = [field for field in fields if field not in spec]
+        if missing:
+            raise ValueError("Pool is missing {}.".format(', '.join(missing)))
+        requests.append({**spec, 'sender': data['sender']})
+
+    # The same transactions twice in the same round would be rejected.
+    if len({json.dumps(r, sort_keys=True) for r in requests}) != len(requests):
+        raise ValueError("The same pool can't be sent twice.")
+    return requests
+
+# Deploy many pools at once, returning the group for each in the order given.
+# The suggested parameters and programs are only fetched once for them all.
+def create_pools(request):
+    data = json.loads(request.body)
+    try:
+        requests = batch_requests(data, ['staking', 'reward', 'begin', 'end'])
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    sp = params_cache.get()
+    approval = program_store.approval(algod_client)
+    clear = program_store.clear(algod_client)
+
+    return JsonResponse([group_cache.build(deploy_group, r, sp, approval, clear) for r in requests], safe=False)
+
+# The state of each pool in a batch being initialised, as of the round given.
+# Raises a LookupError naming the first pool that doesn't exist, and a
+# ValueError for one without a reward asset to initialise it with.
+def batch_pools(requests, current_round):
+    states = []
+    for r in requests:
+        if not isinstance(r['pool_id'], int):
+            raise ValueError("Invalid pool {}.".format(json.dumps(r['pool_id'])))
+        row = state_mirror.pool_row(r['pool_id'], current_round)
+        if row is None:
+            raise LookupError("Unknown pool {}.".format(r['pool_id']))
+        state = row.state()
+        if state.reward_asset is None:
+            raise ValueError("Pool {} has no reward asset.".format(r['pool_id']))
+        states.append(state)
+    return states
+
+# Initialise many pools at once, see create_pools. Every pool is read as of
+# the same round, and their reward assets are looked up together.
+def init_pools(request):
+    data = json.loads(request.body)
+    try:
+        requests = batch_requests(data, ['pool_id', 'fixed-rate'])
+        states = batch_pools(requests, chain_clock.round())
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    except LookupError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=404)
+
+    assets = asset_cache.get_many(algod_client, [state.reward_asset for state in states])
+    sp = params_cache.get()
+
+    return JsonResponse([
+        group_cache.build(init_group, r, sp, state, assets[state.reward_asset])
+        for r, state in zip(requests, states)
+    ], safe=False)
 
 # API: This endpoint is requested via an in-page call.
 def deposit(request, pool_id):
     data = json.loads(request.body)
 
-    # Calculate the smart contract address, retrieve the application state,
-    # and the users local state.
-    pool_addr = logic.get_application_address(pool_id)
-    app = algod_client.application_info(pool_id)
-    acc = algod_client.account_info(data['sender'])
-
-    # Assume we're going to make an OptIn call transaction unless we find the
-    # user has already opted in.
-    oncomp = transaction.OnComplete.OptInOC
-    for als in acc['apps-local-state']:
-        if als['id'] == pool_id:
-            oncomp = transaction.OnComplete.NoOpOC
-            break
-
-    # Retrieve the reward asset ID for create the asset transfer transaction.
-    for gs in app['params']['global-state']:
-        if base64.b64decode(gs['key']).decode('utf8') == "SA":
-            reward_asset = gs['value']['uint']
+    # Retrieve the application state, and the users local state. Whether the
+    # user has opted in decides the transaction we build, so that's always
+    # checked with the algod node in case they've only just done so.
+    state = state_mirror.pool(pool_id)
+    position = decode_position(algod_client.account_info(data['sender']), pool_id)
 
     # Fetch suggested parameters.
-    sp = algod_client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = 1_000
-
-    # We will use the Atomic Transaction Composer and as a result will need to
-    # read the ABI JSON for the staking contract.
-    with open("staking/contracts/staking.json") as f:
-        js = f.read()
-    c = Contract.from_json(js)
-
-    # We create a blank signer, since we intend to use the ATC purely to help
-    # construct the transaction group. The signer will be external to this
-    # process, such as AlgoSigner that's an extension on the users browser.
-    atc = AtomicTransactionComposer()
-    signer = AccountTransactionSigner('')
-
-    # Construct the asset transfer transaction, to send the full amount of
-    # reward asset into the staking pool.
-    axfer_txn = transaction.AssetTransferTxn(data['sender'], sp, pool_addr, data['amount'], reward_asset)
-    axfer_tws = TransactionWithSigner(axfer_txn, signer)
-
-    # Add the 'deposit' method call. This expects the asset transfer
-    # transaction, along with the reward asset.
-    atc.add_method_call(
-        pool_id,
-        get_method(c, 'deposit'),
-        data['sender'],
-        sp,
-        signer,
-        method_args=[
-            axfer_tws,
-            reward_asset,
-        ],
-        on_complete=oncomp,
-    )
-
-    txgroup = []
-    for tx in atc.build_group():
-        txgroup.append({'txn': encoding.msgpack_encode(tx.txn)})
-    return JsonResponse(txgroup, safe=False)
+    sp = params_cache.get()
+
+    return JsonResponse(group_cache.build(deposit_group, data, sp, pool_id, state, position), safe=False)
 
 # API: This endpoint is requested via an in-page call.
 def withdraw(request, pool_id):
     data = json.loads(request.body)
 
-    # Calculate the smart contract address, retrieve the application state,
-    # and the users local state.
-    pool_addr = logic.get_application_address(pool_id)
-    app = algod_client.application_info(pool_id)
-    acc = algod_client.account_info(data['sender'])
-
-    # Retrieve the staking and reward asset IDs,
-    for gs in app['params']['global-state']:
-        match base64.b64decode(gs['key']).decode('utf8'):
-            case "SA":
-                staking_asset = gs['value']['uint']
-            case "RA":
-                reward_asset = gs['value']['uint']
-
-    # Retrieve the amount staked and claimed amount rewarded from the users
-    # local state.
-    for ls in acc['apps-local-state']:
-        if ls['id'] == pool_id:
-            for ls in ls['key-value']:
-                match base64.b64decode(ls['key']).decode('utf8'):
-                    case "AS":
-                        amount_staked = ls['value']['uint']
-                    case "AR":
-                        amount_rewarded = ls['value']['uint']
+    # Retrieve the application state.
+    state = state_mirror.pool(pool_id)
 
     # Fetch suggested parameters.
-    sp = algod_client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = constants.MIN_TXN_FEE * 2
-
-    # We will use the Atomic Transaction Composer and as a result will need to
-    # read the ABI JSON for the staking contract.
-    with open("staking/contracts/staking.json") as f:
-        js = f.read()
-    c = Contract.from_json(js)
-
-    # The value below is the maximum value that can be stored in a uint64.
-    # 2^64 - 1
-    # This value tells the smart contract to withdraw the maximum available for
-    # the user. Including any newly calculated rewards since the transaction
-    # was signed.
-    all_available = 18446744073709551615
-
-    # We create a blank signer, since we intend to use the ATC purely to help
-    # construct the transaction group. The signer will be external to this
-    # process, such as AlgoSigner that's an extension on the users browser.
-    atc = AtomicTransactionComposer()
-    signer = AccountTransactionSigner('')
-
-    # Are we withdrawing just the staking asset, or the staking asset and the
-    # reward asset?
-    if (data['all']):
-        # We assume if you're withdrawing both you want the maximum available
-        # of both assets.
-        amount_staked = all_available
-        amount_rewarded = all_available
-
-        # Add 'withdraw' method call for the staking asset.
-        atc.add_method_call(
-            pool_id,
-            get_method(c, 'withdraw'),
-            data['sender'],
-            sp,
-            signer,
-            method_args=[
-                staking_asset,
-                amount_staked,
-                data['sender'],
-            ],
-        )
-
-        # Add 'withdraw' method call for the reward asset.
-        atc.add_method_call(
-            pool_id,
-            get_method(c, 'withdraw'),
-            data['sender'],
-            sp,
-            signer,
-            method_args=[
-                reward_asset,
-                amount_rewarded,
-                data['sender'],
-            ],
-        )
-    else:
-        # Add 'withdraw' method call for the staking asset.
-        atc.add_method_call(
-            pool_id,
-            get_method(c, 'withdraw'),
-            data['sender'],
-            sp,
-            signer,
-            method_args=[
-                staking_asset,
-                data['amount'],
-                data['sender'],
-            ],
-        )
-
-    txgroup = []
-    for tx in atc.build_group():
-        txgroup.append({'txn': encoding.msgpack_encode(tx.txn)})
-    return JsonResponse(txgroup, safe=False)
+    sp = params_cache.get()
+
+    return JsonResponse(group_cache.build(withdraw_group, data, sp, pool_id, state), safe=False)
 
 # API: This endpoint is requested via an in-page call.
 def claim(request, pool_id):
     data = json.loads(request.body)
 
-    # Retrieve pool and account from the algod node.
-    app = algod_client.application_info(pool_id)
-    acc = algod_client.account_info(data['sender'])
-
-    # Fetch additional details from the pool state (e.g. asset details).
-    for gs in app['params']['global-state']:
-        match base64.b64decode(gs['key']).decode('utf8'):
-            case "SA":
-                staking_asset = gs['value']['uint']
-            case "RA":
-                reward_asset = gs['value']['uint']
+    # Retrieve the pool.
+    state = state_mirror.pool(pool_id)
 
     # Fetch suggested parameters.
-    sp = algod_client.suggested_params()
-    sp.flat_fee = True
-    sp.fee = constants.MIN_TXN_FEE * 2
-
-    # We will use the Atomic Transaction Composer and as a result will need to
-    # read the ABI JSON for the staking contract.
-    with open("staking/contracts/staking.json") as f:
-        js = f.read()
-    c = Contract.from_json(js)
-
-    # We create a blank signer, since we intend to use the ATC purely to help
-    # construct the transaction group. The signer will be external to this
-    # process, such as AlgoSigner that's an extension on the users browser.
-    atc = AtomicTransactionComposer()
-    signer = AccountTransactionSigner('')
-
-    # The value below is the maximum value that can be stored in a uint64.
-    # 2^64 - 1
-    # This value tells the smart contract to withdraw the maximum available for
-    # the user. Including any newly calculated rewards since the transaction
-    # was signed.
-    amount_rewarded = 18446744073709551615
-
-    # Add 'withdraw' method call for the reward asset.
-    atc.add_method_call(
-        pool_id,
-        get_method(c, 'withdraw'),
-        data['sender'],
-        sp,
-        signer,
-        method_args=[
-            reward_asset,
-            amount_rewarded,
-            data['sender'],
-        ],
-    )
-
-    txgroup = []
-    for tx in atc.build_group():
-        txgroup.append({'txn': encoding.msgpack_encode(tx.txn)})
-    return JsonResponse(txgroup, safe=False)
+    sp = params_cache.get()
+
+    return JsonResponse(group_cache.build(claim_group, data, sp, pool_id, state), safe=False)
+
+# The response to a request for an account's rewards, see rewards.
+def rewards_response(state, position, account, timestamp):
+    if state is None:
+        return JsonResponse({'success': False, 'message': "Unknown pool."}, status=404)
+    if position is None:
+        return JsonResponse({'success': False, 'message': "Account has not opted in."}, status=404)
+    details = rewards_details(state, position, account, timestamp)
+    if details is None:
+        return JsonResponse({'success': False, 'message': "The pool's state overflows the contract's rewards calculation."}, status=422)
+    return JsonResponse(details)
+
+# API: The rewards accrued by an account in a pool.
+def rewards(request, pool_id, account):
+    state, position = state_mirror.lookup(pool_id, account)
+    return rewards_response(state, position, account, chain_clock.now())
+
+# Server-sent events with the accounts rewards and the total staked in the
+# pool, sent each time the chain moves on. Followed by the pool page.
+def stream(request, pool_id):
+    if 'account' not in request.COOKIES:
+        return JsonResponse({'success': False, 'message': "No account selected."}, status=400)
+    if state_mirror.pool_row(pool_id) is None:
+        return JsonResponse({'success': False, 'message': "Unknown pool."}, status=404)
+    response = StreamingHttpResponse(reward_stream.events(pool_id, request.COOKIES['account']), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
 
 # API: This endpoint is requested via an in-page call.
 def submit(request):
     data = json.loads(request.body)
 
     # Encode all signed transactions sent to us and place them in an array.
-    txgroup = []
-    for stx in data:
-        txgroup.append(encoding.future_msgpack_decode(stx['blob']))
+    txgroup = decode_signed_group(data)
 
     # Attempt to submit the transaction to the algod node. Catching any errors
-    # and returning the status to the caller.
+    # and returning the status to the caller. Once sent, the submission queue
+    # follows the group until it's confirmed.
     try:
-        algod_client.send_transactions(txgroup)
-        result = {'success': True, 'message': "Transactions received."}
-    except Exception as e:
-        print(e)
+        txid = submission_queue.send(txgroup)
+        result = {'success': True, 'message': "Transactions received.", 'txid': txid}
+    except Exception:
+        logger.exception('Failed to send transactions')
         result = {'success': False, 'message': "Transaction failed."}
 
     return JsonResponse(result)
 
+# API: Whether a submitted group has been confirmed yet.
+def transaction_status(request, txid):
+    status = submission_queue.status(txid)
+    if status is None:
+        return JsonResponse({'success': False, 'message': "Unknown transaction."}, status=404)
+    return JsonResponse(status)
+
+# Server-sent events with the status of a submitted group, ending once it's
+# been confirmed (or has failed).
+def transaction_stream(request, txid):
+    if submission_queue.status(txid) is None:
+        return JsonResponse({'success': False, 'message': "Unknown transaction."}, status=404)
+    response = StreamingHttpResponse(submission_queue.events(txid), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response